@@ -6,9 +6,11 @@ import os
 import sys
 
 parser = argparse.ArgumentParser()
-parser.add_argument('-u', '--unit', metavar='unit', type=str, required=True, help='Systemd unit to display')
+parser.add_argument('-u', '--unit', metavar='unit', type=str, required=True, action='append', help='Systemd unit to display (can be repeated)')
 parser.add_argument('-f', '--follow', default=False, action='store_true', help='Follows the log')
 parser.add_argument('-n', '--lines', metavar='num', type=int, help='Num of lines to display')
+parser.add_argument('-S', '--since', metavar='date', type=str, help='Show entries written since the date')
+parser.add_argument('-U', '--until', metavar='date', type=str, help='Show entries written until the date')
 parser.add_argument('--no-pager', default=False, action='store_true', help='Do not pipe through a pager')
 parser.add_argument('--system', default=False, action='store_true', help='Show system units')
 parser.add_argument('--user', default=False, action='store_true', help='Show user units')
@@ -20,9 +22,11 @@ systemctl_py = "systemctl3.py"
 path = os.path.dirname(sys.argv[0])
 systemctl = os.path.join(path, systemctl_py)
 
-cmd = [ systemctl, "log", args.unit ] # drops the -u
+cmd = [ systemctl, "log" ] + args.unit # drops the -u
 if args.follow: cmd += [ "-f" ]
 if args.lines: cmd += [ "-n", str(args.lines) ]
+if args.since: cmd += ["--since", args.since]
+if args.until: cmd += ["--until", args.until]
 if args.no_pager: cmd += [ "--no-pager" ]
 if args.system: cmd += [ "--system" ]
 elif args.user: cmd += [ "--user" ]
@@ -6,11 +6,11 @@
 # pylint: disable=invalid-name,redefined-outer-name,possibly-unused-variable,unnecessary-negation,unused-argument,consider-using-dict-items,consider-using-enumerate
 # pylint: disable=unused-variable,protected-access
 """ run 'systemctl start' and other systemctl commands based on available *.service descriptions without a systemd daemon running in the system """
-from typing import Callable, Dict, Iterator, Iterable, List, NoReturn, Optional, TextIO, Tuple, Type, Union, Match, NamedTuple
-import threading
+from typing import Callable, Deque, Dict, Iterator, Iterable, List, NoReturn, Optional, Set, TextIO, Tuple, Type, Union, Match, NamedTuple, Pattern
 import grp
 import pwd
 import select
+import selectors
 import fcntl
 import string
 import datetime
@@ -22,10 +22,15 @@ import os
 import glob
 import errno
 import collections
+import heapq
+import json
+import io
 import shlex
+import struct
 import fnmatch
+import stat
 import re
-from types import TracebackType
+from types import FrameType, TracebackType
 
 __copyright__: str = "(C) 2016-2026 Guido U. Draheim, licensed under the EUPL"
 __version__: str = "1.7.1311"
@@ -51,6 +56,8 @@ DEBUG_BOOTTIME: int = TRACE
 DEBUG_INITLOOP: int = logging.NOTSET
 DEBUG_KILLALL: int = logging.NOTSET
 DEBUG_FLOCK: int = logging.NOTSET
+DEBUG_PARALLEL: int = logging.NOTSET
+DEBUG_CATALOG: int = logging.NOTSET
 DEBUG_EXPAND: int = logging.NOTSET
 INFO_EXPAND: int = logging.INFO
 DEBUG_RESULT: int = logging.NOTSET
@@ -69,6 +76,8 @@ _extra_vars: List[str] = []
 _force: bool = False
 _full: bool = False
 _log_lines = 0
+_log_since = ""
+_log_until = ""
 _no_pager = False
 _now: int = 0
 _no_reload = False
@@ -84,6 +93,13 @@ _only_type: List[str] = []
 _only_state: List[str] = []
 _only_property: List[str] = []
 LOG_BUFSIZE = 8192
+LOG_INOTIFY: bool = True # wake up on changed log files instead of polling them
+LOG_QUEUE_MAX: int = 1024 * 1024 # bytes waiting for stdout before the log files are not read further
+LOG_LINE_MAX: int = 8192 # forward a partial line when it grows longer
+LOG_NATIVE: bool = True # show the unit logs without running tail and cat
+LOG_FOLLOW_SLEEP: float = 1.0 # check for a rotated log file while following
+LOG_TIMESTAMPS: bool = False # the init-loop prints each log line with realtime and monotonic time
+LOG_INDEX_SEC: float = 10.0 # the init-loop adds the log offset to <log>.index in these intervals
 FORCE_IPV4 = False
 FORCE_IPV6 = False
 INIT_MODE = 0
@@ -198,6 +214,13 @@ DefaultStartLimitIntervalSec: int = 10 # official value
 DefaultStartLimitBurst: int = 5        # official value
 InitLoopSleep: int = 5
 MaxLockWait: int = 0 # equals DefaultMaximumTimeout
+LockWaitInfo: float = 1.0 # log the time waited for a lock
+MaxParallelJobs: int = 1 # start independent units in parallel worker processes
+ShutdownTimeoutSec: float = 0.0 # a stop budget for halt and the end of --init
+SystemMaxFileSize: str = "16M" # journald.conf: rotate a unit log in the init-loop when larger
+SystemMaxUse: str = "128M" # journald.conf: remove the oldest rotated unit logs when all are larger
+SystemMaxFiles: int = 100 # journald.conf: rotated logs to keep for each unit
+MaxRetentionSec: str = "" # journald.conf: remove rotated unit logs when older
 DefaultPath: str = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
 ResetLocale: List[str] = ["LANG", "LANGUAGE", "LC_CTYPE", "LC_NUMERIC", "LC_TIME", "LC_COLLATE", "LC_MONETARY",
                "LC_MESSAGES", "LC_PAPER", "LC_NAME", "LC_ADDRESS", "LC_TELEPHONE", "LC_MEASUREMENT",
@@ -222,13 +245,20 @@ SYSTEMD_IGNORES3 = "" # may point to a directory
 
 EXEC_SPAWN = False
 EXEC_DUP2 = True
+WAIT_PIDFD: bool = True # linux 5.3+
+EXEC_POSIX_SPAWN: bool = True # helper commands without fork
+EXEC_QUICK_EXIT: float = 0.2 # a command that quits this fast after its execve has failed to start
 REMOVE_LOCK_FILE: bool = False
+STATUS_FSYNC: bool = False # sync the status file before replacing it
 BOOT_PID_MIN: int = 0
 BOOT_PID_MAX: int = -9
 PROC_MAX_DEPTH: int = 100
+ProcTableMaxAge: float = 1.0 # seconds to reuse a /proc snapshot for the status display
 EXPAND_VARS_MAXDEPTH: int = 20
 EXPAND_KEEP_VARS: bool = True
 RESTART_FAILED_UNITS: bool = True
+UNIT_CATALOG: bool = True
+LAZY_SECTIONS: bool = True # parse a unit file section when it is used
 ACTIVE_IF_ENABLED = False
 OK_CONDITION_FAILURE = True
 
@@ -239,6 +269,7 @@ CAT_CMDS = ["/bin/cat", "/usr/bin/cat", "/usr/local/bin/cat"]
 # The systemd default was NOTIFY_SOCKET="/var/run/systemd/notify"
 _notify_socket_folder = "{RUN}/systemd" # alias /run/systemd
 _journal_log_folder: str = "{LOG}/journal"
+_unit_catalog_file = "{RUN}/systemd/systemctl.catalog.json" # written by daemon-reload
 
 SYSTEMCTL_DEBUG_LOG: str = "{LOG}/systemctl.debug.log"
 SYSTEMCTL_EXTRA_LOG: str = "{LOG}/systemctl.log"
@@ -254,6 +285,8 @@ _all_common_disabled: List[str] = ["graphical.target", "resue.target", "nfs-clie
 target_requires = {"graphical.target": "multi-user.target", "multi-user.target": "basic.target", "basic.target": "sockets.target"}
 target_alias = {"default.target": "multi-user.target", "timers.target": "sockets.target", "network.target": "basic.target"}
 
+_unit_setting = re.compile(r"\w+ *=")
+
 _runlevel_mappings: Dict[str, str] = {} # the official list
 _runlevel_mappings["0"] = "poweroff.target"
 _runlevel_mappings["1"] = "rescue.target"
@@ -390,14 +423,53 @@ def delayed(attempt: int, suffix: str = ".") -> str:
         return "%+i%s" % (attempt, suffix)
     return "%i%s" % (attempt, suffix)
 def fnmatched(text: str, *patterns: str) -> bool:
-    if not patterns:
+    if not patterns or "" in patterns:
         return True
-    for pattern in patterns:
-        if not pattern:
+    return compiled_patterns(patterns).matches(text)
+
+class SystemctlPatterns:
+    """ A list of fnmatch patterns (and literal names) that is checked in one go.
+        Plain names are looked up in a set, a 'name*' pattern is a prefix, and
+        anything else is merged into one regex. With a suffix each pattern is
+        also checked with the suffix appended (as in 'name' for 'name.service'). """
+    exact: Set[str]
+    prefixes: Tuple[str, ...]
+    regex: Optional[Pattern[str]]
+    def __init__(self, patterns: Iterable[str], literals: Iterable[str] = (), suffix: str = "") -> None:
+        self.exact = set(literals)
+        prefixes: List[str] = []
+        globs: List[str] = []
+        patterns = list(patterns)
+        if suffix:
+            patterns += [pattern + suffix for pattern in patterns]
+        for pattern in patterns:
+            if not _glob_magic.search(pattern):
+                self.exact.add(pattern)
+            elif pattern.endswith("*") and not _glob_magic.search(pattern[:-1]):
+                prefixes.append(pattern[:-1])
+            else:
+                globs.append(fnmatch.translate(pattern))
+        self.prefixes = tuple(prefixes)
+        self.regex = re.compile("|".join(globs)) if globs else None
+    def matches(self, text: str) -> bool:
+        if text in self.exact:
+            return True
+        if self.prefixes and text.startswith(self.prefixes):
             return True
-        if fnmatch.fnmatchcase(text, pattern):
+        if self.regex is not None and self.regex.match(text):
             return True
-    return False
+        return False
+
+_glob_magic = re.compile(r"[*?\[]")
+_compiled_patterns: Dict[Tuple[Tuple[str, ...], Tuple[str, ...], str], SystemctlPatterns] = {}
+def compiled_patterns(patterns: Iterable[str], literals: Iterable[str] = (), suffix: str = "") -> SystemctlPatterns:
+    """ the SystemctlPatterns are cached as the same lists are checked for each unit """
+    key = (tuple(patterns), tuple(literals), suffix)
+    if key not in _compiled_patterns:
+        if len(_compiled_patterns) > 100:
+            _compiled_patterns.clear()
+        _compiled_patterns[key] = SystemctlPatterns(*key)
+    return _compiled_patterns[key]
 
 def unit_name_escape(text: str) -> str:
     # https://www.freedesktop.org/software/systemd/man/systemd.unit.html#id-1.6
@@ -614,11 +686,119 @@ def shutil_setuid(user: Optional[str] = None, group: Optional[str] = None, xgrou
         return {"USER": user, "LOGNAME": logname, "HOME": home, "SHELL": shell}
     return {}
 
+def tail_offset(filename: str, lines: int) -> Tuple[int, int]:
+    """ search the start of the last lines by reading blocks backwards from the end
+        of the file, so that it does not need to be read in. The log may be truncated
+        by a rotation meanwhile - a short read makes it start at the beginning of
+        the file. Returns (lines found, offset). """
+    try:
+        fd = os.open(filename, os.O_RDONLY)
+    except OSError as e:
+        logg.debug("can not read %s >> %s", filename, e)
+        return 0, 0
+    try:
+        size = os.fstat(fd).st_size
+        if not size or lines <= 0:
+            return 0, size
+        pos = size - 1 if os.pread(fd, 1, size - 1) == b"\n" else size
+        found = 0
+        while pos > 0:
+            start = max(0, pos - LOG_BUFSIZE * 8)
+            block = os.pread(fd, pos - start, start)
+            if len(block) < pos - start:
+                break # truncated
+            end = len(block)
+            while True:
+                newline = block.rfind(b"\n", 0, end)
+                if newline < 0:
+                    break
+                found += 1
+                if found >= lines:
+                    return found, start + newline + 1
+                end = newline
+            pos = start
+        return found + 1, 0
+    except OSError as e:
+        logg.debug("can not read %s >> %s", filename, e)
+        return 0, 0
+    finally:
+        os.close(fd)
+
+def write_all(fd: int, data: bytes) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.write(fd, view)
+        view = view[written:]
+
+_log_time_span = re.compile(r"(\d+) *(seconds|second|secs|sec|s|minutes|minute|mins|min|m|hours|hour|hr|h|days|day|d|weeks|week|w)(?![a-z])")
+_log_time_units = {"s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+                   "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+                   "h": 3600, "hr": 3600, "hour": 3600, "hours": 3600,
+                   "d": 86400, "day": 86400, "days": 86400, "w": 604800, "week": 604800, "weeks": 604800}
+def log_time_span(text: str) -> Optional[float]:
+    """ a relative time like '5min', '1h 30min' or '2 days' as seconds - or None
+        when any part of it is not a number with a known time unit """
+    item = text.strip()
+    seconds = 0.
+    pos = 0
+    for found in _log_time_span.finditer(item):
+        if item[pos:found.start()].strip():
+            return None
+        seconds += int(found.group(1)) * _log_time_units[found.group(2)]
+        pos = found.end()
+    if pos == 0 or item[pos:].strip():
+        return None
+    return seconds
+
+def log_time(text: str, now: Optional[float] = None) -> Optional[float]:
+    """ journalctl --since/--until values like '2024-01-31 02:10', '02:10:30', 'yesterday',
+        '-1h', '-5min' or '2 days ago' as seconds since the epoch - or None if it can not be parsed """
+    now = time.time() if now is None else now
+    item = str(text).strip()
+    today = datetime.datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    if item == "now":
+        return now
+    if item in ["today", "yesterday", "tomorrow"]:
+        days = {"today": 0, "yesterday": -1, "tomorrow": 1}[item]
+        return (today + datetime.timedelta(days=days)).timestamp()
+    if item.startswith("@"):
+        try:
+            return float(item[1:])
+        except ValueError:
+            return None
+    if item.startswith("-") or item.endswith(" ago"):
+        span = log_time_span(item[1:] if item.startswith("-") else item[:-len(" ago")])
+        return now - span if span is not None else None
+    for fmt in ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"]:
+        try:
+            return datetime.datetime.strptime(item, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ["%H:%M:%S", "%H:%M"]:
+        try:
+            clock = datetime.datetime.strptime(item, fmt)
+            return today.replace(hour=clock.hour, minute=clock.minute, second=clock.second).timestamp()
+        except ValueError:
+            pass
+    return None
+
+def size_to_bytes(text: str) -> int:
+    """ journald.conf sizes like 64M are based on 1024 - empty is zero """
+    item = str(text).strip().upper()
+    if item.endswith("B"):
+        item = item[:-1]
+    factor = 1
+    for unit in "KMGTPE":
+        factor *= 1024
+        if item.endswith(unit):
+            return int(float(item[:-1] or "0") * factor)
+    return int(float(item or "0"))
+
 def shutil_truncate(filename: str) -> None:
     """ truncates the file (or creates a new empty file)"""
     filedir = os.path.dirname(filename)
     if not os.path.isdir(filedir):
-        os.makedirs(filedir)
+        os.makedirs(filedir, exist_ok=True)
     with open(filename, "w") as f:
         f.write("")
 
@@ -655,6 +835,30 @@ def _pid_exists(pid: int) -> bool:
             raise
     else:
         return True
+_libc = None # ctypes.CDLL, loaded once
+def libc_call(name: str, *args: Union[int, bytes]) -> int:
+    """ call a function of the C library that python does not have. The library is
+        loaded on the first call only. A result below zero raises the errno as OSError. """
+    global _libc # pylint: disable=global-statement
+    import ctypes # pylint: disable=import-outside-toplevel
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    result = int(getattr(_libc, name)(*args))
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+def set_child_subreaper() -> bool:
+    """ prctl(PR_SET_CHILD_SUBREAPER) makes orphaned processes to be reparented
+        to us, so that the init-loop gets a SIGCHLD for them like PID 1 does. """
+    try:
+        PR_SET_CHILD_SUBREAPER = 36
+        libc_call("prctl", PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0)
+        return True
+    except (ImportError, OSError, AttributeError) as e:
+        logg.debug("can not be a child subreaper >> %s", e)
+        return False
+
 def pid_zombie(pid: int) -> bool:
     """ may be a pid exists but it is only a zombie """
     if pid is None:
@@ -670,17 +874,162 @@ def _pid_zombie(pid: int) -> bool:
         # On certain systems 0 is a valid PID but we have no way
         # to know that in a portable fashion.
         raise ValueError('invalid PID 0')
-    check = _proc_pid_status.format(**locals())
+    check = _proc_pid_stat.format(**locals())
     try:
         with open(check) as f:
-            for line in f:
-                if line.startswith("State:"):
-                    return "Z" in line
+            stat = SystemctlProcessInfo.parse(pid, f.readline())
+            return stat is not None and stat.state == "Z"
     except IOError as e:
         if e.errno != errno.ENOENT:
             logg.error("%s (%s) >> %s", check, e.errno, e)
         return False
-    return False
+
+class SystemctlProcessInfo(NamedTuple):
+    pid: int
+    comm: str
+    state: str
+    ppid: int
+    pgid: int
+    sid: int
+    starttime: int # clock ticks after boot
+    @staticmethod
+    def parse(pid: int, line: str) -> Optional["SystemctlProcessInfo"]:
+        """ the line from /proc/<pid>/stat - the comm may contain spaces and parentheses """
+        start, end = line.find("("), line.rfind(")")
+        if start < 0 or end < start:
+            return None
+        fields = line[end+1:].split()
+        if len(fields) < 20:
+            return None
+        try:
+            return SystemctlProcessInfo(pid, line[start+1:end], fields[0], int(fields[1]),
+                                        int(fields[2]), int(fields[3]), int(fields[19]))
+        except ValueError:
+            return None
+
+class SystemctlProcessTable:
+    """ a snapshot of /proc reading each /proc/<pid>/stat once """
+    procs: Dict[int, SystemctlProcessInfo]
+    children: Dict[int, List[int]]
+    sessions: Dict[int, List[int]]
+    cmdlines: Dict[int, List[str]]
+    created: float
+    generation: int
+    def __init__(self) -> None:
+        self.procs = {}
+        self.children = {}
+        self.sessions = {}
+        self.cmdlines = {}
+        self.created = time.monotonic()
+        self.generation = _proc_forks
+        for pid_entry in os.listdir(_proc_pid_dir):
+            pid = to_intN(pid_entry)
+            if pid is None:
+                continue
+            proc_stat = _proc_pid_stat.format(**locals())
+            try:
+                with open(proc_stat) as f:
+                    info = SystemctlProcessInfo.parse(pid, f.readline())
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    logg.warning("%s >> %s", proc_stat, e)
+                continue
+            if info is None:
+                logg.warning("%s >> unknown format", proc_stat)
+                continue
+            self.procs[pid] = info
+            self.children.setdefault(info.ppid, []).append(pid)
+            self.sessions.setdefault(info.sid, []).append(pid)
+    def expired(self) -> bool:
+        """ we did fork a process since, or it is getting old """
+        return self.generation != _proc_forks or self.created + ProcTableMaxAge < time.monotonic()
+    def descendants(self, pid: int) -> List[int]:
+        """ the pid and its children and their children """
+        pids = [pid]
+        level = [pid]
+        for depth in range(PROC_MAX_DEPTH):
+            level = [child for parent in level for child in self.children.get(parent, [])]
+            if not level:
+                break
+            pids += level
+        return pids
+    def session(self, sid: int) -> List[int]:
+        return self.sessions.get(sid, [])
+    def cmdline(self, pid: int) -> List[str]:
+        """ the arguments of the process, or empty when it is gone """
+        if pid not in self.cmdlines:
+            cmdline = _proc_pid_cmdline.format(**locals())
+            try:
+                with open(cmdline) as f:
+                    self.cmdlines[pid] = f.read().split("\0")
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                self.cmdlines[pid] = []
+        return self.cmdlines[pid]
+
+def pid_starttime(pid: int) -> Optional[int]:
+    """ the starttime of the process now - or None when it is gone """
+    proc_stat = _proc_pid_stat.format(**locals())
+    try:
+        with open(proc_stat) as f:
+            info = SystemctlProcessInfo.parse(pid, f.readline())
+    except IOError:
+        return None
+    return info.starttime if info else None
+
+_proc_forks = 0
+def _proc_forked() -> None:
+    global _proc_forks # pylint: disable=global-statement
+    _proc_forks += 1
+if hasattr(os, "register_at_fork"): # python3.7+
+    os.register_at_fork(after_in_parent=_proc_forked)
+
+_clock_ticks = 0
+def clock_ticks() -> int:
+    """ SC_CLK_TCK as the unit of the starttime in /proc/<pid>/stat """
+    global _clock_ticks # pylint: disable=global-statement
+    if not _clock_ticks:
+        _clock_ticks = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+    return _clock_ticks
+
+IN_MODIFY = 0x00000002
+IN_Q_OVERFLOW = 0x00004000
+_iov_max = 1024 # IOV_MAX on linux
+def inotify_init() -> int:
+    """ inotify_init1(IN_NONBLOCK | IN_CLOEXEC) - or -1 when it is not available """
+    try:
+        return libc_call("inotify_init1", os.O_NONBLOCK | os.O_CLOEXEC)
+    except (ImportError, OSError, AttributeError) as e:
+        logg.debug("can not use inotify >> %s", e)
+        return -1
+def inotify_add_watch(fd: int, path: str, mask: int = IN_MODIFY) -> int:
+    """ returns the watch descriptor - or -1 when the path can not be watched """
+    try:
+        return libc_call("inotify_add_watch", fd, os.fsencode(path), mask)
+    except (ImportError, OSError, AttributeError) as e:
+        logg.debug("can not watch %s >> %s", path, e)
+        return -1
+def inotify_read(fd: int) -> Optional[Set[int]]:
+    """ the watch descriptors that had an event - or None if the event queue did overflow """
+    changed: Set[int] = set()
+    overflow = False
+    while True:
+        try:
+            buf = os.read(fd, 4096)
+        except BlockingIOError:
+            break
+        if not buf:
+            break
+        pos = 0
+        while pos + 16 <= len(buf):
+            wd, mask, _cookie, size = struct.unpack_from("iIII", buf, pos)
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            else:
+                changed.add(wd)
+            pos += 16 + size
+    return None if overflow else changed
 
 def get_unit_type(module: str) -> Optional[str]:
     name, ext = os.path.splitext(module)
@@ -746,6 +1095,7 @@ class SystemctlConfData:
     _allow_no_value: bool
     _conf: Dict[str, Dict[str, List[str]]]
     _files: List[str]
+    _record: Optional[List[Tuple[str, str, Optional[str]]]]
     def __init__(self, defaults: Optional[Dict[str, str]] = None, dict_type: Optional[Type[Dict[str, List[str]]]] = None, conf_type: Optional[Type[Dict[str, Dict[str, List[str]]]]] = None, allow_no_value: bool = False) -> None:
         self._defaults = defaults or {}
         self._conf_type = conf_type or _default_conf_type
@@ -753,11 +1103,14 @@ class SystemctlConfData:
         self._allow_no_value = allow_no_value
         self._conf = self._conf_type()
         self._files = []
+        self._record = None # (section, option, value) calls for the unit catalog
     def defaults(self) -> Dict[str, str]:
         return self._defaults
     def sections(self) -> List[str]:
         return list(self._conf.keys())
     def add_section(self, section: str) -> None:
+        if self._record is not None:
+            self._record.append((section, "", None))
         if section not in self._conf:
             self._conf[section] = self._dict_type()
     def has_section(self, section: str) -> bool:
@@ -767,6 +1120,8 @@ class SystemctlConfData:
             return False
         return option in self._conf[section]
     def set(self, section: str, option: str, value: Optional[str]) -> None:
+        if self._record is not None:
+            self._record.append((section, option, value))
         if section not in self._conf:
             self._conf[section] = self._dict_type()
         if value is None:
@@ -822,6 +1177,14 @@ class SystemctlConfData:
         return self._conf[section][option] # returns a list, possibly empty
     def filenames(self) -> List[str]:
         return self._files
+    def replay(self, filenames: List[str], record: List[Tuple[str, str, Optional[str]]]) -> None:
+        """ same as parsing the files again from their recorded calls """
+        self._files.extend(filenames)
+        for section, option, value in record:
+            if not option:
+                self.add_section(section)
+            else:
+                self.set(section, option, value)
 
 class SystemctlConfigParser(SystemctlConfData):
     """ A *.service files has a structure similar to an *.ini file but it is
@@ -830,66 +1193,138 @@ class SystemctlConfigParser(SystemctlConfData):
         globally uniqute, so that an 'environment' can be printed without
         adding prefixes. Settings are continued with a backslash at the end
         of the line.  """
-    # def __init__(self, defaults=None, dict_type=None, allow_no_value=False):
-    #   SystemctlConfData.__init__(self, defaults, dict_type, allow_no_value)
+    _pending: Dict[str, List[Tuple[str, int, int]]]
+    _texts: Dict[str, str]
+    def __init__(self, defaults: Optional[Dict[str, str]] = None, dict_type: Optional[Type[Dict[str, List[str]]]] = None,
+                 conf_type: Optional[Type[Dict[str, Dict[str, List[str]]]]] = None, allow_no_value: bool = False) -> None:
+        SystemctlConfData.__init__(self, defaults, dict_type, conf_type, allow_no_value)
+        self._pending = {} # section -> (filename, start, end) not parsed so far
+        self._texts = {} # filename -> content with pending sections
+    def has_option(self, section: str, option: str) -> bool:
+        self.load_section(section)
+        return SystemctlConfData.has_option(self, section, option)
+    def set(self, section: str, option: str, value: Optional[str]) -> None:
+        self.load_section(section)
+        SystemctlConfData.set(self, section, option, value)
+    def get(self, section: str, option: str, default: Optional[str] = None, allow_no_value: bool = False) -> Optional[str]:
+        self.load_section(section)
+        return SystemctlConfData.get(self, section, option, default, allow_no_value)
+    def getlist(self, section: str, option: str, default: Optional[List[str]] = None, allow_no_value: bool = False) -> List[str]:
+        self.load_section(section)
+        return SystemctlConfData.getlist(self, section, option, default, allow_no_value)
+    def load_section(self, section: str) -> None:
+        """ parse the parts of the files that were deferred for this section """
+        if section not in self._pending:
+            return
+        for filename, start, end in self._pending.pop(section):
+            self.parse_unit_text(filename, section, self._texts[filename][start:end])
+        used = set(filename for parts in self._pending.values() for filename, _, _ in parts)
+        for filename in [filename for filename in self._texts if filename not in used]:
+            del self._texts[filename]
     def read(self, filename: str) -> 'SystemctlConfigParser': # FIXME: Self in python3.11
         return self.read_unit_file(filename)
     def read_unit_file(self, filename: str) -> 'SystemctlConfigParser': # FIXME: Self in python3.11
-        initscript = False
-        initinfo = False
-        section = "GLOBAL"
-        nextline = False
-        name, text = "", ""
+        """ the sections are only parsed when they are used (except for .include files) """
         if os.path.isfile(filename):
             self._files.append(filename)
         with open(filename) as f:
-            for orig_line in f:
-                if nextline:
-                    text += orig_line
-                    if text.rstrip().endswith("\\") or text.rstrip().endswith("\\\n"):
-                        text = text.rstrip() + "\n"
-                    else:
-                        self.set(section, name, text)
-                        nextline = False
-                    continue
-                line = orig_line.strip()
-                if not line:
-                    continue
-                if line.startswith("#"):
-                    continue
-                if line.startswith(";"):
-                    continue
-                if line.startswith(".include"):
-                    logg.error("the '.include' syntax is deprecated. Use x.service.d/ drop-in files!")
-                    includefile = re.sub(r'^\.include[ ]*', '', line).rstrip()
-                    if not os.path.isabs(includefile):
-                        includefile = os.path.join(os.path.dirname(filename), includefile)
-                    else:
-                        includefile = os_path(_root, includefile)
-                    if not os.path.isfile(includefile):
-                        raise FileNotFoundError(2, "tried to include file that doesn't exist", includefile)
-                    self.read_unit_file(includefile)
-                    continue
-                if line.startswith("["):
-                    x = line.find("]")
-                    if x > 0:
-                        section = line[1:x]
-                        self.add_section(section)
-                    continue
-                m = re.match(r"(\w+) *=(.*)", line)
-                if not m:
-                    logg.warning("bad ini line: %s", line)
-                    raise ValueError("bad ini line")
-                name, text = m.group(1), m.group(2).strip()
-                if text.endswith("\\") or text.endswith("\\\n"):
-                    nextline = True
-                    text = text + "\n"
-                else:
-                    # hint: an empty line shall reset the value-list
-                    self.set(section, name, text and text or None)
-            if nextline:
-                self.set(section, name, text)
+            content = f.read()
+        sections = None
+        if LAZY_SECTIONS and self._record is None:
+            sections = self.scan_unit_text(content)
+        if sections is None:
+            self.parse_unit_text(filename, "GLOBAL", content)
+            return self
+        for section, start, end in sections:
+            self.add_section(section) # in the order of the file, also GLOBAL
+            if start >= 0:
+                self._pending.setdefault(section, []).append((filename, start, end))
+                self._texts[filename] = content
         return self
+    def scan_unit_text(self, content: str) -> Optional[List[Tuple[str, int, int]]]:
+        """ the section headers with the (start, end) offsets of their settings (start=-1
+            for the header itself), or None when the text has an '.include' line """
+        sections: List[Tuple[str, int, int]] = []
+        section = "GLOBAL"
+        start, settings = 0, False
+        nextline = False
+        offset = 0
+        for line in content.split("\n"):
+            linestart, offset = offset, offset + len(line) + 1
+            if nextline: # (the parser does continue over an empty line)
+                nextline = not line.strip() or line.rstrip().endswith("\\")
+                continue
+            line = line.strip()
+            if not line or line.startswith("#") or line.startswith(";"):
+                continue
+            if line.startswith(".include"):
+                return None
+            if line.startswith("["):
+                x = line.find("]")
+                if x > 0:
+                    if settings:
+                        sections.append((section, start, linestart))
+                    section = line[1:x]
+                    sections.append((section, -1, -1))
+                    start, settings = offset, False
+                continue
+            if not _unit_setting.match(line):
+                logg.warning("bad ini line: %s", line)
+                raise ValueError("bad ini line")
+            settings = True
+            nextline = line.endswith("\\")
+        if settings:
+            sections.append((section, start, offset))
+        return sections
+    def parse_unit_text(self, filename: str, section: str, content: str) -> None:
+        nextline = False
+        name, text = "", ""
+        for orig_line in io.StringIO(content):
+            if nextline:
+                text += orig_line
+                if text.rstrip().endswith("\\") or text.rstrip().endswith("\\\n"):
+                    text = text.rstrip() + "\n"
+                else:
+                    self.set(section, name, text)
+                    nextline = False
+                continue
+            line = orig_line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                continue
+            if line.startswith(";"):
+                continue
+            if line.startswith(".include"):
+                logg.error("the '.include' syntax is deprecated. Use x.service.d/ drop-in files!")
+                includefile = re.sub(r'^\.include[ ]*', '', line).rstrip()
+                if not os.path.isabs(includefile):
+                    includefile = os.path.join(os.path.dirname(filename), includefile)
+                else:
+                    includefile = os_path(_root, includefile)
+                if not os.path.isfile(includefile):
+                    raise FileNotFoundError(2, "tried to include file that doesn't exist", includefile)
+                self.read_unit_file(includefile)
+                continue
+            if line.startswith("["):
+                x = line.find("]")
+                if x > 0:
+                    section = line[1:x]
+                    self.add_section(section)
+                continue
+            m = re.match(r"(\w+) *=(.*)", line)
+            if not m:
+                logg.warning("bad ini line: %s", line)
+                raise ValueError("bad ini line")
+            name, text = m.group(1), m.group(2).strip()
+            if text.endswith("\\") or text.endswith("\\\n"):
+                nextline = True
+                text = text + "\n"
+            else:
+                # hint: an empty line shall reset the value-list
+                self.set(section, name, text and text or None)
+        if nextline:
+            self.set(section, name, text)
     def read_sysv_file(self, filename: str) -> 'SystemctlConfigParser':
         """ an LSB header is scanned and converted to (almost)
             equivalent settings of a SystemD ini-style input """
@@ -958,12 +1393,16 @@ class SystemctlConf:
     module: Optional[str]
     nonloaded_path: str
     drop_in_files: Dict[str, str]
+    status_pending: int
+    status_dirty: bool
     _root: str
     _user_mode: bool
     def __init__(self, data: SystemctlConfData, module: Optional[str] = None) -> None:
         self.data = data # UnitConfParser
         self.env = {}
         self.status = None
+        self.status_pending = 0
+        self.status_dirty = False
         self.masked = None
         self.module = module
         self.nonloaded_path = ""
@@ -1050,14 +1489,52 @@ class PresetFile:
                 self._lines.append(line.strip())
         return self
     def get_preset(self, unit: str) -> Optional[str]:
+        for status, pattern in self.rules():
+            if fnmatch.fnmatchcase(unit, pattern):
+                logg.debug("%s %s => %s %s", status, pattern, unit, strQ(self.filename()))
+                return status
+        return None
+    def rules(self) -> List[Tuple[str, str]]:
+        """ the (status, pattern) of the enable/disable lines in their order """
+        result: List[Tuple[str, str]] = []
         for line in self._lines:
             m = re.match(r"(enable|disable)\s+(\S+)", line)
             if m:
-                status, pattern = m.group(1), m.group(2)
-                if fnmatch.fnmatchcase(unit, pattern):
-                    logg.debug("%s %s => %s %s", status, pattern, unit, strQ(self.filename()))
-                    return status
-        return None
+                result.append((m.group(1), m.group(2)))
+        return result
+
+class SystemctlPresetRules:
+    """ The rules of all preset files in their order, compiled so that the
+        first matching rule is found with one dict lookup and one regex match.
+        Each glob rule is a named group 'r<index>' of the merged regex where the
+        first alternative that matches is the first glob rule that matches. """
+    rules: List[Tuple[str, str, Optional[str]]]
+    exact: Dict[str, int]
+    regex: Optional[Pattern[str]]
+    def __init__(self, presets: Iterable[PresetFile]) -> None:
+        self.rules = [] # (status, pattern, filename)
+        self.exact = {}
+        globs: List[str] = []
+        for preset in presets:
+            for status, pattern in preset.rules():
+                index = len(self.rules)
+                self.rules.append((status, pattern, preset.filename()))
+                if not _glob_magic.search(pattern):
+                    self.exact.setdefault(pattern, index)
+                else:
+                    globs.append("(?P<r%i>%s)" % (index, fnmatch.translate(pattern)))
+        self.regex = re.compile("|".join(globs)) if globs else None
+    def get_preset(self, unit: str) -> Optional[str]:
+        found = self.exact.get(unit, len(self.rules))
+        if self.regex is not None:
+            m = self.regex.match(unit)
+            if m and m.lastgroup:
+                found = min(found, int(m.lastgroup[1:]))
+        if found >= len(self.rules):
+            return None
+        status, pattern, filename = self.rules[found]
+        logg.debug("%s %s => %s %s", status, pattern, unit, strQ(filename))
+        return status
 
 ## with waitlock(conf): self.start()
 class waitlock:
@@ -1072,7 +1549,7 @@ class waitlock:
         try:
             folder = self.lockfolder
             if not os.path.isdir(folder):
-                os.makedirs(folder)
+                os.makedirs(folder, exist_ok=True)
         except OSError as e:
             logg.warning("oops >> %s", e)
     def lockfile(self) -> str:
@@ -1085,31 +1562,72 @@ class waitlock:
             lockfile = self.lockfile()
             lockname = os.path.basename(lockfile)
             self.opened = os.open(lockfile, os.O_RDWR | os.O_CREAT, 0o600)
-            for attempt in range(int(MaxLockWait or DefaultMaximumTimeout)):
-                try:
-                    logg.log(DEBUG_FLOCK, "[%s] %s trying %s _______ ", os.getpid(), delayed(attempt), lockname)
-                    fcntl.flock(self.opened, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    st = os.fstat(self.opened)
-                    if not st.st_nlink:
-                        logg.log(DEBUG_FLOCK, "[%s] %s %s got deleted, trying again", os.getpid(), delayed(attempt), lockname)
-                        os.close(self.opened)
-                        self.opened = os.open(lockfile, os.O_RDWR | os.O_CREAT, 0o600)
-                        continue
-                    content = "{ 'systemctl': %s, 'lock': '%s' }\n" % (os.getpid(), lockname)
-                    os.write(self.opened, content.encode("utf-8"))
-                    logg.log(DEBUG_FLOCK, "[%s] %s holding lock on %s", os.getpid(), delayed(attempt), lockname)
-                    return True
-                except IOError as e:
-                    whom = os.read(self.opened, 4096)
-                    os.lseek(self.opened, 0, os.SEEK_SET)
-                    logg.info("[%s] %s systemctl locked by %s", os.getpid(), delayed(attempt), whom.rstrip())
-                    time.sleep(1) # until MaxLockWait
+            started = time.monotonic()
+            deadline = started + int(MaxLockWait or DefaultMaximumTimeout)
+            attempt = 0
+            while self.flock(lockname, attempt, deadline):
+                st = os.fstat(self.opened)
+                if not st.st_nlink:
+                    logg.log(DEBUG_FLOCK, "[%s] %s %s got deleted, trying again", os.getpid(), delayed(attempt), lockname)
+                    os.close(self.opened)
+                    self.opened = os.open(lockfile, os.O_RDWR | os.O_CREAT, 0o600)
+                    attempt += 1
                     continue
+                content = "{ 'systemctl': %s, 'lock': '%s' }\n" % (os.getpid(), lockname)
+                os.write(self.opened, content.encode("utf-8"))
+                waited = time.monotonic() - started
+                if waited > LockWaitInfo:
+                    logg.info("[%s] %s got the lock on %s after %.3fs", os.getpid(), delayed(attempt), lockname, waited)
+                logg.log(DEBUG_FLOCK, "[%s] %s holding lock on %s", os.getpid(), delayed(attempt), lockname)
+                return True
             logg.error("[%s] not able to get the lock to %s", os.getpid(), lockname)
         except OSError as e:
             logg.warning("[%s] oops %s >> %s", os.getpid(), str(type(e)), e)
         # TODO# raise Exception("no lock for %s", self.unit or "global")
         return False
+    def flock(self, lockname: str, attempt: int, deadline: float) -> bool:
+        """ wait for the lock until the deadline. The flock() is blocking in the kernel,
+            so we wake up right when the holder has released it. An ITIMER_REAL signal
+            interrupts it every second to log the holder, and at the deadline. The lock
+            is taken in the main thread (or a forked worker) where SIGALRM arrives. """
+        logg.log(DEBUG_FLOCK, "[%s] %s trying %s _______ ", os.getpid(), delayed(attempt), lockname)
+        try:
+            fcntl.flock(self.opened, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except IOError:
+            pass
+        blocking = [False]
+        def interrupt(signum: int, frame: Optional[FrameType]) -> None:
+            if blocking[0]:
+                raise TimeoutError(signum)
+        started = time.monotonic()
+        oldhandler = signal.signal(signal.SIGALRM, interrupt)
+        oldtimer, oldinterval = signal.setitimer(signal.ITIMER_REAL, 0)
+        try:
+            while True:
+                whom = os.pread(self.opened, 4096, 0)
+                logg.info("[%s] %s systemctl locked by %s", os.getpid(), delayed(attempt), whom.rstrip())
+                now = time.monotonic()
+                if now >= deadline:
+                    return False
+                wait = min(1.0, deadline - now)
+                if oldtimer:
+                    wait = min(wait, max(0.001, started + oldtimer - now))
+                signal.setitimer(signal.ITIMER_REAL, wait)
+                try:
+                    blocking[0] = True
+                    fcntl.flock(self.opened, fcntl.LOCK_EX)
+                    blocking[0] = False
+                    return True
+                except TimeoutError:
+                    blocking[0] = False
+                    attempt += 1
+        finally:
+            blocking[0] = False
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, oldhandler)
+            if oldtimer: # somebody else's timer continues
+                signal.setitimer(signal.ITIMER_REAL, max(0.001, started + oldtimer - time.monotonic()), oldinterval)
     def __exit__(self, exc: Optional[Type[BaseException]], value: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
         try:
             os.lseek(self.opened, 0, os.SEEK_SET)
@@ -1125,6 +1643,42 @@ class waitlock:
         except OSError as e:
             logg.warning("oops >> %s", e)
 
+def stat_key(filename: str) -> Optional[Tuple[int, int, int]]:
+    """ (inode, mtime, size) of a regular file - or None if it does not exist """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def split_status_line(line: str) -> Tuple[str, str]:
+    """ 'key=value' or 'key:value' => (key, value) where key must be a word, otherwise the key is empty """
+    eq, colon = line.find("="), line.find(":")
+    pos = colon if eq < 0 or 0 <= colon < eq else eq
+    if pos <= 0:
+        return "", line
+    name = line[:pos]
+    if not name.replace("_", "").isalnum():
+        return "", line
+    return name, line[pos+1:]
+
+class statusbuffer:
+    """ with-statement to collect the status changes of a unit - the status file is written once at the end """
+    conf: SystemctlConf
+    flush: Callable[[SystemctlConf], bool]
+    def __init__(self, conf: SystemctlConf, flush: Callable[[SystemctlConf], bool]) -> None:
+        self.conf = conf
+        self.flush = flush
+    def __enter__(self) -> bool:
+        self.conf.status_pending += 1
+        return True
+    def __exit__(self, exc: Optional[Type[BaseException]], value: Optional[BaseException], traceback: Optional[TracebackType]) -> None:
+        self.conf.status_pending -= 1
+        if not self.conf.status_pending:
+            self.flush(self.conf)
+
 class SystemctlWaitPID(NamedTuple):
     pid: Optional[int]
     returncode: Optional[int]
@@ -1156,6 +1710,31 @@ def subprocess_testpid(pid: int) -> SystemctlWaitPID:
         return SystemctlWaitPID(run_pid, os.WEXITSTATUS(run_stat), os.WTERMSIG(run_stat))
     else:
         return SystemctlWaitPID(pid, None, 0)
+def exec_status(status: int, err: int) -> None:
+    """ tell the parent about a failed execve (the status pipe is closed on success) """
+    if status >= 0:
+        if err:
+            os.write(status, str(err).encode("ascii"))
+        os.close(status)
+def pidfd_wait(pid: int, timeout: float) -> Optional[bool]:
+    """ wait for any process to exit (or to become a zombie) using a pidfd. Returns
+        None if not supported, otherwise whether the process is gone in time. """
+    pidfd_open = getattr(os, "pidfd_open", None) # python3.9+
+    if not WAIT_PIDFD or pidfd_open is None:
+        return None
+    try:
+        pidfd = pidfd_open(pid)
+    except ProcessLookupError:
+        return True
+    except OSError as e: # ENOSYS before linux 5.3
+        logg.debug("pidfd_open %s >> %s", pid, e)
+        return None
+    try:
+        poller = select.poll()
+        poller.register(pidfd, select.POLLIN)
+        return bool(poller.poll(max(0, int(timeout * 1000))))
+    finally:
+        os.close(pidfd)
 
 class SystemctlUnitName(NamedTuple):
     fullname: str
@@ -1273,72 +1852,98 @@ def getAfter(conf: SystemctlConf) -> List[str]:
                 result.append(name)
     return result
 
-def compareAfter(confA: SystemctlConf, confB: SystemctlConf) -> int:
-    idA = confA.name()
-    idB = confB.name()
-    for after in getAfter(confA):
-        if after == idB:
-            logg.debug("%s After %s", idA, idB)
-            return -1
-    for after in getAfter(confB):
-        if after == idA:
-            logg.debug("%s After %s", idB, idA)
-            return 1
-    for before in getBefore(confA):
-        if before == idB:
-            logg.debug("%s Before %s", idA, idB)
-            return 1
-    for before in getBefore(confB):
-        if before == idA:
-            logg.debug("%s Before %s", idB, idA)
-            return -1
-    return 0
+class SystemctlUnitOrder:
+    """ the After/Before ordering graph of a list of units. The edges
+        are collected once, the start order is a topological sort that
+        keeps the input order for units without a relation. """
+    def __init__(self, conflist: Iterable[SystemctlConf]) -> None:
+        self.conflist = list(conflist)
+        self.names = [conf.name() for conf in self.conflist]
+        self.succ: List[List[int]] = [[] for _ in self.conflist]
+        self.pred: List[List[int]] = [[] for _ in self.conflist]
+        self.cycles: List[List[str]] = []
+        index: Dict[str, List[int]] = {}
+        for pos, name in enumerate(self.names):
+            index.setdefault(name, []).append(pos)
+        edges: Set[Tuple[int, int]] = set()
+        for pos, conf in enumerate(self.conflist):
+            for after in getAfter(conf):
+                for other in index.get(after, []):
+                    if other != pos and (other, pos) not in edges:
+                        logg.log(DEBUG_AFTER, "%s After %s", self.names[pos], after)
+                        edges.add((other, pos))
+            for before in getBefore(conf):
+                for other in index.get(before, []):
+                    if other != pos and (pos, other) not in edges:
+                        logg.log(DEBUG_AFTER, "%s Before %s", self.names[pos], before)
+                        edges.add((pos, other))
+        for first, then in sorted(edges):
+            self.succ[first].append(then)
+            self.pred[then].append(first)
+    def ordered(self) -> List[int]:
+        """ Kahn's algorithm - ordering loops are reported and broken up """
+        indegree = [len(pred) for pred in self.pred]
+        ready = collections.deque([pos for pos, count in enumerate(indegree) if not count])
+        done = [False for _ in self.conflist]
+        order: List[int] = []
+        while len(order) < len(self.conflist):
+            if not ready:
+                cycle = self.find_cycle(done)
+                self.cycles.append([self.names[pos] for pos in cycle])
+                logg.error("found ordering cycle: %s", " -> ".join([self.names[pos] for pos in cycle + cycle[:1]]))
+                broken = cycle[0]
+                logg.error("ignoring the After/Before ordering of %s", self.names[broken])
+                indegree[broken] = 0
+                ready.append(broken)
+            pos = ready.popleft()
+            if done[pos]:
+                continue
+            done[pos] = True
+            order.append(pos)
+            for then in self.succ[pos]:
+                indegree[then] -= 1
+                if not indegree[then] and not done[then]:
+                    ready.append(then)
+        return order
+    def find_cycle(self, done: List[bool]) -> List[int]:
+        """ walk the predecessors of a blocked unit until one is seen again """
+        start = min([pos for pos, isdone in enumerate(done) if not isdone])
+        path: List[int] = []
+        seen: Dict[int, int] = {}
+        pos = start
+        while pos not in seen:
+            seen[pos] = len(path)
+            path.append(pos)
+            pos = [first for first in self.pred[pos] if not done[first]][0]
+        cycle = list(reversed(path[seen[pos]:]))
+        first = cycle.index(min(cycle))
+        return cycle[first:] + cycle[:first]
+    def ranks(self) -> List[int]:
+        """ the longest chain of units that need to be started after each unit """
+        order = self.ordered()
+        place = [0 for _ in self.conflist]
+        for num, pos in enumerate(order):
+            place[pos] = num
+        rank = [0 for _ in self.conflist]
+        for pos in reversed(order):
+            for then in self.succ[pos]:
+                if place[then] > place[pos] and rank[pos] <= rank[then]:
+                    rank[pos] = rank[then] + 1
+        return rank
+    def sorted_confs(self) -> List[SystemctlConf]:
+        rank = self.ranks()
+        for pos, name in enumerate(self.names):
+            logg.log(DEBUG_AFTER, "(%s) %s", rank[pos], name)
+        sortedlist = sorted(range(len(self.conflist)), key = lambda pos: -rank[pos])
+        for pos in sortedlist:
+            logg.log(DEBUG_AFTER, "[%s] %s", rank[pos], self.names[pos])
+        return [self.conflist[pos] for pos in sortedlist]
 
-def conf_sortedAfter(conflist: Iterable[SystemctlConf], cmp: Callable[[SystemctlConf, SystemctlConf], int] = compareAfter) -> List[SystemctlConf]:
-    # the normal sorted() does only look at two items
-    # so if "A after C" and a list [A, B, C] then
-    # it will see "A = B" and "B = C" assuming that
-    # "A = C" and the list is already sorted.
-    #
-    # To make a totalsorted we have to create a marker
-    # that informs sorted() that also B has a relation.
-    # It only works when 'after' has a direction, so
-    # anything without 'before' is a 'after'. In that
-    # case we find that "B after C".
-    class SortTuple:
-        def __init__(self, rank: int, conf: SystemctlConf) -> None:
-            self.rank = rank
-            self.conf = conf
-    sortlist = [SortTuple(0, conf) for conf in conflist]
-    for check in range(len(sortlist)): # maxrank = len(sortlist)
-        changed = 0
-        for A in range(len(sortlist)):
-            for B in range(len(sortlist)):
-                if A != B:
-                    itemA = sortlist[A]
-                    itemB = sortlist[B]
-                    before = compareAfter(itemA.conf, itemB.conf)
-                    if before > 0 and itemA.rank <= itemB.rank:
-                        logg.log(DEBUG_AFTER, "  %-30s before %s", itemA.conf.name(), itemB.conf.name())
-                        itemA.rank = itemB.rank + 1
-                        changed += 1
-                    if before < 0 and itemB.rank <= itemA.rank:
-                        logg.log(DEBUG_AFTER, "  %-30s before %s", itemB.conf.name(), itemA.conf.name())
-                        itemB.rank = itemA.rank + 1
-                        changed += 1
-        if not changed:
-            logg.log(DEBUG_AFTER, "done in check %s of %s", check, len(sortlist))
-            break
-            # because Requires is almost always the same as the After clauses
-            # we are mostly done in round 1 as the list is in required order
-    for conf in conflist:
-        logg.log(DEBUG_AFTER, ".. %s", conf.name())
-    for item in sortlist:
-        logg.log(DEBUG_AFTER, "(%s) %s", item.rank, item.conf.name())
-    sortedlist = sorted(sortlist, key = lambda item: -item.rank)
-    for item in sortedlist:
-        logg.log(DEBUG_AFTER, "[%s] %s", item.rank, item.conf.name())
-    return [item.conf for item in sortedlist]
+def conf_sortedAfter(conflist: Iterable[SystemctlConf]) -> List[SystemctlConf]:
+    # Units without an After/Before relation keep their place
+    # in the input list. The After/Before edges are collected
+    # in a single graph over all units.
+    return SystemctlUnitOrder(conflist).sorted_confs()
 
 def read_env_file(filename: str, root: Optional[str] = NIX) -> Iterator[Tuple[str, str]]:
     try:
@@ -1362,6 +1967,142 @@ def read_env_file(filename: str, root: Optional[str] = NIX) -> Iterator[Tuple[st
     except OSError as e:
         logg.log(INFO_EXPAND, "while reading %s >> %s", filename, e)
 
+class SystemctlCatalogListing(NamedTuple):
+    stat: List[int]
+    files: List[str]
+    dirs: List[str]
+
+class SystemctlCatalogParsed(NamedTuple):
+    stat: List[int]
+    record: List[Tuple[str, str, Optional[str]]]
+
+class SystemctlUnitCatalog:
+    """ The unit folder listings and the parsed unit files, written by daemon-reload.
+        An entry is trusted while the mtime/inode of the folder (or file) is the same,
+        and it was not modified close to the time the catalog was written. """
+    filename: str
+    folders: List[str]
+    written: int
+    listings: Dict[str, SystemctlCatalogListing]
+    parsed: Dict[str, SystemctlCatalogParsed]
+    scanned: Set[str]
+    recording: bool
+    def __init__(self, filename: str, folders: List[str]) -> None:
+        self.filename = filename
+        self.folders = folders # the search path the entries were made for
+        self.written = 0
+        self.listings = {}
+        self.parsed = {}
+        self.scanned = set() # entries made by this process
+        self.recording = False # parsed files are only kept for daemon-reload
+    def load(self) -> bool:
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+            if data["folders"] != self.folders:
+                logg.log(DEBUG_CATALOG, "catalog %s was for other folders", self.filename)
+                return False
+            written = int(data["written"])
+            listings = dict((str(folder), SystemctlCatalogListing([int(x) for x in item[0]],
+                                                                  [str(x) for x in item[1]], [str(x) for x in item[2]]))
+                            for folder, item in data["listings"].items())
+            parsed = dict((str(path), SystemctlCatalogParsed([int(x) for x in item[0]],
+                                                             [(str(sec), str(opt), None if val is None else str(val))
+                                                              for sec, opt, val in item[1]]))
+                          for path, item in data["parsed"].items())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logg.log(DEBUG_CATALOG, "catalog %s not loaded >> %s", self.filename, e)
+            return False
+        self.written, self.listings, self.parsed = written, listings, parsed
+        logg.log(DEBUG_CATALOG, "catalog %s has %s folders and %s files", self.filename, len(listings), len(parsed))
+        return True
+    def save(self) -> bool:
+        self.written = time.time_ns()
+        data = {"folders": self.folders, "written": self.written,
+                "listings": dict((folder, list(item)) for folder, item in self.listings.items()),
+                "parsed": dict((path, list(item)) for path, item in self.parsed.items())}
+        try:
+            dirpath = os.path.dirname(self.filename)
+            if not os.path.isdir(dirpath):
+                os.makedirs(dirpath, exist_ok=True)
+            tmpfile = self.filename + ".tmp"
+            with open(tmpfile, "w") as f:
+                json.dump(data, f)
+            os.replace(tmpfile, self.filename)
+        except OSError as e:
+            logg.log(DEBUG_CATALOG, "catalog %s not written >> %s", self.filename, e)
+            return False
+        logg.log(DEBUG_CATALOG, "catalog %s written for %s folders and %s files", self.filename, len(self.listings), len(self.parsed))
+        return True
+    def fresh(self, stat: List[int], path: str, nodes: Callable[[os.stat_result], List[int]]) -> bool:
+        try:
+            now = nodes(os.stat(path))
+        except OSError:
+            return False
+        return now == stat and now[0] < self.written - CATALOG_RACY_NS
+    def listing(self, folder: str, recheck: bool = False) -> Optional[SystemctlCatalogListing]:
+        item = self.listings.get(folder)
+        if item is None:
+            return None
+        if folder not in self.scanned or recheck:
+            if not self.fresh(item.stat, folder, catalog_dir_stat):
+                return None
+            self.scanned.add(folder)
+        return item
+    def set_listing(self, folder: str, stat: List[int], files: List[str], dirs: List[str]) -> None:
+        self.listings[folder] = SystemctlCatalogListing(stat, files, dirs)
+        self.scanned.add(folder)
+    def parsed_file(self, path: str) -> Optional[SystemctlCatalogParsed]:
+        item = self.parsed.get(path)
+        if item is None or not self.fresh(item.stat, path, catalog_file_stat):
+            return None
+        return item
+    def set_parsed(self, path: str, stat: List[int], record: List[Tuple[str, str, Optional[str]]]) -> None:
+        self.parsed[path] = SystemctlCatalogParsed(stat, record)
+
+class SystemctlEnablementIndex:
+    """ The entries of all *.wants/*.requires folders (and the rc.d folders)
+        from one scan, with the folders that each unit name was found in. The
+        stat of the scanned folders tells when another process did change them. """
+    units: Dict[str, List[str]]
+    wanted: Dict[str, Set[str]]
+    stats: Dict[str, List[int]]
+    scanned: int
+    def __init__(self) -> None:
+        self.units = {} # folder -> sorted names (without subdirectories)
+        self.wanted = {} # name -> folders
+        self.stats = {} # folder -> catalog_dir_stat (empty if missing)
+        self.scanned = time.time_ns()
+    def add(self, folder: str, names: List[str]) -> None:
+        self.units[folder] = sorted(names)
+        for name in names:
+            self.wanted.setdefault(name, set()).add(folder)
+    def watch(self, folder: str, stat: List[int]) -> None:
+        self.stats[folder] = stat
+    def fresh(self) -> bool:
+        for folder, stat in self.stats.items():
+            try:
+                now = catalog_dir_stat(os.stat(folder))
+            except OSError:
+                now = []
+            if now != stat:
+                return False
+            if now and now[0] >= self.scanned - CATALOG_RACY_NS:
+                return False # modified while it was scanned
+        return True
+    def listed(self, folder: str) -> List[str]:
+        return self.units.get(folder, [])
+    def wanted_in(self, name: str, folder: str) -> bool:
+        return folder in self.wanted.get(name, ())
+
+CATALOG_RACY_NS = 2 * 1000000000 # modified while the catalog was written
+def catalog_dir_stat(st: os.stat_result) -> List[int]:
+    return [st.st_mtime_ns, st.st_ino, st.st_dev]
+def catalog_file_stat(st: os.stat_result) -> List[int]:
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
 class SystemctlUnitFiles:
     """ database of loaded unit descriptors and expansion helpers for them. """
     _root: str
@@ -1377,7 +2118,14 @@ class SystemctlUnitFiles:
     _loaded_unit_conf: Dict[str, SystemctlConf]
     _file_for_sysv: Dict[str, str]
     _file_for_unit: Dict[str, str]
+    _sorted_sysv: Optional[List[str]]
+    _sorted_unit: Optional[List[str]]
+    _enablement: Optional[SystemctlEnablementIndex]
+    _drop_in_dirs: Dict[str, List[str]]
+    _depends_dirs: Dict[str, List[str]]
     _preset_file_list: Optional[Dict[str, PresetFile]]
+    _preset_rules: Optional[SystemctlPresetRules]
+    _catalog: Optional[SystemctlUnitCatalog]
     def __init__(self, root: str = NIX) -> None:
         self._root = root or _root
         self._user_mode = _user_mode
@@ -1393,7 +2141,14 @@ class SystemctlUnitFiles:
         self._loaded_unit_conf = {} # /etc/systemd/system/name.service => config data
         self._file_for_sysv = {} # name.service => /etc/init.d/name
         self._file_for_unit = {} # name.service => /etc/systemd/system/name.service
+        self._sorted_sysv = None
+        self._sorted_unit = None
+        self._enablement = None
+        self._drop_in_dirs = {} # name.service.d => [/etc/systemd/system/name.service.d]
+        self._depends_dirs = {} # name.target.wants => [/etc/systemd/system/name.target.wants]
         self._preset_file_list = None # /etc/systemd/system-preset/* => file content
+        self._preset_rules = None
+        self._catalog = None # from daemon-reload
     def os_path(self, path: str) -> str:
         return os_path(self._root, path)
     def user(self) -> str:
@@ -1466,21 +2221,25 @@ class SystemctlUnitFiles:
             for folder in self.system_folders():
                 yield folder
     def scan_unit_files(self, reload: bool = False) -> List[str]: # -> [ unit-names,... ]
-        """ reads all unit files, returns the first filename for the unit given """
+        """ reads all unit files, returns the first filename for the unit given.
+            The same pass indexes the unit.d and unit.wants/unit.requires folders. """
         if not self._loaded_unit_files or reload:
             self._loaded_unit_files = time.time()
+            self._drop_in_dirs = {}
+            self._depends_dirs = {}
             found = 0
             for folder in self.unit_file_folders():
                 if not folder:
                     continue
                 folder = self.os_path(folder)
-                if not os.path.isdir(folder):
-                    continue
-                for name in os.listdir(folder):
-                    path = os.path.join(folder, name)
-                    if os.path.isdir(path):
-                        continue
-                    found = self.add_unit_file(name, path)
+                listing = self.list_folder(folder, reload)
+                for name in listing.files:
+                    found = self.add_unit_file(name, os.path.join(folder, name))
+                for name in listing.dirs:
+                    if name.endswith(".d"):
+                        self._drop_in_dirs.setdefault(name, []).append(os.path.join(folder, name))
+                    elif name.endswith(".wants") or name.endswith(".requires"):
+                        self._depends_dirs.setdefault(name, []).append(os.path.join(folder, name))
             logg.debug("found %s unit files", found)
         return list(self._file_for_unit.keys())
     def scan_sysv_files(self, reload: bool = False) -> List[str]: # -> [ unit-names,... ]
@@ -1492,24 +2251,129 @@ class SystemctlUnitFiles:
                 if not folder:
                     continue
                 folder = self.os_path(folder)
-                if not os.path.isdir(folder):
-                    continue
-                for name in os.listdir(folder):
-                    path = os.path.join(folder, name)
-                    if os.path.isdir(path):
-                        continue
-                    found = self.add_sysv_file(name, path)
+                for name in self.list_folder(folder, reload).files:
+                    found = self.add_sysv_file(name, os.path.join(folder, name))
             logg.debug("found %s sysv files", found)
         return list(self._file_for_sysv.keys())
+    def catalog(self) -> SystemctlUnitCatalog:
+        """ the unit catalog of the last daemon-reload """
+        if self._catalog is None:
+            self._catalog = self.new_catalog()
+            if UNIT_CATALOG:
+                self._catalog.load()
+        return self._catalog
+    def new_catalog(self) -> SystemctlUnitCatalog:
+        filename = self.os_path(expand_path(_unit_catalog_file, not self.user_mode()))
+        if self.user_mode():
+            filename = filename.replace(".json", ".user.json")
+        folders = [self.os_path(folder) for folder in self.unit_file_folders() if folder]
+        folders += [self.os_path(folder) for folder in self.init_folders() if folder]
+        return SystemctlUnitCatalog(filename, folders)
+    def reload_catalog(self) -> None:
+        """ forget the units loaded so far and do not trust the old catalog """
+        self._catalog = self.new_catalog()
+        self._catalog.recording = UNIT_CATALOG
+        self._loaded_unit_files = 0.0
+        self._loaded_sysv_files = 0.0
+        self._loaded_unit_conf = {}
+        self._loaded_sysv_conf = {}
+        self._file_for_unit = {}
+        self._file_for_sysv = {}
+        self._sorted_unit = None
+        self._sorted_sysv = None
+        self._enablement = None
+    def save_catalog(self) -> bool:
+        """ daemon-reload writes a new catalog (with the units loaded so far) """
+        if not UNIT_CATALOG:
+            return False
+        return self.catalog().save()
+    def list_folder(self, folder: str, reload: bool = False, recheck: bool = False) -> SystemctlCatalogListing:
+        """ the files and subdirectories of a folder, as in the catalog when unchanged. The
+            unit folders are listed once per process, the others are checked for changes. """
+        catalog = self.catalog()
+        cached = None if reload else catalog.listing(folder, recheck)
+        if cached is not None:
+            return cached
+        try:
+            folder_stat = os.stat(folder)
+        except OSError:
+            return SystemctlCatalogListing([], [], [])
+        files: List[str] = []
+        dirs: List[str] = []
+        if stat.S_ISDIR(folder_stat.st_mode):
+            with os.scandir(folder) as entries:
+                for entry in entries: # the d_type avoids a stat unless it is a symlink
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+            catalog.set_listing(folder, catalog_dir_stat(folder_stat), files, dirs)
+        return SystemctlCatalogListing(catalog_dir_stat(folder_stat), files, dirs)
+    def changed_folder(self, folder: str) -> None:
+        """ we did add or remove a file, so the folder index needs a rescan """
+        catalog = self.catalog()
+        for path in [folder, os.path.dirname(folder)]:
+            catalog.listings.pop(path, None)
+            catalog.scanned.discard(path)
+        self._loaded_unit_files = 0.0
+        self._enablement = None
+    def enablement(self, rc_folders: List[str]) -> SystemctlEnablementIndex:
+        """ scan the *.wants/*.requires folders of all unit folders (and the rc.d folders),
+            again when one of them was changed (e.g. 'systemctl enable' from a docker exec) """
+        if self._enablement is None or not self._enablement.fresh():
+            recheck = self._enablement is not None
+            index = SystemctlEnablementIndex()
+            for basefolder in list(self.user_folders()) + list(self.system_folders()):
+                if not basefolder:
+                    continue
+                folder = self.os_path(basefolder)
+                listing = self.list_folder(folder, recheck=recheck)
+                index.watch(folder, listing.stat)
+                for name in listing.dirs:
+                    path = os.path.join(folder, name)
+                    if path not in index.units and (name.endswith(".wants") or name.endswith(".requires")):
+                        wants = self.list_folder(path, recheck=True)
+                        index.watch(path, wants.stat)
+                        index.add(path, wants.files)
+            for folder in rc_folders:
+                listing = self.list_folder(folder, recheck=True)
+                index.watch(folder, listing.stat)
+                if listing.stat:
+                    index.add(folder, listing.files)
+            self._enablement = index
+        return self._enablement
+    def read_unit_file(self, data: SystemctlConfigParser, path: str) -> None:
+        """ parse the unit file into the data, or replay it from the catalog """
+        catalog = self.catalog()
+        cached = catalog.parsed_file(path)
+        if cached is not None:
+            data.replay([path], cached.record)
+            return
+        if not catalog.recording:
+            data.read_unit_file(path) # sections are parsed when used
+            return
+        try:
+            file_stat = catalog_file_stat(os.stat(path))
+        except OSError:
+            file_stat = []
+        part = UnitConfParser()
+        part._record = [] # pylint: disable=protected-access
+        part.read_unit_file(path)
+        record = part._record # pylint: disable=protected-access
+        if file_stat and part.filenames() == [path]: # no .include
+            catalog.set_parsed(path, file_stat, record)
+        data.replay(part.filenames(), record)
     def add_unit_file(self, name: str, path: str) -> int:
         service_name = name
         if service_name not in self._file_for_unit:
             self._file_for_unit[service_name] = path
+            self._sorted_unit = None
         return len(self._file_for_unit)
     def add_sysv_file(self, name: str, path: str) -> int:
         service_name = name + ".service" # simulate systemd
         if service_name not in self._file_for_sysv:
             self._file_for_sysv[service_name] = path
+            self._sorted_sysv = None
         return len(self._file_for_sysv)
     def get_unit_file(self, module: Optional[str] = None) -> Optional[str]: # -> filename?
         """ file path for the given module (systemd) """
@@ -1572,18 +2436,10 @@ class SystemctlUnitFiles:
     def find_drop_in_files(self, unit: str) -> Dict[str, str]:
         """ search for some.service.d/extra.conf files """
         result: Dict[str, str] = {}
-        basename_d = unit + ".d"
-        for folder in self.unit_file_folders():
-            if not folder:
-                continue
-            folder = self.os_path(folder)
-            override_d = os_path(folder, basename_d)
-            if not os.path.isdir(override_d):
-                continue
-            for name in os.listdir(override_d):
+        self.scan_unit_files()
+        for override_d in self._drop_in_dirs.get(unit + ".d", []):
+            for name in self.list_folder(override_d, recheck=True).files:
                 path = os.path.join(override_d, name)
-                if os.path.isdir(path):
-                    continue
                 if not path.endswith(".conf"):
                     continue
                 if name not in result:
@@ -1612,12 +2468,12 @@ class SystemctlUnitFiles:
         drop_in_files: Dict[str, str] = {}
         data = UnitConfParser()
         if not masked:
-            data.read_unit_file(path)
+            self.read_unit_file(data, path)
             drop_in_files = self.find_drop_in_files(os.path.basename(path))
             # load in alphabetic order, irrespective of location
             for name in sorted(drop_in_files):
                 path = drop_in_files[name]
-                data.read_unit_file(path)
+                self.read_unit_file(data, path)
         conf = SystemctlConf(data, module)
         conf.masked = masked
         conf.nonloaded_path = path # if masked
@@ -1676,8 +2532,7 @@ class SystemctlUnitFiles:
         modules = to_list(modules)
         if not modules:
             return
-        self.scan_unit_files()
-        for item in sorted(self._file_for_unit.keys()):
+        for item in self.sorted_unit_files():
             if "@" not in item:
                 continue
             service_unit = parse_unit(item)
@@ -1693,15 +2548,13 @@ class SystemctlUnitFiles:
             Also a single string as one module pattern may be given. """
         suffix = ".service"
         modules = to_list(modules)
-        self.scan_unit_files()
-        for item in sorted(self._file_for_unit.keys()):
+        patterns = compiled_patterns(modules, [module + suffix for module in modules])
+        for item in self.sorted_unit_files():
             if "." not in item:
                 pass
             elif not modules:
                 yield item
-            elif [module for module in modules if fnmatch.fnmatchcase(item, module)]:
-                yield item
-            elif [module for module in modules if module+suffix == item]:
+            elif patterns.matches(item):
                 yield item
     def match_sysv_files(self, modules: Optional[List[str]] = None) -> Iterable[str]: # -> generate[ unit ]
         """ make a file glob on all known units (sysv areas).
@@ -1709,14 +2562,23 @@ class SystemctlUnitFiles:
             Also a single string as one module pattern may be given. """
         suffix = ".service"
         modules = to_list(modules)
-        self.scan_sysv_files()
-        for item in sorted(self._file_for_sysv.keys()):
+        patterns = compiled_patterns(modules, [module + suffix for module in modules])
+        for item in self.sorted_sysv_files():
             if not modules:
                 yield item
-            elif [module for module in modules if fnmatch.fnmatchcase(item, module)]:
-                yield item
-            elif [module for module in modules if module+suffix == item]:
+            elif patterns.matches(item):
                 yield item
+    def sorted_unit_files(self) -> List[str]:
+        """ the known unit names, sorted once until new unit files are found """
+        self.scan_unit_files()
+        if self._sorted_unit is None:
+            self._sorted_unit = sorted(self._file_for_unit.keys())
+        return self._sorted_unit
+    def sorted_sysv_files(self) -> List[str]:
+        self.scan_sysv_files()
+        if self._sorted_sysv is None:
+            self._sorted_sysv = sorted(self._file_for_sysv.keys())
+        return self._sorted_sysv
     def match_units(self, modules: Optional[List[str]] = None) -> List[str]: # -> [ units,.. ]
         """ Helper for about any command with multiple units which can
             actually be glob patterns on their respective unit name.
@@ -2014,15 +2876,12 @@ class SystemctlUnitFiles:
         deps: Dict[str, str] = {}
         for style in styles:
             if style.startswith("."):
-                for folder in self.unit_file_folders():
-                    if not folder:
-                        continue
-                    require_path = os.path.join(folder, unit + style)
-                    require_path = self.os_path(require_path)
-                    if os.path.isdir(require_path):
-                        for required in os.listdir(require_path):
-                            if required not in deps:
-                                deps[required] = style
+                self.scan_unit_files()
+                for require_path in self._depends_dirs.get(unit + style, []):
+                    listing = self.list_folder(require_path, recheck=True)
+                    for required in listing.files + listing.dirs:
+                        if required not in deps:
+                            deps[required] = style
             else:
                 for requirelist in conf.getlist(Unit, style, []):
                     for required in requirelist.strip().split(" "):
@@ -2067,6 +2926,22 @@ class SystemctlUnitFiles:
                 conflist.append(conf)
         sortlist = conf_sortedAfter(conflist)
         return [item.name() for item in sortlist]
+    def ordered_depends(self, unitlist: List[str]) -> Dict[str, List[str]]:
+        """ get the units of the list that need to be done before each unit (After/Before and Requires) """
+        ordering = SystemctlUnitOrder([self.get_conf(unit) for unit in unitlist])
+        depends: Dict[str, List[str]] = {}
+        for pos, conf in enumerate(ordering.conflist):
+            unit = ordering.names[pos]
+            deps = depends.setdefault(unit, [])
+            for first in ordering.pred[pos]:
+                if ordering.names[first] not in deps:
+                    deps.append(ordering.names[first])
+            for requires in conf.getlist(Unit, "Requires", []):
+                for required in requires.split(" "):
+                    name = required.strip()
+                    if name and name != unit and name in ordering.names and name not in deps:
+                        deps.append(name)
+        return depends
     def list_dependencies(self, unit: str, indent: Optional[str] = None) -> Iterable[str]:
         return self._list_dependencies(unit, "", indent)
     def list_all_dependencies(self, unit: str, indent: Optional[str] = None) -> Iterable[str]:
@@ -2173,12 +3048,10 @@ class SystemctlUnitFiles:
         """
         self.load_preset_files()
         assert self._preset_file_list is not None
-        for filename in sorted(self._preset_file_list.keys()):
-            preset = self._preset_file_list[filename]
-            status = preset.get_preset(unit)
-            if status:
-                return status
-        return None
+        if self._preset_rules is None:
+            self._preset_rules = SystemctlPresetRules(self._preset_file_list[filename]
+                                                      for filename in sorted(self._preset_file_list))
+        return self._preset_rules.get_preset(unit)
     def check_env_conditions(self, conf: SystemctlConf, section: str = Unit, warning: int = logging.WARNING) -> List[str]:
         problems: List[str] = []
         unit = conf.name()
@@ -2611,10 +3484,32 @@ class SystemctlStandardInpOutErr(NamedTuple):
     out: TextIO
     err: TextIO
 
+class SystemctlLogFollow:
+    """ a unit log being followed - the lines get the unit as a prefix unless it is empty """
+    unit: str
+    log_path: str
+    offset: int
+    opened: int
+    hold: bytes
+    def __init__(self, unit: str, log_path: str, offset: int = 0) -> None:
+        self.unit = unit
+        self.log_path = log_path
+        self.offset = offset
+        self.opened = -1
+        self.hold = b""
+
 class SystemctlJournal:
     unitfiles: SystemctlUnitFiles
     _log_file: Dict[str, int]
     _log_hold: Dict[str, bytes]
+    _log_path: Dict[str, str]
+    _log_index: Dict[str, Tuple[float, int]]
+    _log_watch: Dict[int, str]
+    _log_notify: int
+    _log_changed: Set[str]
+    _log_polled: Set[str]
+    _log_queue: List[bytes]
+    _log_queued: int
     _log_folder: str
     no_pager: bool
     tail_cmds: List[str]
@@ -2630,15 +3525,32 @@ class SystemctlJournal:
         self.DefaultStandardError=os.environ.get("SYSTEMD_STANDARD_ERROR", SYSTEMD_STANDARD_ERROR) # systemd.exe --default-standard-error
         self._log_file = {}
         self._log_hold = {}
+        self._log_path = {}
+        self._log_index = {} # unit => last (time, offset) in the index
+        self._log_watch = {} # inotify wd => unit
+        self._log_notify = -1 # inotify fd
+        self._log_changed = set()
+        self._log_polled = set() # units without an inotify watch
+        self._log_queue = [] # lines for stdout
+        self._log_queued = 0 # bytes in the queue
         self._log_folder = _journal_log_folder
         self.tail_cmds = TAIL_CMDS
         self.less_cmds = LESS_CMDS
         self.cat_cmds = CAT_CMDS
         self.no_pager = _no_pager
         self.exec_spawn = EXEC_SPAWN
+        self.native = LOG_NATIVE
+        self.since = _log_since
+        self.until = _log_until
     def start_log_files(self, units: List[str]) -> None:
         self._log_file = {}
         self._log_hold = {}
+        self._log_path = {}
+        self._log_index = {}
+        self._log_watch = {}
+        self._log_polled = set()
+        self._log_queue = []
+        self._log_queued = 0
         for unit in units:
             conf = self.unitfiles.load_conf(unit)
             if not conf:
@@ -2650,43 +3562,288 @@ class SystemctlJournal:
                 opened = os.open(log_path, os.O_RDONLY | os.O_NONBLOCK)
                 self._log_file[unit] = opened
                 self._log_hold[unit] = b""
+                self._log_path[unit] = log_path
             except OSError as e:
                 logg.error("can not open %s log: %s >> %s", unit, log_path, e)
+        self._log_changed = set(self._log_file)
+        self.prune_log_files()
+        if LOG_INOTIFY and self._log_file:
+            self._log_notify = inotify_init()
+            for unit, log_path in self._log_path.items():
+                if self._log_notify < 0:
+                    break
+                wd = inotify_add_watch(self._log_notify, log_path)
+                if wd < 0:
+                    self._log_polled.add(unit) # only this one is read in intervals
+                else:
+                    self._log_watch[wd] = unit
+    def has_log_files(self) -> bool:
+        return not not self._log_file
+    def log_notify_fd(self) -> int:
+        """ the inotify fd that becomes readable when a log file was written - or -1 """
+        return self._log_notify
+    def needs_polling(self) -> bool:
+        """ without inotify the log files must be read in intervals, as well as
+            when some lines could not be written to stdout yet """
+        if self._log_file and (self._log_notify < 0 or self._log_polled):
+            return True
+        return not not self._log_queue
     def read_log_files(self, units: List[str]) -> None:
+        if self._log_notify >= 0:
+            changed = inotify_read(self._log_notify)
+            if changed is None:
+                self._log_changed.update(self._log_file)
+            else:
+                self._log_changed.update(self._log_watch[wd] for wd in changed if wd in self._log_watch)
         self.print_log_files(units)
+        if self.rotate_log_files(units):
+            self.prune_log_files()
     def print_log_files(self, units: List[str], stdout: int = 1) -> int:
+        """ forward the new lines of the log files to stdout. When stdout does not take
+            more lines then the log files are not read further, so no line is lost. """
         BUFSIZE = LOG_BUFSIZE
+        printed = self.write_log_queue(stdout)
+        for unit in units:
+            if unit not in self._log_file:
+                continue
+            if self._log_notify >= 0 and unit not in self._log_changed and unit not in self._log_polled:
+                continue
+            while True:
+                if self._log_queued >= LOG_QUEUE_MAX:
+                    printed += self.write_log_queue(stdout)
+                    if self._log_queued >= LOG_QUEUE_MAX:
+                        break # read again when stdout has taken the queue
+                buf = os.read(self._log_file[unit], BUFSIZE)
+                if not buf:
+                    self._log_changed.discard(unit)
+                    opened = self._log_file[unit]
+                    if os.lseek(opened, 0, os.SEEK_CUR) > os.fstat(opened).st_size:
+                        logg.debug("log of %s was truncated", unit)
+                        os.lseek(opened, 0, os.SEEK_SET)
+                        self._log_changed.add(unit)
+                        continue
+                    self.index_log_file(unit)
+                    break
+                self.queue_log_text(unit, buf)
+        printed += self.write_log_queue(stdout)
+        return printed
+    def queue_log_text(self, unit: str, text: bytes) -> None:
+        lines = (self._log_hold[unit] + text).split(b"\n")
+        hold = lines.pop()
+        if len(hold) >= LOG_LINE_MAX:
+            lines.append(hold)
+            hold = b""
+        self._log_hold[unit] = hold
+        prefix = unit.encode("utf-8") + b": "
+        if LOG_TIMESTAMPS:
+            now = time.time()
+            stamp = datetime.datetime.fromtimestamp(now).isoformat(sep=" ", timespec="microseconds")
+            prefix = ("%s [%.6f] " % (stamp, time.monotonic())).encode("utf-8") + prefix
+        queued = [prefix + line + b"\n" for line in lines]
+        self._log_queue += queued
+        self._log_queued += sum(len(line) for line in queued)
+    def index_log_file(self, unit: str, force: bool = False) -> None:
+        """ when the log was read up to its end then everything before the offset was
+            written before now and everything after it will be written later. That is
+            noted in the <log>.index every LOG_INDEX_SEC, for a quick --since/--until. """
+        if not LOG_INDEX_SEC and not force:
+            return
+        now = time.time()
+        offset = os.lseek(self._log_file[unit], 0, os.SEEK_CUR)
+        last_time, last_offset = self._log_index.get(unit, (0., -1))
+        if offset == last_offset or (now < last_time + LOG_INDEX_SEC and not force):
+            return
+        try:
+            with open(self._log_path[unit] + ".index", "a") as f:
+                f.write("%.6f %i\n" % (now, offset))
+            self._log_index[unit] = (now, offset)
+        except OSError as e:
+            logg.debug("can not write log index for %s >> %s", unit, e)
+    def read_log_index(self, filename: str) -> List[Tuple[float, int]]:
+        """ the (time, offset) entries in the index of a log file or a rotated segment """
+        entries: List[Tuple[float, int]] = []
+        try:
+            with open(filename + ".index") as f:
+                for line in f:
+                    stamp, _, offset = line.partition(" ")
+                    try:
+                        entries.append((float(stamp), int(offset)))
+                    except ValueError:
+                        pass
+        except OSError:
+            pass
+        return entries
+    def log_range(self, files: List[str], since: Optional[float], until: Optional[float]) -> List[Tuple[str, int, int]]:
+        """ the files with the oldest first => (file, start, end) to print the lines written
+            between since and until, where end=-1 is the end of the file. It is based on the
+            index entries, so the range may include some lines before and after. """
+        start_at = (0, 0)
+        end_at: Optional[Tuple[int, int]] = None
+        for num, filename in enumerate(files):
+            for stamp, offset in self.read_log_index(filename):
+                if since is not None and stamp <= since:
+                    start_at = (num, offset)
+                if until is not None and end_at is None and stamp >= until:
+                    end_at = (num, offset)
+        last = end_at[0] if end_at else len(files) - 1
+        parts: List[Tuple[str, int, int]] = []
+        for num in range(start_at[0], last + 1):
+            start = start_at[1] if num == start_at[0] else 0
+            end = end_at[1] if end_at and num == end_at[0] else -1
+            parts.append((files[num], start, end))
+        return parts
+    def write_log_queue(self, stdout: int = 1) -> int:
+        """ write the queued lines with writev(), keeping them when stdout would block """
         printed = 0
+        while self._log_queue:
+            batch = self._log_queue[:_iov_max]
+            try:
+                written = os.writev(stdout, batch)
+            except BlockingIOError:
+                break
+            self._log_queued -= written
+            done = 0
+            while done < len(batch) and written >= len(batch[done]):
+                written -= len(batch[done])
+                done += 1
+            if written:
+                self._log_queue[done] = batch[done][written:]
+            del self._log_queue[:done]
+            printed += done
+            if not done and not written:
+                break
+        if printed:
+            try:
+                if stat.S_ISREG(os.fstat(stdout).st_mode):
+                    os.fsync(stdout) # not for pipes and terminals
+            except OSError:
+                pass
+        return printed
+    def rotate_log_files(self, units: List[str]) -> int:
+        """ copy-truncate the unit logs that have grown larger than SystemMaxFileSize,
+            when the forwarding to stdout has reached the end of the log file. Whatever
+            was appended after that is forwarded from the copy in log.1 """
+        maxsize = size_to_bytes(SystemMaxFileSize)
+        if not maxsize:
+            return 0
+        rotated = 0
         for unit in units:
-            if unit in self._log_file:
-                new_text = b""
-                while True:
-                    buf = os.read(self._log_file[unit], BUFSIZE)
+            if unit not in self._log_file or unit in self._log_changed:
+                continue
+            if self._log_queued >= LOG_QUEUE_MAX:
+                continue # stdout is behind
+            opened = self._log_file[unit]
+            try:
+                if os.fstat(opened).st_size <= maxsize:
+                    continue
+                self.index_log_file(unit, force=True)
+                offset = os.lseek(opened, 0, os.SEEK_CUR)
+            except OSError as e:
+                logg.error("can not rotate %s log >> %s", unit, e)
+                continue
+            copied = self.rotate_log_file(self._log_path[unit])
+            if copied is None:
+                continue
+            if copied > offset:
+                self.forward_log_segment(unit, self._log_path[unit] + ".1", offset, copied)
+            os.lseek(opened, 0, os.SEEK_SET)
+            self._log_index[unit] = (0., -1)
+            rotated += 1
+        return rotated
+    def forward_log_segment(self, unit: str, segment: str, offset: int, end: int) -> None:
+        """ queue the part of a rotated log that the forwarder had not read yet """
+        logg.debug("forwarding %s bytes of %s from %s", end - offset, unit, segment)
+        try:
+            with open(segment, "rb") as f:
+                f.seek(offset)
+                while f.tell() < end:
+                    buf = f.read(min(LOG_BUFSIZE, end - f.tell()))
                     if not buf:
                         break
-                    new_text += buf
+                    self.queue_log_text(unit, buf)
+        except OSError as e:
+            logg.error("can not forward %s >> %s", segment, e)
+    def rotate_log_file(self, log_path: str) -> Optional[int]:
+        """ the log is copied to log.1 and truncated in place, so that services can
+            keep their file descriptor in append mode. Older segments are renumbered.
+            When the log did grow while copying then that is copied as well, right
+            before the truncate. Returns the size copied - or None on errors. """
+        segments = self.log_segments(log_path)
+        try:
+            for num in reversed(range(len(segments))):
+                os.rename(segments[num], "%s.%s" % (log_path, num + 2))
+                if os.path.exists(segments[num] + ".index"):
+                    os.rename(segments[num] + ".index", "%s.%s.index" % (log_path, num + 2))
+            copied = 0
+            with open(log_path, "r+b") as log, open(log_path + ".1", "wb") as segment:
+                while True:
+                    buf = log.read(LOG_BUFSIZE * 8)
+                    if buf:
+                        segment.write(buf)
+                        copied += len(buf)
+                    elif os.fstat(log.fileno()).st_size <= copied:
+                        log.truncate(0)
+                        break
+            if os.path.exists(log_path + ".index"):
+                os.rename(log_path + ".index", log_path + ".1.index")
+            logg.debug("rotated %s (%s segments)", log_path, len(segments) + 1)
+            return copied
+        except OSError as e:
+            logg.error("can not rotate %s >> %s", log_path, e)
+            return None
+    def log_segments(self, log_path: str) -> List[str]:
+        """ the rotated parts of a unit log - the newest first """
+        segments: List[str] = []
+        while os.path.isfile("%s.%s" % (log_path, len(segments) + 1)):
+            segments.append("%s.%s" % (log_path, len(segments) + 1))
+        return segments
+    def prune_log_files(self) -> int:
+        """ remove rotated unit logs beyond SystemMaxFiles, older than MaxRetentionSec,
+            and the oldest ones while all logs are larger than SystemMaxUse """
+        retention = time_to_seconds(MaxRetentionSec, 0) if MaxRetentionSec else 0
+        maxuse = size_to_bytes(SystemMaxUse)
+        removed = 0
+        segments: List[Tuple[float, int, str]] = []
+        usage = 0
+        for log_path in self._log_path.values():
+            for num, segment in enumerate(self.log_segments(log_path)):
+                try:
+                    st = os.stat(segment)
+                except OSError:
                     continue
-                text = self._log_hold[unit] + new_text
-                if not text:
+                if num >= SystemMaxFiles or (retention and st.st_mtime < time.time() - retention):
+                    if self.remove_log_segment(segment):
+                        removed += 1
                     continue
-                lines = text.split(b"\n")
-                if not text.endswith(b"\n"):
-                    self._log_hold[unit] = lines[-1]
-                    lines = lines[:-1]
-                for line in lines:
-                    prefix = unit.encode("utf-8")
-                    content = prefix+b": "+line+b"\n"
-                    try:
-                        os.write(stdout, content)
-                        try:
-                            os.fsync(stdout)
-                        except OSError:
-                            pass
-                        printed += 1
-                    except BlockingIOError:
-                        pass
-        return printed
+                segments.append((st.st_mtime, st.st_size, segment))
+                usage += st.st_size
+            try:
+                usage += os.path.getsize(log_path)
+            except OSError:
+                pass
+        segments.sort(reverse=True)
+        while maxuse and usage > maxuse and segments:
+            _, size, segment = segments.pop()
+            if self.remove_log_segment(segment):
+                removed += 1
+            usage -= size
+        if removed:
+            logg.debug("removed %s rotated logs", removed)
+        return removed
+    def remove_log_segment(self, segment: str) -> bool:
+        try:
+            os.remove(segment)
+            if os.path.exists(segment + ".index"):
+                os.remove(segment + ".index")
+            return True
+        except OSError as e:
+            logg.error("can not remove %s >> %s", segment, e)
+            return False
     def stop_log_files(self, units: List[str]) -> None:
+        for unit in units:
+            if self._log_hold.get(unit):
+                self.queue_log_text(unit, b"\n")
+        self.write_log_queue()
         for unit in units:
             try:
                 if unit in self._log_file:
@@ -2694,8 +3851,17 @@ class SystemctlJournal:
                         os.close(self._log_file[unit])
             except OSError as e: # pragma: no cover
                 logg.error("can not close log: %s >> %s", unit, e)
+        if self._log_notify >= 0:
+            os.close(self._log_notify)
+            self._log_notify = -1
         self._log_file = {}
         self._log_hold = {}
+        self._log_path = {}
+        self._log_index = {}
+        self._log_watch = {}
+        self._log_polled = set()
+        self._log_queue = []
+        self._log_queued = 0
     def skip_log(self, conf: SystemctlConf) -> bool:
         if get_unit_type(conf.name()) not in ["service"]:
             return True
@@ -2719,6 +3885,13 @@ class SystemctlJournal:
         cmd_args: List[Union[str, bytes]] = []
         return self.tail_log_file(self.get_log_from(conf), lines, follow, conf.name())
     def tail_log_file(self, log_path: str, lines: Optional[int] = None, follow: bool = False, unit: str = NIX) -> int:
+        segments = self.log_segments(log_path)
+        if self.since or self.until:
+            return self.show_log_file(log_path, segments, lines, follow, since=self.since, until=self.until)
+        if self.native and (follow or lines or self.no_pager):
+            return self.show_log_file(log_path, segments, lines, follow)
+        if segments and (follow or lines):
+            self.print_segment_lines(log_path, segments, to_int(lines or 10, 10))
         if follow:
             tail_cmd = get_exist_path(self.tail_cmds)
             if tail_cmd is None:
@@ -2747,7 +3920,7 @@ class SystemctlJournal:
             if cat_cmd is None:
                 print("cat command not found")
                 return 1
-            cmd = [cat_cmd, log_path]
+            cmd = [cat_cmd] + list(reversed(segments)) + [log_path]
             logg.debug("journalctl %s -> %s", unit, cmd)
             cmd_args = [arg for arg in cmd] # satisfy mypy
             if self.exec_spawn:
@@ -2755,15 +3928,194 @@ class SystemctlJournal:
             return os.execvp(cmd_args[0], cmd_args) # pragma: no cover
         else:
             less_cmd = get_exist_path(self.less_cmds)
+            if less_cmd is None and self.native:
+                return self.show_log_file(log_path, segments)
             if less_cmd is None:
                 print("less command not found")
                 return 1
-            cmd = [less_cmd, log_path]
+            cmd = [less_cmd] + list(reversed(segments)) + [log_path]
             logg.debug("journalctl %s -> %s", unit, cmd)
             cmd_args = [arg for arg in cmd] # satisfy mypy
             if self.exec_spawn:
                 return os.spawnvp(os.P_WAIT, cmd_args[0], cmd_args)
             return os.execvp(cmd_args[0], cmd_args) # pragma: no cover
+    def print_segment_lines(self, log_path: str, segments: List[str], lines: int) -> None:
+        """ the tail of the log shows only the last lines of the current log file, so
+            print the lines before it from the rotated segments (the newest first) """
+        found, _ = tail_offset(log_path, lines)
+        if found < lines:
+            for segment, offset in self.tail_offsets(segments, lines - found):
+                self.copy_log_file(segment, offset)
+    def tail_offsets(self, files: List[str], lines: int) -> List[Tuple[str, int]]:
+        """ the files with the newest first => where to start to print the last lines """
+        parts: List[Tuple[str, int]] = []
+        for filename in files:
+            found, offset = tail_offset(filename, lines)
+            parts.insert(0, (filename, offset))
+            lines -= found
+            if lines <= 0:
+                break
+        return parts
+    def copy_log_file(self, filename: str, offset: int = 0, stdout: int = 1, end: int = -1) -> int:
+        """ print the file from the offset (up to the end offset) - returns the offset reached """
+        sys.stdout.flush()
+        try:
+            with open(filename, "rb") as f:
+                f.seek(offset)
+                while end < 0 or f.tell() < end:
+                    size = LOG_BUFSIZE * 8 if end < 0 else min(LOG_BUFSIZE * 8, end - f.tell())
+                    buf = f.read(size)
+                    if not buf:
+                        break
+                    write_all(stdout, buf)
+                return f.tell()
+        except OSError as e:
+            logg.debug("can not read %s >> %s", filename, e)
+            return offset
+    def show_log_file(self, log_path: str, segments: List[str], lines: Optional[int] = None, follow: bool = False, stdout: int = 1,
+                      since: str = NIX, until: str = NIX) -> int:
+        """ print the log and its rotated segments (the newest first) without running an
+            external command - only the last lines of it, and possibly following it. """
+        files = [log_path] + segments
+        if not follow and not any(os.path.exists(filename) for filename in files):
+            logg.error("no log file %s", log_path)
+            return 1
+        if since or until:
+            since_time = log_time(since) if since else None
+            until_time = log_time(until) if until else None
+            if (since and since_time is None) or (until and until_time is None):
+                logg.error("can not parse time: %s", since if since_time is None else until)
+                return 1
+            offset = 0
+            for filename, start, end in self.log_range(list(reversed(files)), since_time, until_time):
+                offset = self.copy_log_file(filename, start, stdout, end)
+                if filename != log_path or end >= 0:
+                    offset = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+            if follow:
+                return self.follow_log_file(log_path, offset, stdout=stdout)
+            return 0
+        if lines or follow:
+            parts = self.tail_offsets(files, to_int(lines or 10, 10))
+        else:
+            parts = [(filename, 0) for filename in reversed(files)]
+        offset = 0
+        for filename, start in parts:
+            offset = self.copy_log_file(filename, start, stdout)
+        if follow:
+            return self.follow_log_file(log_path, offset, stdout=stdout)
+        return 0
+    def follow_log_file(self, log_path: str, offset: int = 0, timeout: Optional[float] = None, stdout: int = 1) -> int:
+        return self.follow_log_files([SystemctlLogFollow(NIX, log_path, offset)], timeout, stdout)
+    def follow_units(self, logs: List[Tuple[str, str]], lines: Optional[int] = None, timeout: Optional[float] = None, stdout: int = 1,
+                     since: str = NIX, until: str = NIX) -> int:
+        """ print the last lines of each (unit, log_path) - or the lines between since and
+            until - and follow all of them together, with the unit name in front of each line. """
+        since_time = log_time(since) if since else None
+        until_time = log_time(until) if until else None
+        if (since and since_time is None) or (until and until_time is None):
+            logg.error("can not parse time: %s", since if since_time is None else until)
+            return 1
+        follows: List[SystemctlLogFollow] = []
+        for unit, log_path in logs:
+            follow = SystemctlLogFollow(unit, log_path)
+            files = [log_path] + self.log_segments(log_path)
+            if since or until:
+                for filename, start, end in self.log_range(list(reversed(files)), since_time, until_time):
+                    follow.offset = self.print_follow_file(follow, filename, start, stdout, end)
+                    if filename != log_path or end >= 0:
+                        follow.offset = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+            else:
+                for filename, start in self.tail_offsets(files, to_int(lines or 10, 10)):
+                    follow.offset = self.print_follow_file(follow, filename, start, stdout)
+            follows.append(follow)
+        return self.follow_log_files(follows, timeout, stdout)
+    def print_follow_file(self, follow: SystemctlLogFollow, filename: str, offset: int, stdout: int = 1, end: int = -1) -> int:
+        """ print the file from the offset (up to the end offset) - returns the offset reached """
+        try:
+            with open(filename, "rb") as f:
+                f.seek(offset)
+                while end < 0 or f.tell() < end:
+                    size = LOG_BUFSIZE * 8 if end < 0 else min(LOG_BUFSIZE * 8, end - f.tell())
+                    buf = f.read(size)
+                    if not buf:
+                        break
+                    self.print_follow(follow, buf, stdout)
+                return f.tell()
+        except OSError as e:
+            logg.debug("can not read %s >> %s", filename, e)
+            return 0
+    def print_follow(self, follow: SystemctlLogFollow, buf: bytes, stdout: int = 1) -> None:
+        if not follow.unit:
+            write_all(stdout, buf)
+            return
+        lines = (follow.hold + buf).split(b"\n")
+        follow.hold = lines.pop()
+        if len(follow.hold) >= LOG_LINE_MAX:
+            lines.append(follow.hold)
+            follow.hold = b""
+        if lines:
+            prefix = follow.unit.encode("utf-8") + b": "
+            write_all(stdout, b"".join([prefix + line + b"\n" for line in lines]))
+    def follow_log_files(self, follows: List[SystemctlLogFollow], timeout: Optional[float] = None, stdout: int = 1) -> int:
+        """ print what is appended to the log files until interrupted. A truncated log is
+            read again from the start, a log file that was renamed is opened again. """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        notify = inotify_init() if LOG_INOTIFY else -1
+        sys.stdout.flush()
+        try:
+            while True:
+                again = False
+                for follow in follows:
+                    if follow.opened < 0:
+                        try:
+                            follow.opened = os.open(follow.log_path, os.O_RDONLY)
+                            os.lseek(follow.opened, follow.offset, os.SEEK_SET)
+                            if notify >= 0:
+                                inotify_add_watch(notify, follow.log_path)
+                        except OSError:
+                            follow.opened = -1
+                            continue
+                    while True:
+                        buf = os.read(follow.opened, LOG_BUFSIZE * 8)
+                        if not buf:
+                            break
+                        self.print_follow(follow, buf, stdout)
+                    st = os.fstat(follow.opened)
+                    if os.lseek(follow.opened, 0, os.SEEK_CUR) > st.st_size:
+                        os.lseek(follow.opened, 0, os.SEEK_SET) # copy-truncate
+                        again = True
+                        continue
+                    try:
+                        renamed = os.stat(follow.log_path).st_ino != st.st_ino
+                    except OSError:
+                        renamed = True
+                    if renamed:
+                        os.close(follow.opened)
+                        follow.opened, follow.offset = -1, 0
+                        again = True
+                if again:
+                    continue
+                sleep = LOG_FOLLOW_SLEEP
+                if deadline is not None:
+                    sleep = min(sleep, deadline - time.monotonic())
+                    if sleep <= 0:
+                        return 0
+                if notify >= 0:
+                    if select.select([notify], [], [], sleep)[0]:
+                        inotify_read(notify)
+                else:
+                    time.sleep(min(sleep, MinimumYield))
+        except KeyboardInterrupt:
+            return 0
+        finally:
+            for follow in follows:
+                if follow.opened >= 0:
+                    os.close(follow.opened)
+                    follow.opened = -1
+                if follow.hold:
+                    self.print_follow(follow, b"\n", stdout)
+            if notify >= 0:
+                os.close(notify)
     def get_log_from(self, conf: SystemctlConf) -> str:
         return self.unitfiles.os_path(self.get_log(conf))
     def get_log(self, conf: SystemctlConf) -> str:
@@ -2780,7 +4132,7 @@ class SystemctlJournal:
         log_file = self.get_log_from(conf)
         log_folder = os.path.dirname(log_file)
         if not os.path.isdir(log_folder):
-            os.makedirs(log_folder)
+            os.makedirs(log_folder, exist_ok=True)
         return open(os.path.join(log_file), "a")
     def open_standard_log(self, conf: SystemctlConf) -> SystemctlStandardInpOutErr:
         out: Optional[TextIO]
@@ -2807,13 +4159,13 @@ class SystemctlJournal:
                 fname = std_out[len("file:"):]
                 fdir = os.path.dirname(fname)
                 if not os.path.exists(fdir):
-                    os.makedirs(fdir)
+                    os.makedirs(fdir, exist_ok=True)
                 out = open(fname, "w")
             elif std_out.startswith("append:"):
                 fname = std_out[len("append:"):]
                 fdir = os.path.dirname(fname)
                 if not os.path.exists(fdir):
-                    os.makedirs(fdir)
+                    os.makedirs(fdir, exist_ok=True)
                 out = open(fname, "a")
         except OSError as e:
             msg += "\n%s >> %s" % (fname, e)
@@ -2832,13 +4184,13 @@ class SystemctlJournal:
                 fname = std_err[len("file:"):]
                 fdir = os.path.dirname(fname)
                 if not os.path.exists(fdir):
-                    os.makedirs(fdir)
+                    os.makedirs(fdir, exist_ok=True)
                 err = open(fname, "w")
             elif std_err.startswith("append:"):
                 fname = std_err[len("append:"):]
                 fdir = os.path.dirname(fname)
                 if not os.path.exists(fdir):
-                    os.makedirs(fdir)
+                    os.makedirs(fdir, exist_ok=True)
                 err = open(fname, "a")
         except OSError as e:
             msg += "\n%s >> %s" % (fname, e)
@@ -2851,63 +4203,6 @@ class SystemctlJournal:
             err.write("\n")
         return SystemctlStandardInpOutErr(inp, out, err)
 
-class SystemctlListenThread(threading.Thread):
-    """ support LISTEN modules """
-    def __init__(self, systemctl: 'Systemctl') -> None:
-        threading.Thread.__init__(self, name="listen")
-        self.systemctl = systemctl
-        self.stopped = threading.Event()
-    def stop(self) -> None:
-        self.stopped.set()
-    def run(self) -> None:
-        READ_ONLY = select.POLLIN | select.POLLPRI | select.POLLHUP | select.POLLERR
-        READ_WRITE = READ_ONLY | select.POLLOUT
-        me = os.getpid()
-        logg.log(DEBUG_INITLOOP, "[%s] listen: new thread", me)
-        socketlist = self.systemctl.socketlist()
-        if not socketlist:
-            return
-        logg.log(DEBUG_INITLOOP, "[%s] listen: start thread", me)
-        listen = select.poll()
-        for sock in socketlist:
-            listen.register(sock, READ_ONLY)
-            sock.listen()
-            logg.debug("[%s] listen: %s :%s", me, sock.name(), sock.addr())
-        timestamp = time.time()
-        while not self.stopped.is_set():
-            try:
-                sleep_sec = self.systemctl.loop_sleep - (time.time() - timestamp)
-                if sleep_sec < MinimumYield:
-                    sleep_sec = MinimumYield
-                sleeping = sleep_sec
-                while sleeping > 2:
-                    time.sleep(1) # accept signals atleast every second
-                    sleeping = self.systemctl.loop_sleep - (time.time() - timestamp)
-                    if sleeping < MinimumYield:
-                        sleeping = MinimumYield
-                        break
-                time.sleep(sleeping) # remainder waits less that 2 seconds
-                logg.log(DEBUG_INITLOOP, "[%s] listen: poll", me)
-                accepting = listen.poll(100) # milliseconds
-                logg.log(DEBUG_INITLOOP, "[%s] listen: poll (%s)", me, len(accepting))
-                for sock_fileno, event in accepting:
-                    for sock in socketlist:
-                        if sock.fileno() == sock_fileno:
-                            if not self.stopped.is_set():
-                                if self.systemctl.loop_lock.acquire():
-                                    logg.debug("[%s] listen: accept %s :%s", me, sock.name(), sock_fileno)
-                                    self.systemctl.do_accept_socket_from(sock.conf, sock.sock)
-            except Exception as e:
-                logg.info("[%s] listen: interrupted >> %s", me, e)
-                raise
-        for sock in socketlist:
-            try:
-                listen.unregister(sock)
-                sock.close()
-            except OSError as e:
-                logg.warning("[%s] listen: close socket >> %s", me, e)
-        return
-
 class Systemctl:
     """ emulation for systemctl commands """
     error: int
@@ -2931,11 +4226,19 @@ class Systemctl:
     init_mode: int
     journal: SystemctlJournal
     _boottime: Optional[float]
-    _restarted_unit: Dict[str, List[float]]
-    _restart_failed_units: Dict[str, float]
+    _bootident: Optional[Tuple[int, int]]
+    _proc_table: Optional[SystemctlProcessTable]
+    _status_cache: Dict[str, Tuple[Tuple[int, int, int], Dict[str, str]]]
+    _pid_cache: Dict[str, Tuple[Tuple[int, int, int], str]]
+    _restarted_unit: Dict[str, Deque[float]]
+    _restart_scheduled: Dict[str, float]
+    _restart_schedule: List[Tuple[float, str]]
+    _unit_pids: Dict[int, str]
+    _stop_deadline: float
     _sockets: Dict[str, SystemctlSocket]
     loop_sleep: int
-    loop_lock: threading.Lock
+    _child_reaper: bool
+    _parallel_worker: bool
     unitfiles: SystemctlUnitFiles
     DefaultUnit: str
     DefaultTarget: str
@@ -2966,11 +4269,19 @@ class Systemctl:
         self.exit_mode = EXIT_MODE or 0
         self.init_mode = INIT_MODE or 0
         self._boottime = None # cache self.get_boottime()
+        self._bootident = None # (pid, starttime) of the boot process
+        self._proc_table = None # cache self.proc_table()
+        self._status_cache = {} # status_file => (stat_key, status)
+        self._pid_cache = {} # pid_file => (stat_key, first line)
         self._restarted_unit = {}
-        self._restart_failed_units = {}
+        self._restart_scheduled = {} # unit => time.monotonic() of the restart
+        self._restart_schedule = [] # heapq of (time.monotonic(), unit)
+        self._unit_pids = {} # watched main PIDs in the init-loop
+        self._stop_deadline = 0.
         self._sockets = {}
         self.loop_sleep = max(1, InitLoopSleep // INIT_MODE) if INIT_MODE else InitLoopSleep
-        self.loop_lock = threading.Lock()
+        self._child_reaper = False
+        self._parallel_worker = False # forked by parallel_units()
         self.unitfiles = SystemctlUnitFiles(self._root)
         self.journal = SystemctlJournal(self.unitfiles) # init-loop
     def get_unit_section(self, module: str, default: str = Service) -> str:
@@ -3081,42 +4392,48 @@ class Systemctl:
     ##
     ##
     def read_pid_file(self, pid_file: str, default: Optional[int] = None) -> Optional[int]:
-        pid = default
         if not pid_file:
             return default
-        if not os.path.isfile(pid_file):
+        key = stat_key(pid_file)
+        if not key:
             return default
-        if self.truncate_old(pid_file):
+        cached = self._pid_cache.get(pid_file)
+        if cached and cached[0] == key:
+            line = cached[1]
+            return to_intN(line) if line else default
+        if self.truncate_old(pid_file, key[1] / 1e9):
             return default
+        line = ""
         try:
             # some pid-files from applications contain multiple lines
             with open(pid_file) as f:
-                for line in f:
-                    if line.strip():
-                        pid = to_intN(line.strip())
+                for text in f:
+                    if text.strip():
+                        line = text.strip()
                         break
+            self._pid_cache[pid_file] = (key, line)
         except (OSError, ValueError) as e:
             logg.warning("bad read of pid file '%s' >> %s", pid_file, e)
-        return pid
+            return default
+        return to_intN(line) if line else default
     def wait_pid_file(self, pid_file: str, timeout: Optional[int] = None) -> Optional[int]: # -> pid?
         """ wait some seconds for the pid file to appear and return the pid """
         timeout = int(timeout or (DefaultTimeoutStartSec/2))
         timeout = max(timeout, (MinimumTimeoutStartSec))
         dirpath = os.path.dirname(os.path.abspath(pid_file))
-        for attempt in range(timeout):
-            logg.debug("%s wait pid file %s", delayed(attempt), pid_file)
-            if not os.path.isdir(dirpath):
-                time.sleep(1) # until TimeoutStartSec/2
-                continue
-            pid = self.read_pid_file(pid_file)
-            if not pid:
-                time.sleep(1) # until TimeoutStartSec/2
-                continue
-            if not pid_exists(pid):
-                time.sleep(1) # until TimeoutStartSec/2
-                continue
-            return pid
-        return None
+        started = time.monotonic()
+        interval = MinimumYield / 8
+        while True:
+            waiting = time.monotonic() - started
+            logg.debug("%s wait pid file %s", delayed(int(waiting)), pid_file)
+            if os.path.isdir(dirpath):
+                pid = self.read_pid_file(pid_file)
+                if pid and pid_exists(pid):
+                    return pid
+            if waiting >= timeout:
+                return None
+            time.sleep(min(interval, timeout - waiting)) # until TimeoutStartSec/2
+            interval = min(interval * 2, 1.)
     def get_status_pid_file(self, unit: str) -> str:
         """ actual file path of pid file (internal) """
         conf = self.unitfiles.get_conf(unit)
@@ -3165,16 +4482,13 @@ class Systemctl:
         status_file = self.get_status_file_from(conf)
         if os.path.exists(status_file):
             os.remove(status_file)
+        self._status_cache.pop(status_file, None)
         conf.status = {}
+        conf.status_dirty = False
     def write_status_from(self, conf: SystemctlConf, **status: Union[str, int, None]) -> bool: # -> bool(written)
         """ if a status_file is known then path is created and the
-            give status is written as the only content. """
-        status_file = self.get_status_file_from(conf)
-        # if not status_file:
-        #     return False
-        dirpath = os.path.dirname(os.path.abspath(status_file))
-        if not os.path.isdir(dirpath):
-            os.makedirs(dirpath)
+            give status is written as the only content. Within a
+            statusbuffer the changes are only written at its end. """
         if conf.status is None:
             conf.status = self.read_status_from(conf)
         if TRUE:
@@ -3189,42 +4503,78 @@ class Systemctl:
                     except KeyError: pass
                 else:
                     conf.status[key] = strE(value)
+        conf.status_dirty = True
+        if conf.status_pending:
+            logg.log(DEBUG_STATUS, "[status] pending %s", status)
+            return True
+        self.flush_status_from(conf)
+        return True
+    def flush_status_from(self, conf: SystemctlConf) -> bool:
+        """ write the changed status to a temporary file that replaces
+            the status file atomically, so readers do not need to take a lock. """
+        if not conf.status_dirty or conf.status is None:
+            return False
+        status_file = self.get_status_file_from(conf)
+        dirpath = os.path.dirname(os.path.abspath(status_file))
+        if not os.path.isdir(dirpath):
+            os.makedirs(dirpath, exist_ok=True)
+        content = ""
+        written: Dict[str, str] = {}
+        for key in sorted(conf.status):
+            value = conf.status[key]
+            if key == "MainPID" and str(value) == "0":
+                logg.warning("[status] ignore writing MainPID=0")
+                continue
+            content += F"{key}={str(value)}\n"
+            written[key] = str(value).strip()
+        logg.debug("[status] writing to %s\n\t%s", status_file, content.strip().replace("\n", "\n\t"))
+        tmp_file = "%s.%s.tmp" % (status_file, os.getpid())
         try:
-            with open(status_file, "w") as f:
-                for key in sorted(conf.status):
-                    value = conf.status[key]
-                    if key == "MainPID" and str(value) == "0":
-                        logg.warning("[status] ignore writing MainPID=0")
-                        continue
-                    content = F"{key}={str(value)}\n"
-                    logg.debug("[status] writing to %s\n\t%s", status_file, content.strip())
-                    f.write(content)
+            with open(tmp_file, "w") as f:
+                f.write(content)
+                if STATUS_FSYNC:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, status_file)
+            stats = stat_key(status_file)
+            if stats:
+                self._status_cache[status_file] = (stats, written)
         except IOError as e:
-            logg.error("[status] writing STATUS %s >> %s\n\t to status file %s", status, e, status_file)
+            logg.error("[status] writing STATUS %s >> %s\n\t to status file %s", conf.status, e, status_file)
+            self._status_cache.pop(status_file, None)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+        conf.status_dirty = False
         return True
     def read_status_from(self, conf: SystemctlConf) -> Dict[str, str]:
+        if conf.status_dirty and conf.status is not None:
+            return dict(conf.status) # not yet flushed
         status_file = self.get_status_file_from(conf)
         status: Dict[str, str] = {}
         # if not status_file:
         #   return status
-        if not os.path.isfile(status_file):
+        key = stat_key(status_file)
+        if not key:
             logg.log(DEBUG_STATUS, "[status] no status file: %s\n returning %s", status_file, status)
             return status
-        if self.truncate_old(status_file):
+        cached = self._status_cache.get(status_file)
+        if cached and cached[0] == key:
+            return dict(cached[1])
+        if self.truncate_old(status_file, key[1] / 1e9):
             logg.log(DEBUG_STATUS, "[status] old status file: %s\n returning %s", status_file, status)
             return status
         try:
             logg.log(DEBUG_STATUS, "reading %s", status_file)
             with open(status_file) as f:
-                for line in f:
-                    if line.strip():
-                        m = re.match(r"(\w+)[:=](.*)", line)
-                        if m:
-                            key, value = m.group(1), m.group(2)
-                            if key.strip():
-                                status[key.strip()] = value.strip()
-                        else:  # pragma: no cover
-                            logg.warning("[status] ignored %s", line.strip())
+                text = f.read() # a snapshot, the writer replaces the file
+            for line in text.splitlines():
+                if line.strip():
+                    name, value = split_status_line(line)
+                    if name:
+                        status[name] = value.strip()
+                    else:  # pragma: no cover
+                        logg.warning("[status] ignored %s", line.strip())
+            self._status_cache[status_file] = (key, dict(status))
         except (OSError, ValueError) as e:
             logg.warning("[status] bad read of status file '%s' >> %s", status_file, e)
         return status
@@ -3243,10 +4593,45 @@ class Systemctl:
     #
     def get_boottime(self) -> float:
         """ detects the boot time of the container - in general the start time of PID 1 """
+        if self._boottime is None:
+            self._boottime = self.get_boottime_from_status()
         if self._boottime is None:
             self._boottime = self.get_boottime_from_proc()
         assert self._boottime is not None
         return self._boottime
+    def get_boottime_from_status(self) -> Optional[float]:
+        """ the boot time stored in the sysinit status file - valid as long as the
+            boot process has the same starttime, so it is only one read of /proc """
+        status_file = self.get_status_file_from(self.sysinit_target())
+        status: Dict[str, str] = {}
+        try:
+            with open(status_file) as f:
+                for line in f:
+                    name, value = split_status_line(line.strip())
+                    if name:
+                        status[name] = value.strip()
+        except OSError:
+            return None
+        boot_pid = to_intN(status.get("BootPID"))
+        boot_ticks = to_intN(status.get("BootTicks"))
+        if boot_pid is None or boot_ticks is None or "BootTime" not in status:
+            return None
+        pid1 = BOOT_PID_MIN or 0
+        pid_max = BOOT_PID_MAX
+        if pid_max < 0:
+            pid_max = pid1 - pid_max
+        if boot_pid < pid1 or boot_pid >= pid_max:
+            return None
+        try:
+            if self.proc_started_ticks(_proc_pid_stat.format(pid=boot_pid)) != boot_ticks:
+                logg.log(DEBUG_BOOTTIME, " boottime in %s is from an older boot", status_file)
+                return None
+            booted = float(status["BootTime"])
+        except (OSError, IndexError, ValueError):
+            return None
+        logg.log(DEBUG_BOOTTIME, " boottime %s from %s", datetime.datetime.fromtimestamp(booted), status_file)
+        self._bootident = (boot_pid, boot_ticks)
+        return booted
     def get_boottime_from_proc(self) -> float:
         """ detects the latest boot time by looking at the start time of available process"""
         pid1 = BOOT_PID_MIN or 0
@@ -3258,7 +4643,9 @@ class Systemctl:
             try:
                 if os.path.exists(proc):
                     # return os.path.getmtime(proc) # did sometimes change
-                    return self.path_proc_started(proc)
+                    started_ticks = self.proc_started_ticks(proc)
+                    self._bootident = (pid, started_ticks)
+                    return self.proc_started_time(started_ticks, proc)
             except OSError as e: # pragma: no cover
                 logg.warning("boottime - could not access %s >> %s", proc, e)
         logg.log(DEBUG_BOOTTIME, " boottime from the oldest entry in /proc [nothing in %s..%s]", pid1, pid_max)
@@ -3281,19 +4668,18 @@ class Systemctl:
     # You can't use the modified timestamp of the status file because it isn't static.
     # ... using clock ticks it is known to be a linear time on Linux
     def path_proc_started(self, proc: str) -> float:
+        return self.proc_started_time(self.proc_started_ticks(proc), proc)
+    def proc_started_ticks(self, proc: str) -> int:
         # get time process started after boot in clock ticks
         with open(proc) as file_stat:
             data_stat = file_stat.readline()
-        file_stat.close()
         stat_data = data_stat.split()
-        started_ticks = stat_data[21]
         # man proc(5): "(22) starttime = The time the process started after system boot."
         #    ".. the value is expressed in clock ticks (divide by sysconf(_SC_CLK_TCK))."
         # NOTE: for containers the start time is related to the boot time of host system.
-
-        clkTickInt = os.sysconf_names['SC_CLK_TCK']
-        clockTicksPerSec = os.sysconf(clkTickInt)
-        started_secs = float(started_ticks) / clockTicksPerSec
+        return int(stat_data[21])
+    def proc_started_time(self, started_ticks: int, proc: str) -> float:
+        started_secs = float(started_ticks) / clock_ticks()
         logg.log(DEBUG_BOOTTIME, "  BOOT .. Proc started time:  %.3f (%s)", started_secs, proc)
         # this value is the start time from the host system
 
@@ -3329,8 +4715,9 @@ class Systemctl:
 
     def get_filetime(self, filename: str) -> float:
         return os.path.getmtime(filename)
-    def truncate_old(self, filename: str) -> bool:
-        filetime = self.get_filetime(filename)
+    def truncate_old(self, filename: str, filetime: Optional[float] = None) -> bool:
+        if filetime is None:
+            filetime = self.get_filetime(filename)
         boottime = self.get_boottime()
         if filetime >= boottime:
             logg.log(DEBUG_BOOTTIME, "  file time: %s (%s)", datetime.datetime.fromtimestamp(filetime), o22(filename))
@@ -3567,7 +4954,7 @@ class Systemctl:
                         dirpath = os_path(self._root, path)
                         basepath = os.path.dirname(var_dirpath)
                         if not os.path.isdir(basepath):
-                            os.makedirs(basepath)
+                            os.makedirs(basepath, exist_ok=True)
                         try:
                             os.symlink(dirpath, var_dirpath)
                         except OSError as e:
@@ -3615,7 +5002,7 @@ class Systemctl:
         dirpath = os_path(self._root, path)
         if not os.path.isdir(dirpath):
             try:
-                os.makedirs(dirpath)
+                os.makedirs(dirpath, exist_ok=True)
                 logg.info("created directory path: %s", dirpath)
             except OSError as e: # pragma: no cover
                 logg.debug("errors directory path: %s >> %s", dirpath, e)
@@ -3754,6 +5141,15 @@ class Systemctl:
             return False
         return not missing
     def log_units(self, units: List[str], lines: Optional[int] = None, follow: bool = False) -> int:
+        if follow and len(units) > 1:
+            # "tail -F" would not return to the next unit, so they are all followed natively
+            logs: List[Tuple[str, str]] = []
+            for unit in self.unitfiles.sorted_after(units):
+                conf = self.unitfiles.load_conf(unit)
+                if not conf:
+                    return -1
+                logs.append((unit, self.journal.get_log_from(conf)))
+            return self.journal.follow_units(logs, lines, since=self.journal.since, until=self.journal.until)
         result = 0
         for unit in self.unitfiles.sorted_after(units):
             exitcode = self.log_unit(unit, lines, follow)
@@ -3825,7 +5221,7 @@ class Systemctl:
         socketfile = self.get_notify_socket_from(conf, socketfile, debug=True)
         try:
             if not os.path.isdir(os.path.dirname(socketfile)):
-                os.makedirs(os.path.dirname(socketfile))
+                os.makedirs(os.path.dirname(socketfile), exist_ok=True)
             if os.path.exists(socketfile):
                 os.unlink(socketfile)
         except OSError as e:
@@ -3924,19 +5320,103 @@ class Systemctl:
         /// SPECIAL: may run the init-loop and
             stop the named units afterwards """
         self.wait_system()
+        if init and not self._child_reaper:
+            # the main processes must be our children before they can exit
+            self._child_reaper = os.getpid() == 1 or set_child_subreaper()
         done = True
         started_units = []
-        for unit in self.unitfiles.sorted_after(units):
-            started_units.append(unit)
-            if not self.start_unit(unit):
-                done = False
+        sorted_units = self.unitfiles.sorted_after(units)
+        if MaxParallelJobs > 1 and len(sorted_units) > 1 and not self._parallel_worker:
+            depends = self.unitfiles.ordered_depends(sorted_units)
+            started_units = sorted_units
+            done = self.parallel_units(sorted_units, depends, self.start_unit, MaxParallelJobs)
+        else:
+            for unit in sorted_units:
+                started_units.append(unit)
+                if not self.start_unit(unit):
+                    done = False
         if init:
             logg.info("init-loop start")
             sig = self.init_loop_until_stop(started_units)
             logg.info("init-loop %s", sig)
-            for unit in reversed(started_units):
-                self.stop_unit(unit)
+            self.shutdown_deadline()
+            self.stop_units(started_units)
         return done
+    def parallel_units(self, units: List[str], depends: Dict[str, List[str]], action: Callable[[str], bool], jobs: int) -> bool:
+        """ run the action for each unit in a forked worker as soon as the units
+            it depends on are done, with not more than 'jobs' running at once.
+            The units are picked in list order, so it is the same order as a
+            serial run whenever a unit needs to wait for its predecessors.
+            A worker is single-threaded when it forks the service processes and
+            it does not share any state with us - it reports the result and the
+            error code through a pipe. Socket units keep their listening socket
+            in this process, so they are run here while the workers continue. """
+        done = True
+        waiting = list(units)
+        running: Dict[int, Tuple[str, int]] = {} # pipe => unit, worker pid
+        while waiting or running:
+            for unit in list(waiting):
+                if len(running) >= jobs:
+                    break
+                busy = [name for name, _ in running.values()]
+                blocked = [dep for dep in depends.get(unit, []) if dep in waiting or dep in busy]
+                if blocked and (running or unit != waiting[0]):
+                    logg.log(DEBUG_PARALLEL, "%s waits for %s", unit, blocked)
+                    continue
+                if blocked:
+                    logg.error("%s is blocked by %s - starting it anyway", unit, blocked)
+                waiting.remove(unit)
+                if get_unit_type(unit) in ["socket"]:
+                    logg.log(DEBUG_PARALLEL, "%s runs in the main process", unit)
+                    if not self.parallel_action(action, unit):
+                        done = False
+                    continue
+                logg.log(DEBUG_PARALLEL, "%s runs as job %s of %s", unit, len(running) + 1, jobs)
+                readfd, writefd = os.pipe()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                pid = os.fork()
+                if not pid: # pragma: no cover
+                    try:
+                        os.close(readfd)
+                        self._parallel_worker = True
+                        result = self.parallel_action(action, unit)
+                        os.write(writefd, b"%i %i" % (result, self.error))
+                        sys.stdout.flush()
+                    finally:
+                        os._exit(0) # the command processes end in execve_child
+                os.close(writefd)
+                running[readfd] = (unit, pid)
+            if not running:
+                continue
+            ready, _, _ = select.select(list(running), [], [], MinimumYield * 2)
+            for readfd in list(running):
+                unit, pid = running[readfd]
+                if readfd in ready:
+                    reply = os.read(readfd, 100).split()
+                    subprocess_waitpid(pid)
+                elif subprocess_testpid(pid).returncode is None:
+                    continue
+                else: # a worker that was killed does not report
+                    reported, _, _ = select.select([readfd], [], [], 0)
+                    reply = os.read(readfd, 100).split() if reported else []
+                os.close(readfd)
+                del running[readfd]
+                result = len(reply) == 2 and reply[0] == b"1"
+                if len(reply) == 2:
+                    self.error |= int(reply[1])
+                else:
+                    logg.error("%s worker PID %s did not report back", unit, pid)
+                logg.log(DEBUG_PARALLEL, "%s is done (%s), %s running, %s waiting", unit, result, len(running), len(waiting))
+                if not result:
+                    done = False
+        return done
+    def parallel_action(self, action: Callable[[str], bool], unit: str) -> bool:
+        try:
+            return action(unit)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logg.error("%s failed >> %s", unit, e)
+            return False
     def start_unit(self, unit: str) -> bool:
         conf = self.unitfiles.load_conf(unit)
         if conf is None:
@@ -3996,6 +5476,9 @@ class Systemctl:
             logg.error("start not implemented for unit type: %s", conf.name())
             return False
     def do_start_service_from(self, conf: SystemctlConf) -> bool:
+        with statusbuffer(conf, self.flush_status_from):
+            return self.run_start_service_from(conf)
+    def run_start_service_from(self, conf: SystemctlConf) -> bool:
         timeout = self.unitfiles.get_TimeoutStartSec(conf)
         doRemainAfterExit = self.unitfiles.get_RemainAfterExit(conf)
         runs = conf.get(Service, "Type", "simple").lower()
@@ -4015,9 +5498,7 @@ class Systemctl:
             for cmd in conf.getlist(Service, "ExecStartPre", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info(" pre-start %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug(" pre-start done (%s) <-%s>",
                            run.returncode or "OK", run.signal or "")
@@ -4036,10 +5517,7 @@ class Systemctl:
             for cmd in conf.getlist(Service, "ExecStart", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid: # pragma: no cover
-                    os.setsid() # detach child process from parent
-                    self.execve_from(conf, newcmd, env)
+                forkpid = self.spawn_execve_from(conf, newcmd, env, setsid=True)
                 run = subprocess_waitpid(forkpid)
                 if run.returncode and exe.check:
                     returncode = run.returncode
@@ -4070,15 +5548,11 @@ class Systemctl:
                 env["MAINPID"] = strE(pid)
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid: # pragma: no cover
-                    os.setsid() # detach child process from parent
-                    self.execve_from(conf, newcmd, env)
+                forkpid, failed = self.fork_execve_from(conf, newcmd, env)
                 self.write_status_from(conf, MainPID=forkpid)
                 logg.info("%s started PID %s", runs, forkpid)
                 env["MAINPID"] = strE(forkpid)
-                time.sleep(MinimumYield)
-                run = subprocess_testpid(forkpid)
+                run = self.exec_failed_testpid(forkpid, failed)
                 if run.returncode is not None:
                     logg.info("%s stopped PID %s (%s) <-%s>", runs, run.pid,
                               run.returncode or "OK", run.signal or "")
@@ -4113,17 +5587,13 @@ class Systemctl:
                 env["MAINPID"] = strE(mainpid)
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid: # pragma: no cover
-                    os.setsid() # detach child process from parent
-                    self.execve_from(conf, newcmd, env)
+                forkpid, failed = self.fork_execve_from(conf, newcmd, env)
                 # via NOTIFY # self.write_status_from(conf, MainPID=forkpid)
                 logg.info("%s started PID %s", runs, forkpid)
                 mainpid = forkpid
                 self.write_status_from(conf, MainPID=mainpid)
                 env["MAINPID"] = strE(mainpid)
-                time.sleep(MinimumYield)
-                run = subprocess_testpid(forkpid)
+                run = self.exec_failed_testpid(forkpid, failed)
                 if run.returncode is not None:
                     logg.info("%s stopped PID %s (%s) <-%s>", runs, run.pid,
                               run.returncode or "OK", run.signal or "")
@@ -4136,6 +5606,7 @@ class Systemctl:
                         break
             if service_result in ["success"] and mainpid:
                 logg.debug("okay, waiting on socket for %ss", timeout)
+                self.flush_status_from(conf)
                 results = self.wait_notify_socket(notify, timeout, mainpid, pid_file)
                 if "MAINPID" in results:
                     new_pid = to_intN(results["MAINPID"])
@@ -4156,10 +5627,7 @@ class Systemctl:
                 if not newcmd:
                     continue
                 logg.info("%s start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid: # pragma: no cover
-                    os.setsid() # detach child process from parent
-                    self.execve_from(conf, newcmd, env)
+                forkpid = self.spawn_execve_from(conf, newcmd, env, setsid=True)
                 logg.info("%s started PID %s", runs, forkpid)
                 run = subprocess_waitpid(forkpid)
                 if run.returncode and exe.check:
@@ -4168,6 +5636,7 @@ class Systemctl:
                 logg.info("%s stopped PID %s (%s) <-%s>", runs, run.pid,
                           run.returncode or "OK", run.signal or "")
             if pid_file and service_result in ["success"]:
+                self.flush_status_from(conf)
                 pid = self.wait_pid_file(pid_file) # application PIDFile
                 logg.info("%s start done PID %s [%s]", runs, pid, pid_file)
                 if pid:
@@ -4182,6 +5651,7 @@ class Systemctl:
         else:
             logg.error("unsupported run type '%s'", runs)
             return False
+        self.flush_status_from(conf) # visible to the Post commands
         # POST sequence
         if not self.is_active_from(conf):
             logg.warning("%s start not active", runs)
@@ -4191,9 +5661,7 @@ class Systemctl:
             for cmd in conf.getlist(Service, "ExecStopPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("post-fail %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("post-fail done (%s) <-%s>",
                            run.returncode or "OK", run.signal or "")
@@ -4204,9 +5672,7 @@ class Systemctl:
             for cmd in conf.getlist(Service, "ExecStartPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("post-start %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("post-start done (%s) <-%s>",
                            run.returncode or "OK", run.signal or "")
@@ -4316,9 +5782,7 @@ class Systemctl:
             for cmd in conf.getlist(Socket, "ExecStartPre", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s pre-start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("%s pre-start done (%s) <-%s>", runs,
                            run.returncode or "OK", run.signal or "")
@@ -4356,9 +5820,7 @@ class Systemctl:
             for cmd in conf.getlist(Socket, "ExecStopPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s post-fail %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("%s post-fail done (%s) <-%s>", runs,
                            run.returncode or "OK", run.signal or "")
@@ -4367,9 +5829,7 @@ class Systemctl:
             for cmd in conf.getlist(Socket, "ExecStartPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s post-start %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("%s post-start done (%s) <-%s>", runs,
                            run.returncode or "OK", run.signal or "")
@@ -4432,7 +5892,7 @@ class Systemctl:
             symlinks = conf.getlist(Socket, "SymLinks", [])
             dirpath = os.path.dirname(path)
             if not os.path.isdir(dirpath):
-                os.makedirs(dirpath, int(dirmode, 8))
+                os.makedirs(dirpath, int(dirmode, 8), exist_ok=True)
             if os.path.exists(path):
                 os.unlink(path)
             sock.bind(path)
@@ -4509,7 +5969,69 @@ class Systemctl:
             os.dup2(std.out.fileno(), sys.stdout.fileno())
             os.dup2(std.err.fileno(), sys.stderr.fileno())
         # implicit: std.inp.close(), std.out.close(), std.err.close()
-    def execve_from(self, conf: SystemctlConf, cmd: List[str], env: Dict[str, str]) -> NoReturn:
+    def spawn_execve_from(self, conf: SystemctlConf, cmd: List[str], env: Dict[str, str], setsid: bool = False) -> int:
+        """ start a command that we wait for and return its pid. Uses posix_spawn when the
+            unit does not need a setuid or chdir, otherwise it is a fork of this process. """
+        if self.posix_spawn_possible(conf):
+            std = self.journal.open_standard_log(conf)
+            with std.inp, std.out, std.err:
+                actions = []
+                if EXEC_DUP2:
+                    actions = [(os.POSIX_SPAWN_DUP2, std.inp.fileno(), 0),
+                               (os.POSIX_SPAWN_DUP2, std.out.fileno(), 1),
+                               (os.POSIX_SPAWN_DUP2, std.err.fileno(), 2)]
+                try:
+                    spawned = os.posix_spawn(cmd[0], cmd, self.extend_exec_env(env), file_actions=actions, setsid=setsid)
+                    _proc_forked() # no at-fork hooks
+                    return spawned
+                except OSError as e:
+                    logg.debug("posix_spawn (%s) >> %s", shell_cmd(cmd), e)
+                    # and the fork reports the problem as usual
+        forkpid = os.fork()
+        if not forkpid: # pragma: no cover
+            if setsid:
+                os.setsid() # detach child process from parent
+            self.execve_child(conf, cmd, env)
+        return forkpid
+    def posix_spawn_possible(self, conf: SystemctlConf) -> bool:
+        if not EXEC_POSIX_SPAWN or EXEC_SPAWN or not hasattr(os, "posix_spawn"): # python3.8+
+            return False
+        if self._root: # chdir
+            return False
+        if self.unitfiles.get_User(conf) or self.unitfiles.get_Group(conf):
+            return False
+        if self.unitfiles.get_SupplementaryGroups(conf):
+            return False
+        if self.unitfiles.get_WorkingDirectory(conf):
+            return False
+        return True
+    def fork_execve_from(self, conf: SystemctlConf, cmd: List[str], env: Dict[str, str]) -> Tuple[int, int]:
+        """ fork a detached child process and wait for its execve to have succeeded. The
+            status pipe is CLOEXEC, so it gets EOF on success or the errno on failure.
+            Returns the child pid and the errno (0 if the command is running). """
+        readfd, writefd = os.pipe() # non-inheritable
+        forkpid = os.fork()
+        if not forkpid: # pragma: no cover
+            os.close(readfd)
+            os.setsid() # detach child process from parent
+            self.execve_child(conf, cmd, env, writefd)
+        os.close(writefd)
+        with os.fdopen(readfd, "rb") as status:
+            data = status.read()
+        return forkpid, to_int(data.decode("ascii", "replace"), 0)
+    def execve_child(self, conf: SystemctlConf, cmd: List[str], env: Dict[str, str], status: int = -1) -> NoReturn:
+        """ the execve_from in a forked child process. It does never return into the code
+            of the parent - a failure (or the exit code with EXEC_SPAWN) ends it right here. """
+        exitcode = 1
+        try:
+            self.execve_from(conf, cmd, env, status)
+        except SystemExit as e:
+            exitcode = e.code if isinstance(e.code, int) else 1
+        except BaseException as e: # pylint: disable=broad-exception-caught
+            logg.error("(%s) >> %s", shell_cmd(cmd), e)
+        finally:
+            os._exit(exitcode)
+    def execve_from(self, conf: SystemctlConf, cmd: List[str], env: Dict[str, str], status: int = -1) -> NoReturn:
         """ this code is commonly run in a child process // returns exit-code"""
         runs = conf.get(Service, "Type", "simple").lower()
         # logg.debug("%s process for %s => %s", runs, strE(conf.name()), strQ(conf.filename()))
@@ -4523,11 +6045,13 @@ class Systemctl:
         badpath = self.chdir_workingdir(conf) # some dirs need setuid before
         if badpath:
             logg.error("(%s): bad workingdir: '%s'", shell_cmd(cmd), badpath)
+            exec_status(status, errno.ENOENT)
             sys.exit(1)
         env = self.extend_exec_env(env)
         env.update(envs) # set $HOME to ~$USER
         try:
             if EXEC_SPAWN:
+                exec_status(status, 0)
                 cmd_args = [arg for arg in cmd] # satisfy mypy
                 exitcode = os.spawnvpe(os.P_WAIT, cmd[0], cmd_args, env)
                 sys.exit(exitcode)
@@ -4536,7 +6060,17 @@ class Systemctl:
                 sys.exit(11) # pragma: no cover (can not be reached / bug like mypy#8401)
         except (OSError, RuntimeError) as e:
             logg.error("(%s) >> %s", shell_cmd(cmd), e)
+            exec_status(status, getattr(e, "errno", None) or errno.ENOEXEC)
             sys.exit(1)
+    def exec_failed_testpid(self, forkpid: int, failed: int) -> SystemctlWaitPID:
+        """ a failed execve has its child exiting right away - otherwise it is still running
+            unless it did quit within EXEC_QUICK_EXIT (like a 'sleep' with a bad argument). """
+        if failed:
+            logg.error("exec failed PID %s >> %s", forkpid, os.strerror(failed))
+            return subprocess_waitpid(forkpid)
+        if EXEC_QUICK_EXIT > 0:
+            self.wait_pid_exit(forkpid, EXEC_QUICK_EXIT)
+        return subprocess_testpid(forkpid)
     def test_start_unit(self, unit: str) -> None:
         """ helper function to test the code that is normally forked off """
         conf = self.unitfiles.load_conf(unit)
@@ -4567,10 +6101,54 @@ class Systemctl:
         """ fails if any unit fails to stop """
         self.wait_system()
         done = True
-        for unit in reversed(self.unitfiles.sorted_after(units)):
+        sorted_units = self.unitfiles.sorted_after(units)
+        if MaxParallelJobs > 1 and len(sorted_units) > 1 and not self._parallel_worker:
+            depends: Dict[str, List[str]] = dict([(unit, []) for unit in sorted_units])
+            for unit, deps in self.unitfiles.ordered_depends(sorted_units).items():
+                for dep in deps:
+                    depends[dep].append(unit)
+            return self.parallel_units(list(reversed(sorted_units)), depends, self.stop_unit, MaxParallelJobs)
+        for unit in reversed(sorted_units):
             if not self.stop_unit(unit):
                 done = False
         return done
+    def shutdown_deadline(self) -> None:
+        """ start the ShutdownTimeoutSec budget for stopping all units """
+        if ShutdownTimeoutSec > 0 and not self._stop_deadline:
+            logg.info("shutdown within %ss", ShutdownTimeoutSec)
+            self._stop_deadline = time.monotonic() + ShutdownTimeoutSec
+    def stop_timeout(self, timeout: float) -> float:
+        """ a TimeoutStopSec shrinks to what is left of the shutdown budget """
+        if self._stop_deadline:
+            remaining = self._stop_deadline - time.monotonic() - 2 * MinimumYield # for the hard kill
+            return max(0., min(timeout, remaining))
+        return timeout
+    def stop_waitpid(self, forkpid: int) -> SystemctlWaitPID:
+        """ an ExecStop command gets killed when the shutdown budget is used up """
+        if not self._stop_deadline:
+            return subprocess_waitpid(forkpid)
+        while True:
+            run = subprocess_testpid(forkpid)
+            if run.returncode is not None:
+                return run
+            remaining = self.stop_timeout(DefaultMaximumTimeout)
+            if not remaining:
+                logg.warning("shutdown budget used up - hard kill PID %s", forkpid)
+                self._kill_pid(forkpid, signal.SIGKILL)
+                return subprocess_waitpid(forkpid)
+            if pidfd_wait(forkpid, remaining) is None:
+                time.sleep(min(remaining, 0.1))
+    def kill_after_shutdown_deadline(self, conf: SystemctlConf, pid: int) -> bool:
+        """ the main process did not stop in time for the shutdown budget """
+        if not self._stop_deadline:
+            return False
+        procs = self.proc_table(fresh=True)
+        pidlist = self.pidlist_of(pid, procs)
+        logg.warning("%s not stopped within ShutdownTimeoutSec - hard kill PIDs %s", conf.name(), pidlist)
+        for child in pidlist:
+            self._kill_pid(child, signal.SIGKILL, procs)
+        time.sleep(MinimumYield)
+        return not self.is_active_pid(pid)
     def stop_unit(self, unit: str) -> bool:
         conf = self.unitfiles.load_conf(unit)
         if conf is None:
@@ -4600,8 +6178,11 @@ class Systemctl:
             logg.error("stop not implemented for unit type: %s", conf.name())
             return False
     def do_stop_service_from(self, conf: SystemctlConf) -> bool:
+        with statusbuffer(conf, self.flush_status_from):
+            return self.run_stop_service_from(conf)
+    def run_stop_service_from(self, conf: SystemctlConf) -> bool:
         pid: Optional[int]
-        timeout = self.unitfiles.get_TimeoutStopSec(conf)
+        timeout = self.stop_timeout(self.unitfiles.get_TimeoutStopSec(conf))
         runs = conf.get(Service, "Type", "simple").lower()
         env = self.unitfiles.get_env(conf)
         if not self._quiet:
@@ -4620,10 +6201,8 @@ class Systemctl:
             for cmd in conf.getlist(Service, "ExecStop", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s stop %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
-                run = subprocess_waitpid(forkpid)
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
+                run = self.stop_waitpid(forkpid)
                 if run.returncode and exe.check:
                     returncode = run.returncode
                     service_result = "failed"
@@ -4650,10 +6229,8 @@ class Systemctl:
                 env["MAINPID"] = strE(self.read_mainpid_from(conf))
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s stop %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
-                run = subprocess_waitpid(forkpid)
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
+                run = self.stop_waitpid(forkpid)
                 run = must_have_failed(run, newcmd) # TODO: a workaround
                 # self.write_status_from(conf, MainPID=run.pid) # no ExecStop
                 if run.returncode and exe.check:
@@ -4662,12 +6239,12 @@ class Systemctl:
                     break
             pid = to_intN(env.get("MAINPID"))
             if pid:
-                if self.wait_vanished_pid(pid, timeout):
+                if self.wait_vanished_pid(pid, timeout) or self.kill_after_shutdown_deadline(conf, pid):
                     self.clean_pid_file_from(conf)
                     self.clean_status_from(conf) # "inactive"
             else:
                 logg.info("%s sleep as no PID was found on Stop", runs)
-                time.sleep(MinimumTimeoutStopSec)
+                time.sleep(self.stop_timeout(MinimumTimeoutStopSec))
                 pid = self.read_mainpid_from(conf)
                 if not pid or not pid_exists(pid) or pid_zombie(pid):
                     self.clean_pid_file_from(conf)
@@ -4683,26 +6260,24 @@ class Systemctl:
                         env["MAINPID"] = strE(new_pid)
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("fork stop %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
-                run = subprocess_waitpid(forkpid)
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
+                run = self.stop_waitpid(forkpid)
                 if run.returncode and exe.check:
                     returncode = run.returncode
                     service_result = "failed"
                     break
             pid = to_intN(env.get("MAINPID"))
             if pid:
-                if self.wait_vanished_pid(pid, timeout):
+                if self.wait_vanished_pid(pid, timeout) or self.kill_after_shutdown_deadline(conf, pid):
                     self.clean_pid_file_from(conf)
             else:
                 logg.info("%s sleep as no PID was found on Stop", runs)
-                time.sleep(MinimumTimeoutStopSec)
+                time.sleep(self.stop_timeout(MinimumTimeoutStopSec))
                 pid = self.read_mainpid_from(conf)
                 if not pid or not pid_exists(pid) or pid_zombie(pid):
                     self.clean_pid_file_from(conf)
             if returncode:
-                if os.path.isfile(status_file):
+                if conf.status_dirty or os.path.isfile(status_file):
                     self.set_status_from(conf, "ExecStopCode", strE(returncode))
                     self.write_status_from(conf, AS="failed")
             else:
@@ -4710,16 +6285,15 @@ class Systemctl:
         else:
             logg.error("unsupported run type '%s'", runs)
             return False
+        self.flush_status_from(conf) # visible to the Post commands
         # POST sequence
         if not self.is_active_from(conf):
             env["SERVICE_RESULT"] = service_result
             for cmd in conf.getlist(Service, "ExecStopPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("post-stop %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
-                run = subprocess_waitpid(forkpid)
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
+                run = self.stop_waitpid(forkpid)
                 logg.debug("post-stop done (%s) <-%s>",
                            run.returncode or "OK", run.signal or "")
         if self._only_what[0] not in ["none", "keep"]:
@@ -4755,9 +6329,7 @@ class Systemctl:
             for cmd in conf.getlist(Socket, "ExecStopPost", []):
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("post-stop %s", shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 logg.debug("post-stop done (%s) <-%s>",
                            run.returncode or "OK", run.signal or "")
@@ -4767,14 +6339,27 @@ class Systemctl:
             return True
         if not self.is_active_pid(pid):
             return True
-        for attempt in range(int(timeout)):
-            time.sleep(1) # until TimeoutStopSec
-            logg.debug("%s wait for PID %s to vanish (%ss)", delayed(attempt), pid, timeout)
-            if not self.is_active_pid(pid):
-                logg.info(" %s wait for PID %s is done", delayed(attempt), pid)
-                return True
+        started = time.monotonic()
+        logg.debug("wait for PID %s to vanish (%ss)", pid, timeout)
+        if self.wait_pid_exit(pid, timeout): # until TimeoutStopSec
+            logg.info(" %s wait for PID %s is done", delayed(int(time.monotonic() - started)), pid)
+            return True
         logg.info("%s wait for PID %s failed", delayed(int(timeout)), pid)
         return False
+    def wait_pid_exit(self, pid: int, timeout: float) -> bool:
+        """ wake up as soon as the process has exited - polling when there is no pidfd """
+        done = pidfd_wait(pid, timeout)
+        if done is not None:
+            return done
+        deadline = time.monotonic() + timeout
+        interval = MinimumYield / 8
+        while self.is_active_pid(pid):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, 1.)
+        return True
     def reload_modules(self, *modules: str) -> bool:
         """ reload [UNIT]... -- reload these units """
         self.wait_system()
@@ -4847,9 +6432,7 @@ class Systemctl:
                 newcmd = [initscript, "reload"]
                 env["SYSTEMCTL_SKIP_REDIRECT"] = "yes"
                 logg.info("%s reload %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: nocover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 self.set_status_from(conf, "ExecReloadCode", strE(run.returncode))
                 if run.returncode:
@@ -4868,9 +6451,7 @@ class Systemctl:
                 env["MAINPID"] = strE(self.read_mainpid_from(conf))
                 exe, newcmd = self.unitfiles.expand_cmd(cmd, env, conf)
                 logg.info("%s reload %s", runs, shell_cmd(newcmd))
-                forkpid = os.fork()
-                if not forkpid:
-                    self.execve_from(conf, newcmd, env) # pragma: no cover
+                forkpid = self.spawn_execve_from(conf, newcmd, env)
                 run = subprocess_waitpid(forkpid)
                 if run.returncode and exe.check:
                     logg.error("Job for %s failed because the control process exited with error code. (%s)",
@@ -5115,7 +6696,7 @@ class Systemctl:
         useKillMode = self.unitfiles.get_KillMode(conf)
         useKillSignal = self.unitfiles.get_KillSignal(conf)
         kill_signal = getattr(signal, useKillSignal)
-        timeout = self.unitfiles.get_TimeoutStopSec(conf)
+        timeout = self.stop_timeout(self.unitfiles.get_TimeoutStopSec(conf))
         status_file = self.get_status_file_from(conf)
         size = os.path.exists(status_file) and os.path.getsize(status_file)
         logg.info("STATUS %s %s", status_file, size)
@@ -5132,33 +6713,31 @@ class Systemctl:
             logg.debug("ignoring children when mainpid is already dead")
             # because we list child processes, not processes in control-group
             return True
-        pidlist = self.pidlist_of(mainpid) # here
+        procs = self.proc_table(fresh=True)
+        pidlist = self.pidlist_of(mainpid, procs) # here
         if pid_exists(mainpid):
             logg.info("stop kill PID %s", mainpid)
-            self._kill_pid(mainpid, kill_signal)
+            self._kill_pid(mainpid, kill_signal, procs)
         if useKillMode in ["control-group"]:
             if len(pidlist) > 1:
                 logg.info("stop control-group PIDs %s", pidlist)
             for pid in pidlist:
                 if pid != mainpid:
-                    self._kill_pid(pid, kill_signal)
+                    self._kill_pid(pid, kill_signal, procs)
         if doSendSIGHUP:
             logg.info("stop SendSIGHUP to PIDs %s", pidlist)
             for pid in pidlist:
-                self._kill_pid(pid, signal.SIGHUP)
+                self._kill_pid(pid, signal.SIGHUP, procs)
         # wait for the processes to have exited
-        while True:
-            dead = True
-            for pid in pidlist:
-                if pid_exists(pid) and not pid_zombie(pid):
-                    dead = False
-                    break
-            if dead:
-                break
-            if time.monotonic() > started + timeout:
+        dead = True
+        for pid in pidlist:
+            if not self.wait_pid_exit(pid, started + timeout - time.monotonic()): # until TimeoutStopSec
                 logg.info("service PIDs not stopped after %s", timeout)
+                dead = False
                 break
-            time.sleep(1) # until TimeoutStopSec
+        if self._stop_deadline and not dead and not doSendSIGKILL:
+            logg.warning("%s not stopped within ShutdownTimeoutSec - ignoring SendSIGKILL=no", conf.name())
+            doSendSIGKILL = True
         if dead or not doSendSIGKILL:
             logg.info("done kill PID %s %s", mainpid, dead and "OK")
             return dead
@@ -5166,17 +6745,22 @@ class Systemctl:
             logg.info("hard kill PIDs %s", pidlist)
             for pid in pidlist:
                 if pid != mainpid:
-                    self._kill_pid(pid, signal.SIGKILL)
+                    self._kill_pid(pid, signal.SIGKILL, procs)
             time.sleep(MinimumYield)
         # useKillMode in [ "control-group", "mixed", "process" ]
         if pid_exists(mainpid):
             logg.info("hard kill PID %s", mainpid)
-            self._kill_pid(mainpid, signal.SIGKILL)
+            self._kill_pid(mainpid, signal.SIGKILL, procs)
             time.sleep(MinimumYield)
         dead = not pid_exists(mainpid) or pid_zombie(mainpid)
         logg.info("done hard kill PID %s %s", mainpid, dead and "OK")
         return dead
-    def _kill_pid(self, pid: int, kill_signal: Optional[int] = None) -> bool:
+    def _kill_pid(self, pid: int, kill_signal: Optional[int] = None, procs: Optional[SystemctlProcessTable] = None) -> bool:
+        """ with the /proc snapshot of the pid: it is not signaled when its pid was reused since """
+        info = procs.procs.get(pid) if procs else None
+        if info and pid_starttime(pid) != info.starttime:
+            logg.debug("kill PID %s => not the same process anymore", pid)
+            return True
         try:
             sig = kill_signal or signal.SIGTERM
             os.kill(pid, sig)
@@ -5276,7 +6860,7 @@ class Systemctl:
             if not os.path.exists(pid_file):
                 return "inactive"
         status_file = self.get_status_file_from(conf)
-        if self.getsize(status_file):
+        if conf.status_dirty or self.getsize(status_file):
             state = self.get_status_from(conf, "ActiveState", "")
             if state:
                 logg.log(DEBUG_STATUS, "get_status_from %s => %s", conf.name(), state)
@@ -5326,7 +6910,7 @@ class Systemctl:
             if not os.path.exists(pid_file):
                 return "dead"
         status_file = self.get_status_file_from(conf)
-        if self.getsize(status_file):
+        if conf.status_dirty or self.getsize(status_file):
             state = self.get_status_from(conf, "ActiveState", "")
             if state:
                 if state in ["active"]:
@@ -5666,7 +7250,10 @@ class Systemctl:
                 os.remove(target)
             if not os.path.islink(symlink):
                 os.symlink(source, symlink)
+            self.unitfiles.changed_folder(folder)
         return True
+    def enablement(self) -> SystemctlEnablementIndex:
+        return self.unitfiles.enablement([self.rc3_root_folder(), self.rc5_root_folder()])
     def rc3_root_folder(self) -> str:
         old_folder = os_path(self._root, _rc3_boot_folder)
         new_folder = os_path(self._root, _rc3_init_folder)
@@ -5704,6 +7291,7 @@ class Systemctl:
         target = os.path.join(rc_folder, nameK)
         if not os.path.exists(target):
             os.symlink(unit_file, target)
+        self.unitfiles.changed_folder(rc_folder)
         return True
     def disable_modules(self, *modules: str) -> bool:
         """ disable [UNIT]... -- disable these units """
@@ -5767,6 +7355,7 @@ class Systemctl:
                             os.remove(symlink)
                     except OSError as e:
                         logg.error("disable %s >> %s", symlink, e)
+                    self.unitfiles.changed_folder(folder)
         return True
     def disable_unit_sysv(self, unit_file: str) -> bool:
         rc3 = self._disable_unit_sysv(unit_file, self.rc3_root_folder())
@@ -5791,10 +7380,14 @@ class Systemctl:
         target = os.path.join(rc_folder, nameK)
         if os.path.exists(target):
             os.unlink(target)
+        self.unitfiles.changed_folder(rc_folder)
         return True
     def is_enabled_sysv(self, unit_file: str) -> bool:
         name = os.path.basename(unit_file)
-        target = os.path.join(self.rc3_root_folder(), "S50%s" % name)
+        folder = self.rc3_root_folder()
+        if not self.enablement().wanted_in("S50%s" % name, folder):
+            return False
+        target = os.path.join(folder, "S50%s" % name)
         if os.path.exists(target):
             return True
         return False
@@ -5857,10 +7450,13 @@ class Systemctl:
             return "masked"
         wanted = self.unitfiles.get_InstallTargets(conf)
         targets = wanted or [self.get_default_target()]
+        index = self.enablement()
         for target in targets:
             for folder in self.enablefolders(target):
                 if self._root:
                     folder = os_path(self._root, folder)
+                if not index.wanted_in(conf.name(), folder):
+                    continue
                 target = os.path.join(folder, conf.name())
                 if os.path.isfile(target):
                     return "enabled"
@@ -5917,6 +7513,7 @@ class Systemctl:
         if not os.path.exists(target):
             os.symlink(dev_null, target)
             logg.info("Created symlink %s -> %s", strQ(target), dev_null)
+            self.unitfiles.changed_folder(folder)
             return True
         elif os.path.islink(target):
             logg.debug("mask symlink does already exist: %s", target)
@@ -5980,6 +7577,7 @@ class Systemctl:
             logg.info("rm %s %s", _f, strQ(target))
         if os.path.islink(target):
             os.remove(target)
+            self.unitfiles.changed_folder(folder)
             return True
         elif not os.path.exists(target):
             logg.debug("Symlink did not exist anymore: %s", target)
@@ -6028,6 +7626,7 @@ class Systemctl:
         if self._now:
             logg.debug("loop_sleep=%s", self.loop_sleep)
         errors = 0
+        self.unitfiles.reload_catalog()
         for unit in self.unitfiles.match_units():
             conf = None
             try:
@@ -6037,6 +7636,7 @@ class Systemctl:
                 logg.error("%s: can not read unit file %s >> %s", unit, strQ(filename), e)
                 continue
             errors += self.unitfiles.syntax_check(conf)
+        self.unitfiles.save_catalog()
         if errors:
             logg.warning(" (%s) found %s problems", errors, errors % 100)
         return True # errors
@@ -6176,12 +7776,7 @@ class Systemctl:
         logg.log(DEBUG_TARGET_LIST, "loaded igno patterns = %s", igno)
         return igno
     def _ignored_unit(self, unit: str, ignore_list: List[str]) -> bool:
-        for ignore in ignore_list:
-            if fnmatch.fnmatchcase(unit, ignore):
-                return True # ignore
-            if fnmatch.fnmatchcase(unit, ignore+".service"):
-                return True # ignore
-        return False
+        return compiled_patterns(ignore_list, suffix=".service").matches(unit)
     def default_services_modules(self, *modules: str) -> List[str]:
         """ default-services -- show the default services
             This is used internally to know the list of service to be started in the 'get-default'
@@ -6308,99 +7903,85 @@ class Systemctl:
     def enabled_target_user_local_units(self, target: str, unit_kind: str = ".service", igno: Optional[List[str]] = None) -> List[str]:
         igno = igno if igno else []
         units: List[str] = []
+        index = self.enablement()
         for basefolder in self.unitfiles.user_folders():
             if not basefolder:
                 continue
             folder = self.default_enablefolder(target, basefolder)
             if self._root:
                 folder = os_path(self._root, folder)
-            if os.path.isdir(folder):
-                for unit in sorted(os.listdir(folder)):
-                    path = os.path.join(folder, unit)
-                    if os.path.isdir(path):
-                        continue
-                    if self._ignored_unit(unit, igno):
-                        continue # ignore
-                    if unit.endswith(unit_kind):
-                        units.append(unit)
+            for unit in index.listed(folder):
+                if self._ignored_unit(unit, igno):
+                    continue # ignore
+                if unit.endswith(unit_kind):
+                    units.append(unit)
         return units
     def enabled_target_user_system_units(self, target: str, unit_kind: str = ".service", igno: Optional[List[str]] = None) -> List[str]:
         igno = igno if igno else []
         units: List[str] = []
+        index = self.enablement()
         for basefolder in self.unitfiles.system_folders():
             if not basefolder:
                 continue
             folder = self.default_enablefolder(target, basefolder)
             if self._root:
                 folder = os_path(self._root, folder)
-            if os.path.isdir(folder):
-                for unit in sorted(os.listdir(folder)):
-                    path = os.path.join(folder, unit)
-                    if os.path.isdir(path):
-                        continue
-                    if self._ignored_unit(unit, igno):
-                        continue # ignore
-                    if unit.endswith(unit_kind):
-                        conf = self.unitfiles.load_conf(unit)
-                        if conf is None:
-                            pass
-                        elif self.unitfiles.not_user_conf(conf):
-                            pass
-                        else:
-                            units.append(unit)
+            for unit in index.listed(folder):
+                if self._ignored_unit(unit, igno):
+                    continue # ignore
+                if unit.endswith(unit_kind):
+                    conf = self.unitfiles.load_conf(unit)
+                    if conf is None:
+                        pass
+                    elif self.unitfiles.not_user_conf(conf):
+                        pass
+                    else:
+                        units.append(unit)
         return units
     def enabled_target_installed_system_units(self, target: str, unit_type: str = ".service", igno: Optional[List[str]] = None) -> List[str]:
         igno = igno if igno else []
         units: List[str] = []
+        index = self.enablement()
         for basefolder in self.unitfiles.system_folders():
             if not basefolder:
                 continue
             folder = self.default_enablefolder(target, basefolder)
             if self._root:
                 folder = os_path(self._root, folder)
-            if os.path.isdir(folder):
-                for unit in sorted(os.listdir(folder)):
-                    path = os.path.join(folder, unit)
-                    if os.path.isdir(path):
-                        continue
-                    if self._ignored_unit(unit, igno):
-                        continue # ignore
-                    if unit.endswith(unit_type):
-                        units.append(unit)
+            for unit in index.listed(folder):
+                if self._ignored_unit(unit, igno):
+                    continue # ignore
+                if unit.endswith(unit_type):
+                    units.append(unit)
         return units
     def enabled_target_configured_system_units(self, target: str, unit_type: str = ".service", igno: Optional[List[str]] = None) -> List[str]:
         igno = igno if igno else []
         units: List[str] = []
+        index = self.enablement()
         if TRUE:
             folder = self.default_enablefolder(target)
             if self._root:
                 folder = os_path(self._root, folder)
-            if os.path.isdir(folder):
-                for unit in sorted(os.listdir(folder)):
-                    path = os.path.join(folder, unit)
-                    if os.path.isdir(path):
-                        continue
-                    if self._ignored_unit(unit, igno):
-                        continue # ignore
-                    if unit.endswith(unit_type):
-                        units.append(unit)
+            for unit in index.listed(folder):
+                if self._ignored_unit(unit, igno):
+                    continue # ignore
+                if unit.endswith(unit_type):
+                    units.append(unit)
         return units
     def enabled_target_sysv_units(self, target: str, sysv: str = "S", igno: Optional[List[str]] = None) -> List[str]:
         igno = igno if igno else []
         units: List[str] = []
+        index = self.enablement()
         folders: List[str] = []
         if target in ["multi-user.target", self.DefaultUnit]:
             folders += [self.rc3_root_folder()]
         if target in ["graphical.target"]:
             folders += [self.rc5_root_folder()]
         for folder in folders:
-            if not os.path.isdir(folder):
+            if folder not in index.units:
                 logg.debug("non-existent %s", folder)
                 continue
-            for unit in sorted(os.listdir(folder)):
-                path = os.path.join(folder, unit)
-                if os.path.isdir(path):
-                    continue
+            for unit in index.listed(folder):
                 m = re.match(sysv+r"\d\d(.*)", unit)
                 if m:
                     service = m.group(1)
@@ -6465,6 +8046,7 @@ class Systemctl:
         """ detect the default.target services and stop them.
             This is commonly run through 'systemctl halt' or
             at the end of a 'systemctl --init default' loop."""
+        self.shutdown_deadline()
         target = self.get_default_target()
         services = self.stop_target_system(target)
         logg.info("[%s] system is down", target)
@@ -6587,102 +8169,71 @@ class Systemctl:
         done = self.start_units(units, init = True)
         logg.info("-- init is done")
         return done # and not missing
-    def restart_failed_units(self, units: List[str], maximum: Optional[int] = None) -> List[str]:
+    def restart_failed_units(self, units: List[str], exited: Optional[List[str]] = None) -> List[str]:
         """ This function will restart failed units.
         /
-        NOTE that with standard settings the LimitBurst implementation has no effect. If
-        the InitLoopSleep is ticking at the Default of 5sec and the LimitBurst Default
-        is 5x within a Default 10secs time frame then within those 10sec only 2 loop
-        rounds have come here checking for possible restarts. You can directly shorten
-        the interval ('-c InitLoopSleep=1') or have it indirectly shorter from the
-        service descriptor's RestartSec ("RestartSec=2s").
+        The units are checked for a failed state when their main process has exited
+        (the 'exited' list from SIGCHLD) or all of them when that is not known. A
+        failed unit is put on a schedule to be restarted after its RestartSec, and
+        the StartLimitBurst is checked over the restarts in StartLimitIntervalSec.
         """
+        for unit in units if exited is None else exited:
+            self.check_failed_unit(unit)
+        return self.restart_scheduled_units()
+    def check_failed_unit(self, unit: str) -> None:
         me = os.getpid()
-        maximum = maximum or DefaultStartLimitIntervalSec
-        restartDelay = MinimumYield
-        for unit in units:
-            now = time.monotonic()
-            try:
-                conf = self.unitfiles.load_conf(unit)
-                if not conf:
-                    continue
-                restartPolicy = conf.get(Service, "Restart", "no")
-                if restartPolicy in ["no", "on-success"]:
-                    logg.debug("[%s] [%s] Current NoCheck (Restart=%s)", me, unit, restartPolicy)
-                    continue
-                restartSec = self.unitfiles.get_RestartSec(conf)
-                if restartSec == 0:
-                    if self.loop_sleep > 1:
-                        logg.warning("[%s] set loop_sleep from %ss to 1 (caused by RestartSec=0!)",
-                                     unit, self.loop_sleep)
-                        self.loop_sleep = 1
-                elif restartSec > 0.9 and restartSec < self.loop_sleep:
-                    restartSleep = int(restartSec + 0.2)
-                    if restartSleep < self.loop_sleep:
-                        logg.warning("[%s] set loop_sleep from %ss to %s (caused by RestartSec=%.3fs)",
-                                     unit, self.loop_sleep, restartSleep, restartSec)
-                        self.loop_sleep = restartSleep
-                isUnitState = self.get_active_from(conf)
-                isUnitFailed = isUnitState in ["failed"]
-                logg.debug("[%s] [%s] Current Status: %s (%s)", me, unit, isUnitState, isUnitFailed)
-                if not isUnitFailed:
-                    if unit in self._restart_failed_units:
-                        del self._restart_failed_units[unit]
-                    continue
-                limitBurst = self.unitfiles.get_StartLimitBurst(conf)
-                limitSecs = self.unitfiles.get_StartLimitIntervalSec(conf)
-                if limitBurst > 1 and limitSecs >= 1:
-                    try:
-                        if unit not in self._restarted_unit:
-                            self._restarted_unit[unit] = []
-                            # we want to register restarts from now on
-                        restarted = self._restarted_unit[unit]
-                        logg.debug("[%s] [%s] Current limitSecs=%ss limitBurst=%sx (restarted %sx)",
-                                   me, unit, limitSecs, limitBurst, len(restarted))
-                        oldest = 0.
-                        interval = 0.
-                        if len(restarted) >= limitBurst:
-                            logg.debug("[%s] [%s] restarted %s",
-                                       me, unit, ["%.3fs" % (t - now) for t in restarted])
-                            while len(restarted):
-                                oldest = restarted[0]
-                                interval = time.monotonic() - oldest
-                                if interval > limitSecs:
-                                    restarted = restarted[1:]
-                                    continue
-                                break
-                            self._restarted_unit[unit] = restarted
-                            logg.debug("[%s] [%s] ratelimit %s",
-                                       me, unit, ["%.3fs" % (t - now) for t in restarted])
-                            # all values in restarted have a time below limitSecs
-                        if len(restarted) >= limitBurst:
-                            logg.info("[%s] [%s] Blocking Restart - oldest %s is %s ago (allowed %s)",
-                                      me, unit, oldest, interval, limitSecs)
-                            self.write_status_from(conf, AS="error")
-                            unit = "" # dropped out
-                            continue
-                    except OSError as e:
-                        logg.error("[%s] burst exception >> %s", unit, e)
-                if unit: # not dropped out
-                    if unit not in self._restart_failed_units:
-                        self._restart_failed_units[unit] = now + restartSec
-                        logg.debug("[%s] [%s] restart scheduled in %+.3fs",
-                                   me, unit, (self._restart_failed_units[unit] - now))
-            except Exception as e: # pylint: disable=broad-exception-caught
-                logg.error("[%s] [%s] An error occurred while restart checking >> %s", me, unit, e)
-        if not self._restart_failed_units:
+        now = time.monotonic()
+        try:
+            conf = self.unitfiles.load_conf(unit)
+            if not conf:
+                return
+            restartPolicy = conf.get(Service, "Restart", "no")
+            if restartPolicy in ["no", "on-success"]:
+                logg.debug("[%s] [%s] Current NoCheck (Restart=%s)", me, unit, restartPolicy)
+                return
+            isUnitState = self.get_active_from(conf)
+            isUnitFailed = isUnitState in ["failed"]
+            logg.debug("[%s] [%s] Current Status: %s (%s)", me, unit, isUnitState, isUnitFailed)
+            if not isUnitFailed:
+                self._restart_scheduled.pop(unit, None)
+                return
+            if unit in self._restart_scheduled:
+                return
+            limitBurst = self.unitfiles.get_StartLimitBurst(conf)
+            limitSecs = self.unitfiles.get_StartLimitIntervalSec(conf)
+            if limitBurst > 1 and limitSecs >= 1:
+                # we want to register restarts from now on
+                restarted = self._restarted_unit.setdefault(unit, collections.deque())
+                while restarted and now - restarted[0] > limitSecs:
+                    restarted.popleft()
+                logg.debug("[%s] [%s] Current limitSecs=%ss limitBurst=%sx (restarted %sx)",
+                           me, unit, limitSecs, limitBurst, len(restarted))
+                if len(restarted) >= limitBurst:
+                    logg.info("[%s] [%s] Blocking Restart - oldest %s is %s ago (allowed %s)",
+                              me, unit, restarted[0], now - restarted[0], limitSecs)
+                    self.write_status_from(conf, AS="error")
+                    logg.debug("[%s] [%s] Restart Status: %s", me, unit, self.get_active_from(conf))
+                    return
+            restartAt = now + self.unitfiles.get_RestartSec(conf)
+            self._restart_scheduled[unit] = restartAt
+            heapq.heappush(self._restart_schedule, (restartAt, unit))
+            logg.debug("[%s] [%s] restart scheduled in %+.3fs", me, unit, restartAt - now)
+        except Exception as e: # pylint: disable=broad-exception-caught
+            logg.error("[%s] [%s] An error occurred while restart checking >> %s", me, unit, e)
+    def restart_scheduled_units(self) -> List[str]:
+        """ restart the units from the schedule that have reached their RestartSec """
+        me = os.getpid()
+        if not self._restart_scheduled:
             self.error |= NOT_OK
             return []
         # NOTE: this function is only called from InitLoop when "running"
-        # let's check if any of the restart_units has its restartSec expired
         now = time.monotonic()
         restart_done: List[str] = []
-        logg.debug("[%s] Restart checking  %s",
-                   me, ["%+.3fs" % (t - now) for t in self._restart_failed_units.values()])
-        for unit in sorted(self._restart_failed_units):
-            restartAt = self._restart_failed_units[unit]
-            if restartAt > now:
-                continue
+        while self._restart_schedule and self._restart_schedule[0][0] <= now:
+            restartAt, unit = heapq.heappop(self._restart_schedule)
+            if self._restart_scheduled.get(unit) != restartAt:
+                continue # was rescheduled or dropped
+            del self._restart_scheduled[unit]
             restart_done.append(unit)
             try:
                 conf = self.unitfiles.load_conf(unit)
@@ -6697,55 +8248,101 @@ class Systemctl:
                     logg.debug("[%s] [%s] --- has been restarted.", me, unit)
                     if unit in self._restarted_unit:
                         self._restarted_unit[unit].append(time.monotonic())
+                    self.watch_unit_pid(unit)
             except Exception as e: # pylint: disable=broad-exception-caught
                 logg.error("[%s] [%s] An error occurred while restarting >> %s", me, unit, e)
-        for unit in restart_done:
-            if unit in self._restart_failed_units:
-                del self._restart_failed_units[unit]
         logg.debug("[%s] Restart remaining %s",
-                   me, ["%+.3fs" % (t - now) for t in self._restart_failed_units.values()])
+                   me, ["%+.3fs" % (t - now) for t in self._restart_scheduled.values()])
         return restart_done
-
+    def watch_unit_pid(self, unit: str) -> None:
+        """ remember the main PID of a unit so that its SIGCHLD can be mapped back """
+        conf = self.unitfiles.load_conf(unit)
+        if not conf:
+            return
+        for oldpid in [oldpid for oldpid, name in self._unit_pids.items() if name == unit]:
+            del self._unit_pids[oldpid]
+        pid = self.read_mainpid_from(conf)
+        if pid and pid_exists(pid): # otherwise its SIGCHLD is already gone
+            self._unit_pids[pid] = unit
+    def exited_units(self, reaped: List[SystemctlWaitPID]) -> Optional[List[str]]:
+        """ the units whose main process was reaped, or None if a process was not known """
+        exited: List[str] = []
+        for run in reaped:
+            if run.pid in self._unit_pids:
+                unit = self._unit_pids.pop(run.pid)
+                logg.debug("[%s] main PID %s exited (%s) <-%s>", unit, run.pid, run.returncode, run.signal or "")
+                exited.append(unit)
+            else:
+                logg.debug("PID %s exited (%s) <-%s> - not a main PID", run.pid, run.returncode, run.signal or "")
+                return None
+        return exited
     def init_loop_until_stop(self, units: List[str]) -> Optional[str]:
         """ this is the init-loop - it checks for any zombies to be reaped and
             waits for an interrupt. When a SIGTERM /SIGINT /Control-C signal
             is received then the signal name is returned. Any other signal will
             just raise an Exception like one would normally expect. As a special
-            the 'systemctl halt' emits SIGQUIT which puts it into no_more_procs mode."""
+            the 'systemctl halt' emits SIGQUIT which puts it into no_more_procs mode.
+            The loop is sleeping in a select() until a signal or a listen socket
+            wakes it up, or the next timer deadline for a RestartSec is reached.
+            The units are only polled every loop_sleep when that can not be avoided. """
         signal.signal(signal.SIGQUIT, lambda signum, frame: ignore_signals_and_raise_keyboard_interrupt("SIGQUIT"))
         signal.signal(signal.SIGINT, lambda signum, frame: ignore_signals_and_raise_keyboard_interrupt("SIGINT"))
         signal.signal(signal.SIGTERM, lambda signum, frame: ignore_signals_and_raise_keyboard_interrupt("SIGTERM"))
         result: Optional[str] = None
         #
         self.journal.start_log_files(units)
-        logg.debug("[init] start listen")
-        listen = SystemctlListenThread(self)
-        logg.debug("[init] starts listen")
-        listen.start()
-        logg.debug("[init] started listen")
+        if not self._child_reaper:
+            self._child_reaper = os.getpid() == 1 or set_child_subreaper()
+        selector = selectors.DefaultSelector()
+        wakeup, wakeup_signal = os.pipe()
+        os.set_blocking(wakeup, False)
+        os.set_blocking(wakeup_signal, False)
+        selector.register(wakeup, selectors.EVENT_READ)
+        lognotify = self.journal.log_notify_fd()
+        if lognotify >= 0:
+            selector.register(lognotify, selectors.EVENT_READ)
+        sigchld = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        oldwakeup = signal.set_wakeup_fd(wakeup_signal)
+        socketlist = self.socketlist()
+        for sock in socketlist:
+            sock.listen()
+            selector.register(sock.fileno(), selectors.EVENT_READ, sock)
+            logg.debug("[init] listen: %s :%s", sock.name(), sock.addr())
         self.sysinit_status(ActiveState = "active", SubState = "running")
-        lasttime= time.monotonic()
+        for unit in units:
+            self.watch_unit_pid(unit)
+        if RESTART_FAILED_UNITS:
+            self.restart_failed_units(units) # those that failed before the init-loop
+        polltime = time.monotonic() + self.loop_sleep
         while True:
             try:
-                logg.log(DEBUG_INITLOOP, "DONE InitLoop (sleep %ss)", self.loop_sleep)
-                sleep_sec = self.loop_sleep - (time.monotonic() - lasttime)
-                if sleep_sec < MinimumYield:
-                    sleep_sec = MinimumYield
-                sleeping = sleep_sec
-                while sleeping > 2:
-                    time.sleep(1) # accept signals atleast every second
-                    sleeping = self.loop_sleep - (time.monotonic() - lasttime)
-                    if sleeping < MinimumYield:
-                        sleeping = MinimumYield
-                        break
-                time.sleep(sleeping) # remainder waits less that 2 seconds
-                lasttime = time.monotonic()
-                self.loop_lock.acquire()
-                logg.log(DEBUG_INITLOOP, "[init] NEXT (after %ss)", sleep_sec)
+                polling = self.init_loop_polling(units)
+                timeout = self.init_loop_timeout(polltime if polling else None)
+                logg.log(DEBUG_INITLOOP, "DONE InitLoop (sleep %s)", timeout)
+                events = selector.select(timeout)
+                now = time.monotonic()
+                logged = False
+                for key, mask in events:
+                    if key.fd == wakeup:
+                        self.read_wakeup(wakeup)
+                    elif key.fd == lognotify:
+                        logged = True
+                    elif isinstance(key.data, SystemctlSocket):
+                        sock = key.data
+                        logg.debug("[init] listen: accept %s :%s", sock.name(), key.fd)
+                        self.do_accept_socket_from(sock.conf, sock.sock)
+                polled = polling and now >= polltime
+                if polled:
+                    polltime = now + self.loop_sleep
+                    logg.log(DEBUG_INITLOOP, "[init] NEXT (poll every %ss)", self.loop_sleep)
+                elif not events and not self.restart_pending(now):
+                    continue
+                elif logged and len(events) == 1 and not self.restart_pending(now):
+                    self.journal.read_log_files(units) # only a log file was written
+                    continue
                 self.journal.read_log_files(units)
-                logg.log(DEBUG_INITLOOP, "[init] reap zombies - check current processes")
-                running = self.reap_zombies()
-                logg.log(DEBUG_INITLOOP, "[init] reap zombies - init-loop found %s running procs", running)
+                reaped = self.reap_children()
+                logg.log(DEBUG_INITLOOP, "[init] reaped %s children", len(reaped))
                 if self.exit_mode & EXIT_NO_SERVICES_LEFT:
                     active = []
                     for unit in units:
@@ -6760,12 +8357,17 @@ class Systemctl:
                     elif NEVER:
                         logg.debug("[init] active services - %s", " and ".join(active))
                 if self.exit_mode & EXIT_NO_PROCS_LEFT:
+                    running = self.running_procs()
+                    logg.log(DEBUG_INITLOOP, "[init] init-loop found %s running procs", running)
                     if not running:
                         logg.info("[init] no more procs - exit init-loop")
                         break
                 if RESTART_FAILED_UNITS:
-                    self.restart_failed_units(units)
-                self.loop_lock.release()
+                    exited = self.exited_units(reaped)
+                    if exited is None or polled:
+                        self.restart_failed_units(units)
+                    else:
+                        self.restart_failed_units(units, exited)
             except KeyboardInterrupt as e:
                 if e.args and e.args[0] == "SIGQUIT":
                     # the original systemd puts a coredump on that signal.
@@ -6781,60 +8383,88 @@ class Systemctl:
                 logg.info("[init] interrupted >> %s", e)
                 raise
         self.sysinit_status(ActiveState = None, SubState = "degraded")
-        try:
-            self.loop_lock.release() # may be already unlocked here
-        except (OSError, RuntimeError, threading.ThreadError) as e:
-            logg.debug("[init] loop_lock release %s >> %s", type(e), e)
-        except Exception as e:  # pylint: disable=broad-exception-caught
-            logg.error("[init] loop_lock release %s >> %s", type(e), e)
-        listen.stop()
-        listen.join(2)
+        signal.set_wakeup_fd(oldwakeup)
+        signal.signal(signal.SIGCHLD, sigchld)
+        selector.close()
+        os.close(wakeup)
+        os.close(wakeup_signal)
+        for sock in socketlist:
+            try:
+                sock.close()
+            except OSError as e:
+                logg.warning("[init] listen: close socket >> %s", e)
         self.journal.read_log_files(units)
         self.journal.read_log_files(units)
         self.journal.stop_log_files(units)
         logg.debug("[init] done - init loop")
         return result
+    def init_loop_polling(self, units: List[str]) -> bool:
+        """ the init-loop needs to check the units in intervals when it can not
+            get a SIGCHLD for each of them, and for the journal log files. A unit
+            without a watched main PID may be changed by a 'docker exec systemctl'. """
+        if not self._child_reaper:
+            return True
+        watched = set(self._unit_pids.values())
+        if any(unit not in watched for unit in units):
+            return True
+        return self.journal.needs_polling()
+    def init_loop_timeout(self, polltime: Optional[float]) -> Optional[float]:
+        """ time until the next deadline, or None to wait for a signal """
+        deadlines = [restartAt for restartAt, _ in self._restart_schedule[:1]]
+        if polltime is not None:
+            deadlines.append(polltime)
+        if not deadlines:
+            return None
+        return max(0., min(deadlines) - time.monotonic())
+    def restart_pending(self, now: float) -> bool:
+        return bool(self._restart_schedule) and self._restart_schedule[0][0] <= now
+    def read_wakeup(self, wakeup: int) -> None:
+        """ the signal numbers are written to the wakeup fd by the python signal handling """
+        try:
+            while True:
+                data = os.read(wakeup, 512)
+                if not data:
+                    break
+                logg.log(DEBUG_INITLOOP, "[init] wakeup by signal %s", list(data))
+        except BlockingIOError:
+            pass
     def reap_zombies_target(self) -> str:
         """ reap-zombies -- check to reap children (internal) """
         running = self.reap_zombies()
         return F"remaining {running} process"
     def reap_zombies(self) -> int:
         """ check to reap children """
+        self.reap_children()
+        return self.running_procs()
+    def reap_children(self) -> List[SystemctlWaitPID]:
+        """ get the exit status of all children that have died """
+        reaped: List[SystemctlWaitPID] = []
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                break
+            logg.info("reap zombie %s", pid)
+            reaped.append(SystemctlWaitPID(pid, os.WEXITSTATUS(status), os.WTERMSIG(status)))
+        return reaped
+    def running_procs(self) -> int:
+        """ the number of processes except PID 0 and PID 1 and this one """
         selfpid = os.getpid()
         running = 0
         for pid_entry in os.listdir(_proc_pid_dir):
             pid = to_intN(pid_entry)
-            if pid is None:
-                continue
-            if pid == selfpid:
+            if pid is None or pid <= 1 or pid == selfpid:
                 continue
-            proc_status = _proc_pid_status.format(**locals())
-            if os.path.isfile(proc_status):
-                zombie = False
-                ppid = -1
-                try:
-                    with open(proc_status) as f:
-                        for line in f:
-                            m = re.match(r"State:\s*Z.*", line)
-                            if m:
-                                zombie = True
-                            m = re.match(r"PPid:\s*(\d+)", line)
-                            if m:
-                                ppid = int(m.group(1))
-                except IOError as e:
-                    logg.warning("%s >> %s", proc_status, e)
-                    continue
-                if zombie and ppid == os.getpid():
-                    logg.info("reap zombie %s", pid)
-                    try: os.waitpid(pid, os.WNOHANG)
-                    except OSError as e:
-                        logg.warning("reap zombie %s: %s", pid, e.strerror)
-            if os.path.isfile(proc_status):
-                if pid > 1:
-                    running += 1
-        return running # except PID 0 and PID 1
+            running += 1
+        return running
     def sysinit_status(self, **status: Optional[str]) -> None:
         conf = self.sysinit_target()
+        boottime = self.get_boottime()
+        if self._bootident:
+            boot_pid, boot_ticks = self._bootident
+            status.update(BootPID=str(boot_pid), BootTicks=str(boot_ticks), BootTime=str(boottime))
         self.write_status_from(conf, **status)
     def sysinit_target(self) -> SystemctlConf:
         if not self._sysinit_target:
@@ -6881,33 +8511,24 @@ class Systemctl:
     def is_running_unit(self, unit: str) -> bool:
         conf = self.unitfiles.get_conf(unit)
         return self.is_running_unit_from(conf)
-    def pidlist_of(self, pid: Optional[int]) -> List[int]:
+    def proc_table(self, fresh: bool = False) -> SystemctlProcessTable:
+        """ a /proc snapshot - renewed when we have started a process since. Any
+            code sending signals must ask for a fresh one, the cache is for display. """
+        if fresh or self._proc_table is None or self._proc_table.expired():
+            self._proc_table = SystemctlProcessTable()
+        return self._proc_table
+    def pidlist_of(self, pid: Optional[int], procs: Optional[SystemctlProcessTable] = None) -> List[int]:
+        """ the pid and its descendants, and the session when it is a session leader """
         if not pid:
             return []
-        pidlist = [pid]
-        pids = [pid]
-        for depth in range(PROC_MAX_DEPTH):
-            for pid_entry in os.listdir(_proc_pid_dir):
-                pid = to_intN(pid_entry)
-                if pid is None:
-                    continue
-                proc_status = _proc_pid_status.format(**locals())
-                if os.path.isfile(proc_status):
-                    try:
-                        with open(proc_status) as f:
-                            for line in f:
-                                if line.startswith("PPid:"):
-                                    ppid_text = line[len("PPid:"):].strip()
-                                    try: ppid = int(ppid_text)
-                                    except ValueError: continue
-                                    if ppid in pidlist and pid not in pids:
-                                        pids += [pid]
-                    except IOError as e:
-                        logg.warning("%s >> %s", proc_status, e)
-                        continue
-            if len(pids) != len(pidlist):
-                pidlist = pids[:]
-                continue
+        procs = procs or self.proc_table()
+        pids = procs.descendants(pid)
+        info = procs.procs.get(pid)
+        if info and info.sid == pid:
+            selfpid = os.getpid()
+            for member in procs.session(pid):
+                if member not in pids and member != selfpid:
+                    pids.append(member) # reparented after the parent has exited
         return pids
     def echo(self, *targets: str) -> str:
         line = " ".join(*targets)
@@ -6929,13 +8550,13 @@ class Systemctl:
                 else: # pragma: no cover
                     logg.error("unsupported %s", target)
                 continue
-            for pid_entry in os.listdir(_proc_pid_dir):
-                pid = to_intN(pid_entry)
+            procs = self.proc_table(fresh=True)
+            for pid in procs.procs:
                 if pid:
                     try:
-                        cmdline = _proc_pid_cmdline.format(**locals())
-                        with open(cmdline) as f:
-                            cmd = f.read().split("\0")
+                        cmd = procs.cmdline(pid)
+                        if not cmd:
+                            continue
                         logg.log(DEBUG_KILLALL, "cmdline %s", cmd)
                         found = None
                         cmd_exe = os.path.basename(cmd[0])
@@ -7262,7 +8883,7 @@ def runcommand(command: str, *modules: str) -> int:
 
 def main() -> int:
     # pylint: disable=global-statement
-    global _extra_vars, _force, _full, _log_lines, _no_pager, _no_reload, _no_legend, _no_ask_password
+    global _extra_vars, _force, _full, _log_lines, _log_since, _log_until, _no_pager, _no_reload, _no_legend, _no_ask_password
     global _now, _preset_mode, _quiet, _root, _show_all, _only_state, _only_type, _only_property, _only_what
     global DefaultMaximumTimeout, INIT_MODE, EXIT_MODE, _user_mode, FORCE_IPV4, FORCE_IPV6
     import optparse # pylint: disable=deprecated-module # not anymore
@@ -7328,6 +8949,10 @@ def main() -> int:
                   help="Enable unit files in the specified root directory (used for alternative root prefix)")
     _o.add_option("-n", "--lines", metavar="NUM",
                   help="Number of journal entries to show")
+    _o.add_option("-S", "--since", metavar="DATE", default=_log_since,
+                  help="Show journal entries written since the date")
+    _o.add_option("-U", "--until", metavar="DATE", default=_log_until,
+                  help="Show journal entries written until the date")
     _o.add_option("-o", "--output", metavar="CAT",
                   help="change journal output mode [short, ..., cat] (ignored)")
     _o.add_option("--plain", action="store_true",
@@ -7361,6 +8986,8 @@ def main() -> int:
     _force = opt.force
     _full = opt.full
     _log_lines = opt.lines
+    _log_since = opt.since
+    _log_until = opt.until
     _no_pager = opt.no_pager
     _no_reload = opt.no_reload
     _no_legend = opt.no_legend
@@ -27850,8 +27850,8 @@ class SystemctlBaseTest(unittest.TestCase):
         log = lines(open(debug_log))
         logg.info("systemctl.debug.log>\n\t%s", "\n\t".join(log[-20:]))
         #
-        self.assertTrue(greps(log, ".zzb.service. set loop_sleep from 5s to 2 .caused by RestartSec=2.000s"))
-        self.assertFalse(greps(log, "zza.service.*set loop_sleep"))
+        self.assertTrue(greps(log, ".zzb.service. restart scheduled in .2.000s"))
+        self.assertFalse(greps(log, "set loop_sleep"))
         #
         logg.info("kill daemon at %s", init.pid)
         self.assertTrue(self.kill(init.pid))
@@ -27934,8 +27934,9 @@ class SystemctlBaseTest(unittest.TestCase):
         log = lines(open(debug_log))
         logg.info("systemctl.debug.log>\n\t%s", "\n\t".join(log[-20:]))
         #
-        self.assertTrue(greps(log, ".zza.service. set loop_sleep from 5s to 2"))
-        self.assertTrue(greps(log, ".zzb.service. set loop_sleep from 2s to 1 .caused by RestartSec=0!"))
+        self.assertTrue(greps(log, ".zza.service. restart scheduled in .2.000s"))
+        self.assertTrue(greps(log, ".zzb.service. restart scheduled in .0.000s"))
+        self.assertFalse(greps(log, "set loop_sleep"))
         #
         logg.info("kill daemon at %s", init.pid)
         self.assertTrue(self.kill(init.pid))
@@ -6,8 +6,14 @@
 __copyright__ = "(C) Guido Draheim, licensed under the EUPL"""
 __version__ = "2.1.1311"
 
-from typing import Optional, Any
+from typing import Dict, Optional, Any, List, Tuple, Union
 import sys
+import time
+import signal
+import fcntl
+import errno
+import heapq
+import threading
 import re
 import shutil
 import inspect
@@ -15,6 +21,7 @@ import unittest
 import logging
 import os.path
 from fnmatch import fnmatchcase as fnmatch
+from types import FrameType
 
 logg = logging.getLogger(os.path.basename(__file__))
 
@@ -1028,6 +1035,7 @@ class AppUnitTest(unittest.TestCase):
         files = app.SystemctlUnitFiles(tmp)
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.tail_cmds = [tail_cmd]
         x = journal.tail_log_file(log_file1, 1)
         self.assertEq(x, 0)
@@ -1035,12 +1043,14 @@ class AppUnitTest(unittest.TestCase):
         files = app.SystemctlUnitFiles(tmp)
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.tail_cmds = [tail_cmd]
         x = journal.tail_log_file(log_file1, 1, True)
         self.assertEq(x, 0)
         app.logg.info("======== cat")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.no_pager = True
         journal.less_cmds = [tail_cmd]
         x = journal.tail_log_file(log_file1)
@@ -1048,18 +1058,21 @@ class AppUnitTest(unittest.TestCase):
         app.logg.info("======== less")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.less_cmds = journal.cat_cmds
         x = journal.tail_log_file(log_file1)
         self.assertEq(x, 0)
         app.logg.info("======== no less")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.less_cmds = []
         x = journal.tail_log_file(log_file1)
         self.assertEq(x, 1)
         app.logg.info("======== no cat")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.cat_cmds = []
         journal.no_pager = True
         x = journal.tail_log_file(log_file1)
@@ -1067,12 +1080,14 @@ class AppUnitTest(unittest.TestCase):
         app.logg.info("======== no tail")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.tail_cmds = []
         x = journal.tail_log_file(log_file1, 1)
         self.assertEq(x, 1)
         app.logg.info("======== no follow")
         journal = app.SystemctlJournal(files)
         journal.exec_spawn = True
+        journal.native = False
         journal.tail_cmds = []
         x = journal.tail_log_file(log_file1, 1, True)
         self.assertEq(x, 1)
@@ -1106,6 +1121,7 @@ class AppUnitTest(unittest.TestCase):
         systemctl.journal.less_cmds = [tail_cmd]
         systemctl.journal.cat_cmds = [tail_cmd]
         systemctl.journal.exec_spawn = True
+        systemctl.journal.native = False
         app.logg.info("======== less")
         systemctl.log_units(["test1.service"])
         app.logg.info("======== lines")
@@ -1118,6 +1134,1153 @@ class AppUnitTest(unittest.TestCase):
         app.logg.info("======== module")
         systemctl.log_modules("test1")
         app.logg.info("======== DONE")
+    def test_0330(self) -> None:
+        """ ordering of units by After/Before with a topological sort """
+        tmp = self.testdir()
+        for name, unit in [("a", "After=c.service"), ("b", ""), ("c", "Before=d.service"), ("d", ""), ("e", "After=d.service")]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", F"""
+            [Unit]
+            {unit}
+            [Service]
+            ExecStart = /usr/bin/true""")
+        unitfiles = app.SystemctlUnitFiles(tmp)
+        units = ["a.service", "b.service", "c.service", "d.service", "e.service"]
+        order = unitfiles.sorted_after(units)
+        logg.info("order %s", order)
+        self.assertEq(order, ["c.service", "d.service", "a.service", "b.service", "e.service"])
+        order = unitfiles.sorted_after(list(reversed(units)))
+        logg.info("order %s", order)
+        self.assertEq(order, ["c.service", "d.service", "e.service", "b.service", "a.service"])
+    def test_0331(self) -> None:
+        """ ordering cycles are reported with their members """
+        tmp = self.testdir()
+        for name, unit in [("a", "After=c.service"), ("b", "After=a.service"), ("c", "After=b.service"), ("d", "After=a.service")]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", F"""
+            [Unit]
+            {unit}
+            [Service]
+            ExecStart = /usr/bin/true""")
+        unitfiles = app.SystemctlUnitFiles(tmp)
+        confs = [unitfiles.get_conf(unit) for unit in ["a.service", "b.service", "c.service", "d.service"]]
+        ordering = app.SystemctlUnitOrder(confs)
+        order = [conf.name() for conf in ordering.sorted_confs()]
+        logg.info("order %s", order)
+        self.assertEq(order, ["a.service", "b.service", "c.service", "d.service"])
+        self.assertEq(ordering.cycles, [["a.service", "b.service", "c.service"]])
+    def test_0332(self) -> None:
+        """ parallel start of units waits for the units they depend on """
+        tmp = self.testdir()
+        for name, unit in [("a", ""), ("b", ""), ("c", "After=a.service"), ("d", "Requires=c.service")]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", F"""
+            [Unit]
+            {unit}
+            [Service]
+            ExecStart = /usr/bin/true""")
+        systemctl = app.Systemctl(tmp)
+        units = systemctl.unitfiles.sorted_after(["a.service", "b.service", "c.service", "d.service"])
+        depends = systemctl.unitfiles.ordered_depends(units)
+        logg.info("depends %s", depends)
+        self.assertEq(depends, {"a.service": [], "b.service": [], "c.service": ["a.service"], "d.service": ["c.service"]})
+        events_file = F"{tmp}/events.txt"
+        def event(text: str) -> None:
+            fd = os.open(events_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+            os.write(fd, (text + "\n").encode("utf-8"))
+            os.close(fd)
+        def action(unit: str) -> bool:
+            event("+" + unit)
+            time.sleep(0.2)
+            event("-" + unit)
+            return unit != "b.service"
+        done = systemctl.parallel_units(units, depends, action, 2)
+        events = open(events_file).read().split()
+        logg.info("events %s", events)
+        self.assertFalse(done)
+        self.assertEq(sorted(events[:2]), ["+a.service", "+b.service"])
+        self.assertLess(events.index("-a.service"), events.index("+c.service"))
+        self.assertLess(events.index("-c.service"), events.index("+d.service"))
+        self.assertEq(len(events), 8)
+    def test_0333(self) -> None:
+        """ shutdown budget overrides the TimeoutStopSec of units """
+        tmp = os.path.abspath(self.testdir())
+        for name in ["a", "b"]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", """
+            [Service]
+            Type=simple
+            ExecStart=/bin/sh -c 'trap "" TERM; while true; do sleep 0.02; done'
+            TimeoutStopSec=30""")
+        units = ["a.service", "b.service"]
+        saved = app.MaxParallelJobs, app.ShutdownTimeoutSec, app.MinimumYield
+        try:
+            app.MaxParallelJobs = 2
+            app.ShutdownTimeoutSec = 0.4
+            app.MinimumYield = 0.05
+            systemctl = app.Systemctl(tmp)
+            self.assertTrue(systemctl.start_units(units))
+            self.assertEq(systemctl.is_active_modules(*units), ["active", "active"])
+            self.assertEq(systemctl.stop_timeout(30), 30)
+            started = time.monotonic()
+            systemctl.shutdown_deadline()
+            self.assertLessEqual(systemctl.stop_timeout(30), 0.4)
+            self.assertTrue(systemctl.stop_units(units))
+            elapsed = time.monotonic() - started
+            logg.info("stopped in %ss", elapsed)
+            self.assertLess(elapsed, 3)
+            self.assertEq(systemctl.is_active_modules(*units), ["inactive", "inactive"])
+        finally:
+            app.MaxParallelJobs, app.ShutdownTimeoutSec, app.MinimumYield = saved
+    def test_0334(self) -> None:
+        """ init-loop reaps children without a /proc scan and sleeps without a deadline """
+        tmp = self.testdir()
+        systemctl = app.Systemctl(tmp)
+        systemctl.reap_children() # leftovers of earlier tests
+        pid = os.fork()
+        if not pid:
+            os._exit(3) # pylint: disable=protected-access
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        reaped = systemctl.reap_children()
+        logg.info("reaped %s", reaped)
+        self.assertEq(reaped, [app.SystemctlWaitPID(pid, 3, 0)])
+        self.assertEq(systemctl.reap_children(), [])
+        systemctl._child_reaper = True # pylint: disable=protected-access
+        self.assertFalse(systemctl.init_loop_polling([]))
+        self.assertEq(systemctl.init_loop_timeout(None), None)
+        heapq.heappush(systemctl._restart_schedule, (time.monotonic() + 2, "a.service")) # pylint: disable=protected-access
+        timeout = systemctl.init_loop_timeout(time.monotonic() + 5)
+        self.assertTrue(timeout and timeout <= 2)
+    def test_0335(self) -> None:
+        """ the /proc snapshot parses each stat line once and indexes the children """
+        info = app.SystemctlProcessInfo.parse(42, "42 (my (odd) cmd) S 7 42 42 0 -1 4194560"
+                                              + " 0 0 0 0 0 0 0 0 20 0 1 0 1234 0 0")
+        self.assertEq(info, app.SystemctlProcessInfo(42, "my (odd) cmd", "S", 7, 42, 42, 1234))
+        self.assertEq(app.SystemctlProcessInfo.parse(42, "42 (cut"), None)
+        tmp = self.testdir()
+        systemctl = app.Systemctl(tmp)
+        systemctl.reap_children() # leftovers of earlier tests
+        pid = os.fork()
+        if not pid:
+            os._exit(0) # pylint: disable=protected-access
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        procs = systemctl.proc_table()
+        self.assertIn(pid, procs.children[os.getpid()])
+        self.assertIn(pid, systemctl.pidlist_of(os.getpid()))
+        self.assertEq(procs.procs[pid].state, "Z")
+        self.assertTrue(app.pid_zombie(pid))
+        self.assertTrue(procs is systemctl.proc_table())
+        systemctl.reap_children()
+        self.assertFalse(app.pid_zombie(pid))
+    def test_0336(self) -> None:
+        """ waiting for a process to exit wakes up right away - with or without a pidfd """
+        tmp = self.testdir()
+        systemctl = app.Systemctl(tmp)
+        for pidfd in [True, False]:
+            app.WAIT_PIDFD = pidfd
+            try:
+                pid = os.fork()
+                if not pid:
+                    time.sleep(0.05)
+                    os._exit(0) # pylint: disable=protected-access
+                started = time.monotonic()
+                self.assertTrue(systemctl.wait_pid_exit(pid, 5))
+                self.assertLess(time.monotonic() - started, 0.5)
+                os.waitpid(pid, 0)
+                pid = os.fork()
+                if not pid:
+                    time.sleep(5)
+                    os._exit(0) # pylint: disable=protected-access
+                self.assertFalse(systemctl.wait_pid_exit(pid, 0.1))
+                os.kill(pid, signal.SIGKILL)
+                self.assertTrue(systemctl.wait_pid_exit(pid, 5))
+                os.waitpid(pid, 0)
+            finally:
+                app.WAIT_PIDFD = True
+    def test_0337(self) -> None:
+        """ starting a simple service learns about a failed execve without a sleep """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/ok.service", """
+        [Service]
+        Type=exec
+        ExecStart=/bin/sleep 3""")
+        text_file(F"{tmp}/etc/systemd/system/bad.service", """
+        [Service]
+        Type=exec
+        ExecStart=/not/existing/command""")
+        text_file(F"{tmp}/etc/systemd/system/quick.service", """
+        [Service]
+        Type=exec
+        ExecStart=/bin/sleep foo""")
+        systemctl = app.Systemctl(tmp)
+        started = time.monotonic()
+        self.assertTrue(systemctl.start_unit("ok.service"))
+        self.assertLess(time.monotonic() - started, app.MinimumYield)
+        self.assertEq(systemctl.is_active_modules("ok.service"), ["active"])
+        self.assertFalse(systemctl.start_unit("bad.service"))
+        self.assertFalse(systemctl.start_unit("quick.service"))
+        conf = systemctl.unitfiles.load_conf("bad.service")
+        assert conf is not None
+        pid, failed = systemctl.fork_execve_from(conf, ["/not/existing/command"], {})
+        self.assertEq(failed, errno.ENOENT)
+        _, status = os.waitpid(pid, 0) # the child did not return into this code
+        self.assertEq(os.WEXITSTATUS(status), 1)
+        self.assertTrue(systemctl.stop_unit("ok.service"))
+    def test_0338(self) -> None:
+        """ spawn_execve_from runs a command with its env and workingdir and returns its pid """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/a.service", F"""
+        [Service]
+        StandardOutput=append:{tmp}/a.log
+        ExecStartPre=/bin/true""")
+        text_file(F"{tmp}/etc/systemd/system/b.service", """
+        [Service]
+        User=nobody
+        ExecStartPre=/bin/true""")
+        text_file(F"{tmp}/etc/systemd/system/c.service", F"""
+        [Service]
+        WorkingDirectory={tmp}/work
+        StandardOutput=append:{tmp}/c.log
+        ExecStartPre=/bin/true""")
+        os.makedirs(F"{tmp}/work")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.load_conf("a.service")
+        assert conf is not None
+        self.assertTrue(systemctl.posix_spawn_possible(conf) is False) # --root needs a chdir
+        systemctl._root = "" # pylint: disable=protected-access
+        conf_b = systemctl.unitfiles.load_conf("b.service")
+        assert conf_b is not None
+        self.assertFalse(systemctl.posix_spawn_possible(conf_b))
+        conf_c = systemctl.unitfiles.load_conf("c.service")
+        assert conf_c is not None
+        self.assertFalse(systemctl.posix_spawn_possible(conf_c))
+        show = ["/bin/sh", "-c", "echo X=$X; pwd; exit 3"]
+        def returncode(conf: app.SystemctlConf, cmd: List[str], env: Dict[str, str], setsid: bool = False) -> Optional[int]:
+            pid = systemctl.spawn_execve_from(conf, cmd, env, setsid=setsid)
+            return app.subprocess_waitpid(pid).returncode
+        try:
+            for spawn in [True, False]:
+                app.EXEC_POSIX_SPAWN = spawn
+                self.assertEq(systemctl.posix_spawn_possible(conf), spawn and hasattr(os, "posix_spawn"))
+                self.assertEq(returncode(conf, show, {"X": "a"}, setsid=True), 3)
+                self.assertEq(returncode(conf_c, show, {"X": "c"}), 3)
+                self.assertEq(returncode(conf, ["/not/existing/command"], {}), 1)
+        finally:
+            app.EXEC_POSIX_SPAWN = True
+        shown = [line for line in open(F"{tmp}/a.log").read().splitlines() if not line.startswith("ERROR:")]
+        self.assertEq(shown, ["X=a", os.getcwd()] * 2)
+        self.assertEq(open(F"{tmp}/c.log").read().splitlines(), ["X=c", F"{tmp}/work"] * 2)
+    def test_0339(self) -> None:
+        """ daemon-reload writes a unit catalog that is used while the files are unchanged """
+        tmp = os.path.abspath(self.testdir())
+        system = F"{tmp}/etc/systemd/system"
+        text_file(F"{system}/a.service", """
+        [Unit]
+        Description=A
+        [Service]
+        ExecStart=/bin/sleep 1
+        Environment=X=1""")
+        text_file(F"{system}/a.service.d/extra.conf", """
+        [Service]
+        Environment=Y=2""")
+        past = time.time() - 10
+        for path in [system, F"{system}/a.service", F"{system}/a.service.d", F"{system}/a.service.d/extra.conf"]:
+            os.utime(path, (past, past))
+        systemctl = app.Systemctl(tmp)
+        self.assertTrue(systemctl.daemon_reload_target())
+        catalog = systemctl.unitfiles.catalog()
+        self.assertTrue(os.path.isfile(catalog.filename))
+        self.assertTrue(catalog.filename.startswith(tmp))
+        systemctl = app.Systemctl(tmp)
+        catalog = systemctl.unitfiles.catalog()
+        self.assertIn(system, catalog.listings)
+        self.assertTrue(catalog.parsed_file(F"{system}/a.service"))
+        conf = systemctl.unitfiles.get_conf("a.service")
+        self.assertEq(conf.getlist(app.Service, "Environment"), ["X=1", "Y=2"])
+        self.assertEq(conf.data.filenames(), [F"{system}/a.service", F"{system}/a.service.d/extra.conf"])
+        text_file(F"{system}/a.service.d/extra.conf", """
+        [Service]
+        Environment=Y=3""")
+        text_file(F"{system}/b.service", """
+        [Service]
+        ExecStart=/bin/sleep 2""")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.get_conf("a.service")
+        self.assertEq(conf.getlist(app.Service, "Environment"), ["X=1", "Y=3"])
+        self.assertIn("b.service", systemctl.unitfiles.scan_unit_files())
+    def test_0340(self) -> None:
+        """ one scan of the unit folders indexes the drop-in and the wants folders """
+        tmp = os.path.abspath(self.testdir())
+        system = F"{tmp}/etc/systemd/system"
+        text_file(F"{system}/a.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        text_file(F"{system}/a.service.d/x.conf", """
+        [Service]
+        Environment=X=1""")
+        text_file(F"{system}/a.service.d/x.txt", "")
+        text_file(F"{system}/b.service", """
+        [Service]
+        ExecStart=/bin/sleep 2
+        [Install]
+        WantedBy=multi-user.target""")
+        text_file(F"{system}/multi-user.target", """
+        [Unit]
+        Description=multi""")
+        os.makedirs(F"{system}/multi-user.target.wants")
+        os.symlink(F"{system}/a.service", F"{system}/multi-user.target.wants/a.service")
+        systemctl = app.Systemctl(tmp)
+        unitfiles = systemctl.unitfiles
+        self.assertIn("a.service", unitfiles.scan_unit_files())
+        self.assertEq(unitfiles._drop_in_dirs["a.service.d"], [F"{system}/a.service.d"])
+        self.assertEq(unitfiles._depends_dirs["multi-user.target.wants"], [F"{system}/multi-user.target.wants"])
+        self.assertEq(unitfiles.find_drop_in_files("a.service"), {"x.conf": F"{system}/a.service.d/x.conf"})
+        self.assertEq(unitfiles.find_drop_in_files("b.service"), {})
+        deps = unitfiles.get_dependencies_unit("multi-user.target", [".wants"])
+        self.assertEq(deps, {"a.service": ".wants"})
+        self.assertTrue(systemctl.enable_units(["b.service"]))
+        deps = unitfiles.get_dependencies_unit("multi-user.target", [".wants"])
+        self.assertEq(deps, {"a.service": ".wants", "b.service": ".wants"})
+        self.assertTrue(systemctl.disable_units(["b.service"]))
+        deps = unitfiles.get_dependencies_unit("multi-user.target", [".wants"])
+        self.assertEq(deps, {"a.service": ".wants"})
+    def test_0341(self) -> None:
+        """ the unit file sections are parsed when they are used """
+        tmp = os.path.abspath(self.testdir())
+        unitfile = F"{tmp}/a.service"
+        dropin = F"{tmp}/a.conf"
+        text_file(unitfile, """
+        [Unit]
+        Description=A
+        [Service]
+        Environment=X=1
+        ExecStart=/bin/sleep \\
+
+           [Install] \\
+           1
+        [Install]
+        WantedBy=multi-user.target""")
+        text_file(dropin, """
+        [Service]
+        Environment=
+        Environment=X=2""")
+        data = app.SystemctlConfigParser()
+        data.read_unit_file(unitfile)
+        data.read_unit_file(dropin)
+        self.assertEq(data.sections(), ["Unit", "Service", "Install"])
+        self.assertEq(data.get("Unit", "Description"), "A")
+        self.assertEq(data.getlist("Install", "WantedBy"), ["multi-user.target"])
+        self.assertEq(data.getlist("Service", "Environment"), ["X=2"])
+        self.assertTrue(data.has_option("Service", "ExecStart"))
+        self.assertFalse(data.has_option("Service", "WantedBy"))
+        eager = app.SystemctlConfigParser()
+        eager._record = []
+        eager.read_unit_file(unitfile)
+        eager.read_unit_file(dropin)
+        self.assertEq(data.getlist("Service", "ExecStart"), eager.getlist("Service", "ExecStart"))
+        self.assertEq(data.getlist("Install", "WantedBy"), eager.getlist("Install", "WantedBy"))
+        text_file(unitfile, """
+        Before=x.service
+        [Unit]
+        Description=A""")
+        data = app.SystemctlConfigParser()
+        data.read_unit_file(unitfile)
+        eager = app.SystemctlConfigParser()
+        eager._record = []
+        eager.read_unit_file(unitfile)
+        self.assertEq(data.sections(), ["GLOBAL", "Unit"])
+        self.assertEq(data.sections(), eager.sections())
+        self.assertTrue(data.has_section("GLOBAL"))
+        self.assertEq(data.get("GLOBAL", "Before"), "x.service")
+        text_file(unitfile, """
+        [Unit]
+        Description=A
+            which is special""")
+        self.assertRaises(ValueError, lambda: app.SystemctlConfigParser().read_unit_file(unitfile))
+    def test_0342(self) -> None:
+        """ the compiled unit patterns match the same names as fnmatch """
+        names = ["a.service", "ab.service", "a.socket", "b@.service", "b@x.service", "[x].service", "a", ""]
+        patterns = ["a", "a.service", "a*", "*.socket", "?b.service", "b@*.service", "[ab].service", "[[]x].service", ""]
+        for pattern in patterns:
+            compiled = app.SystemctlPatterns([pattern])
+            for name in names:
+                self.assertEq(compiled.matches(name), fnmatch(name, pattern))
+        compiled = app.SystemctlPatterns(["a", "x*", "*.socket"], suffix=".service")
+        self.assertEq(compiled.exact, set(["a", "a.service"]))
+        self.assertEq(compiled.prefixes, ("x",))
+        self.assertTrue(compiled.matches("a.service"))
+        self.assertTrue(compiled.matches("a.socket"))
+        self.assertFalse(compiled.matches("ab.service"))
+        self.assertTrue(app.fnmatched("a.service", "x", ""))
+        self.assertFalse(app.fnmatched("a.service", "x", "y*"))
+        self.assertIs(app.compiled_patterns(["a*"]), app.compiled_patterns(["a*"]))
+        tmp = os.path.abspath(self.testdir())
+        system = F"{tmp}/etc/systemd/system"
+        text_file(F"{system}/b.service", "[Service]")
+        text_file(F"{system}/a.service", "[Service]")
+        systemctl = app.Systemctl(tmp)
+        unitfiles = systemctl.unitfiles
+        self.assertEq(list(unitfiles.match_unit_files(["a"])), ["a.service"])
+        self.assertEq(list(unitfiles.match_unit_files(["*.service"])), ["a.service", "b.service"])
+        self.assertIs(unitfiles.sorted_unit_files(), unitfiles.sorted_unit_files())
+        unitfiles.add_unit_file("c.service", F"{system}/c.service")
+        self.assertEq(unitfiles.sorted_unit_files(), ["a.service", "b.service", "c.service"])
+    def test_0343(self) -> None:
+        """ the enablement state is answered from one scan of the .wants and rc.d folders """
+        tmp = os.path.abspath(self.testdir())
+        system = F"{tmp}/etc/systemd/system"
+        for name in ["a", "b"]:
+            text_file(F"{system}/{name}.service", """
+            [Service]
+            ExecStart=/bin/sleep 1
+            [Install]
+            WantedBy=multi-user.target""")
+        os.makedirs(F"{system}/multi-user.target.wants")
+        os.symlink(F"{system}/a.service", F"{system}/multi-user.target.wants/a.service")
+        os.makedirs(F"{system}/multi-user.target.wants/x.service")
+        shell_file(F"{tmp}/etc/init.d/c", """
+        #! /bin/sh
+        ### BEGIN INIT INFO
+        # Default-Start: 3 5
+        ### END INIT INFO""")
+        os.makedirs(F"{tmp}/etc/init.d/rc3.d")
+        os.symlink(F"{tmp}/etc/init.d/c", F"{tmp}/etc/init.d/rc3.d/S50c")
+        os.makedirs(F"{tmp}/etc/init.d/rc5.d")
+        systemctl = app.Systemctl(tmp)
+        index = systemctl.enablement()
+        self.assertEq(index.listed(F"{system}/multi-user.target.wants"), ["a.service"])
+        self.assertEq(index.listed(F"{tmp}/etc/init.d/rc3.d"), ["S50c"])
+        self.assertTrue(index.wanted_in("a.service", F"{system}/multi-user.target.wants"))
+        self.assertFalse(index.wanted_in("b.service", F"{system}/multi-user.target.wants"))
+        self.assertEq(systemctl.enabled_unit("a.service"), "enabled")
+        self.assertEq(systemctl.enabled_unit("b.service"), "disabled")
+        self.assertEq(systemctl.enabled_unit("c.service"), "enabled")
+        self.assertEq(systemctl.enabled_target_installed_system_units("multi-user.target"), ["a.service"])
+        self.assertEq(systemctl.enabled_target_sysv_units("multi-user.target"), ["c.service"])
+        self.assertTrue(systemctl.enable_units(["b.service"]))
+        self.assertEq(systemctl.enabled_unit("b.service"), "enabled")
+        self.assertEq(systemctl.enabled_target_installed_system_units("multi-user.target"), ["a.service", "b.service"])
+        self.assertTrue(systemctl.disable_units(["c.service"]))
+        self.assertEq(systemctl.enabled_unit("c.service"), "disabled")
+        past = time.time() - 10
+        for folder in [system, F"{system}/multi-user.target.wants", F"{tmp}/etc/init.d/rc3.d", F"{tmp}/etc/init.d/rc5.d"]:
+            os.utime(folder, (past, past))
+        index = systemctl.enablement()
+        self.assertTrue(systemctl.enablement() is index) # unchanged folders are not rescanned
+        other = app.Systemctl(tmp) # like a 'systemctl enable' from a docker exec
+        self.assertTrue(other.enable_units(["c.service"]))
+        self.assertTrue(other.disable_units(["a.service"]))
+        self.assertFalse(systemctl.enablement() is index)
+        self.assertEq(systemctl.enabled_unit("c.service"), "enabled")
+        self.assertEq(systemctl.enabled_unit("a.service"), "disabled")
+        self.assertEq(systemctl.enabled_target_installed_system_units("multi-user.target"), ["b.service"])
+    def test_0344(self) -> None:
+        """ the compiled preset rules keep the first match over all preset files """
+        tmp = os.path.abspath(self.testdir())
+        presets = F"{tmp}/etc/systemd/system-preset"
+        text_file(F"{presets}/10-a.preset", """
+        # comment
+        disable b.service
+        enable a*
+        enable [cd].service""")
+        text_file(F"{presets}/20-b.preset", """
+        enable b.service
+        enable x.service
+        disable *""")
+        systemctl = app.Systemctl(tmp)
+        unitfiles = systemctl.unitfiles
+        self.assertEq(unitfiles.load_preset_files(), ["10-a.preset", "20-b.preset"])
+        files = unitfiles._preset_file_list # pylint: disable=protected-access
+        assert files is not None
+        for unit in ["a.service", "ab.socket", "b.service", "c.service", "e.service", "x.service"]:
+            expected = None
+            for name in sorted(files):
+                expected = files[name].get_preset(unit)
+                if expected:
+                    break
+            self.assertEq(unitfiles.get_preset_of_unit(unit), expected)
+        self.assertEq(unitfiles.get_preset_of_unit("b.service"), "disable")
+        self.assertEq(unitfiles.get_preset_of_unit("a.service"), "enable")
+        self.assertEq(unitfiles.get_preset_of_unit("x.service"), "enable")
+        self.assertEq(unitfiles.get_preset_of_unit("e.service"), "disable")
+        rules = unitfiles._preset_rules # pylint: disable=protected-access
+        assert rules is not None
+        self.assertEq(rules.exact, {"b.service": 0, "x.service": 4})
+        self.assertEq(len(rules.rules), 6)
+    def test_0345(self) -> None:
+        """ the waitlock wakes up as soon as the lock is released """
+        tmp = os.path.abspath(self.testdir())
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.default_conf("zz.service")
+        lock = app.waitlock(conf)
+        lock.lockfolder = tmp
+        ready, release = os.pipe()
+        pid = os.fork()
+        if not pid:
+            try:
+                fd = os.open(lock.lockfile(), os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(fd, b"{ 'holder': 'test' }")
+                os.write(release, b"x")
+                time.sleep(0.3)
+            finally:
+                os._exit(0) # pylint: disable=protected-access
+        os.read(ready, 1)
+        started = time.monotonic()
+        with lock as locked:
+            waited = time.monotonic() - started
+            self.assertTrue(locked)
+        os.waitpid(pid, 0)
+        logg.info("waited %.3fs", waited)
+        self.assertGreater(waited, 0.1)
+        self.assertLess(waited, 0.5) # not a polling interval later
+        with lock as locked:
+            self.assertTrue(locked)
+    def test_0346(self) -> None:
+        """ the status file is replaced atomically so that readers see a complete snapshot """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        status_file = systemctl.get_status_file_from(conf)
+        self.assertTrue(status_file.startswith(tmp))
+        systemctl.write_status_from(conf, AS="starting", MainPID=123)
+        with open(status_file) as old:
+            systemctl.write_status_from(conf, AS="active")
+            self.assertEq(old.read(), "ActiveState=starting\nMainPID=123\n")
+        conf.status = None
+        self.assertEq(systemctl.read_status_from(conf), {"ActiveState": "active", "MainPID": "123"})
+        self.assertEq(os.listdir(os.path.dirname(status_file)), [os.path.basename(status_file)])
+    def test_0347(self) -> None:
+        """ the status changes within a statusbuffer are written once at its end """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        status_file = systemctl.get_status_file_from(conf)
+        with app.statusbuffer(conf, systemctl.flush_status_from):
+            systemctl.write_status_from(conf, MainPID=123)
+            systemctl.write_status_from(conf, AS="active")
+            self.assertFalse(os.path.exists(status_file))
+            self.assertEq(systemctl.read_status_from(conf), {"ActiveState": "active", "MainPID": "123"})
+            self.assertEq(systemctl.get_active_service_from(conf), "active")
+        self.assertEq(open(status_file).read(), "ActiveState=active\nMainPID=123\n")
+        with app.statusbuffer(conf, systemctl.flush_status_from):
+            systemctl.write_status_from(conf, AS="failed")
+            systemctl.clean_status_from(conf)
+        self.assertFalse(os.path.exists(status_file))
+    def test_0348(self) -> None:
+        """ status and pid files are parsed again only when their stat has changed """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        status_file = systemctl.get_status_file_from(conf)
+        os.makedirs(os.path.dirname(status_file))
+        with open(status_file, "w") as f:
+            f.write("ActiveState=active\nSubState:running\n")
+        self.assertEq(systemctl.read_status_from(conf), {"ActiveState": "active", "SubState": "running"})
+        key, status = systemctl._status_cache[status_file]
+        systemctl._status_cache[status_file] = (key, {"ActiveState": "cached"})
+        self.assertEq(systemctl.read_status_from(conf), {"ActiveState": "cached"})
+        with open(status_file, "w") as f:
+            f.write("ActiveState=failed\n")
+        self.assertEq(systemctl.read_status_from(conf), {"ActiveState": "failed"})
+        pid_file = os.path.join(os.path.dirname(status_file), "zz.pid")
+        with open(pid_file, "w") as f:
+            f.write("\n123\n")
+        self.assertEq(systemctl.read_pid_file(pid_file), 123)
+        with open(pid_file, "w") as f:
+            f.write("4567\n")
+        self.assertEq(systemctl.read_pid_file(pid_file), 4567)
+        with open(pid_file, "w") as f:
+            f.write("\n")
+        self.assertEq(systemctl.read_pid_file(pid_file, 9), 9)
+        os.remove(pid_file)
+        self.assertEq(systemctl.read_pid_file(pid_file), None)
+    def test_0349(self) -> None:
+        """ the boot time is stored in the sysinit status and checked against the boot process """
+        tmp = os.path.abspath(self.testdir())
+        systemctl = app.Systemctl(tmp)
+        systemctl.sysinit_status(SubState="initializing")
+        conf = systemctl.sysinit_target()
+        status = systemctl.read_status_from(conf)
+        self.assertEq(status["BootPID"], "1")
+        self.assertEq(float(status["BootTime"]), systemctl.get_boottime())
+        status_file = systemctl.get_status_file_from(conf)
+        ticks = int(status["BootTicks"])
+        with open(status_file, "w") as f:
+            f.write(F"BootPID=1\nBootTicks={ticks}\nBootTime=12345.5\nSubState=running\n")
+        self.assertEq(app.Systemctl(tmp).get_boottime(), 12345.5)
+        with open(status_file, "w") as f:
+            f.write(F"BootPID=1\nBootTicks={ticks+1}\nBootTime=12345.5\nSubState=running\n")
+        self.assertNotEqual(app.Systemctl(tmp).get_boottime(), 12345.5)
+    def test_0350(self) -> None:
+        """ the journal forwards only changed log files and keeps lines that stdout did not take """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        systemctl = app.Systemctl(tmp)
+        journal = systemctl.journal
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        log_file = journal.get_log_from(conf)
+        os.makedirs(os.path.dirname(log_file))
+        with open(log_file, "w") as f:
+            f.write("hello\npart")
+        journal.start_log_files(["zz.service"])
+        self.assertTrue(journal.has_log_files())
+        self.assertEq(journal.log_notify_fd() >= 0, app.LOG_INOTIFY)
+        readfd, writefd = os.pipe()
+        os.set_blocking(readfd, False)
+        os.set_blocking(writefd, False)
+        self.assertEq(journal.print_log_files(["zz.service"], writefd), 1)
+        self.assertEq(os.read(readfd, 1000), b"zz.service: hello\n")
+        self.assertEq(journal.print_log_files(["zz.service"], writefd), 0)
+        with open(log_file, "a") as f:
+            f.write("ial\n" + ("x" * 99 + "\n") * 2000)
+        journal.read_log_files([]) # consume the notify events
+        written = journal.print_log_files(["zz.service"], writefd)
+        self.assertTrue(written < 2001)
+        self.assertTrue(journal.needs_polling())
+        received = b""
+        while True:
+            try:
+                data = os.read(readfd, 100000)
+            except BlockingIOError:
+                written += journal.print_log_files(["zz.service"], writefd)
+                if not journal.needs_polling() and written == 2001:
+                    break
+                continue
+            received += data
+        received += os.read(readfd, 1000000)
+        self.assertEq(written, 2001)
+        lines = received.splitlines()
+        self.assertEq(len(lines), 2001)
+        self.assertEq(lines[0], b"zz.service: partial")
+        self.assertEq(lines[-1], b"zz.service: " + b"x" * 99)
+        journal.stop_log_files(["zz.service"])
+        os.close(readfd)
+        os.close(writefd)
+    def test_0351(self) -> None:
+        """ the init-loop rotates a unit log that grows larger than SystemMaxFileSize """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        self.assertEq(app.size_to_bytes("2K"), 2048)
+        self.assertEq(app.size_to_bytes("1.5MB"), 1572864)
+        self.assertEq(app.size_to_bytes(""), 0)
+        systemctl = app.Systemctl(tmp)
+        journal = systemctl.journal
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        log_file = journal.get_log_from(conf)
+        os.makedirs(os.path.dirname(log_file))
+        app.shutil_truncate(log_file)
+        saved = (app.SystemMaxFileSize, app.SystemMaxFiles)
+        try:
+            app.SystemMaxFileSize, app.SystemMaxFiles = "1K", 2
+            journal.start_log_files(["zz.service"])
+            readfd, writefd = os.pipe()
+            with open(log_file, "a") as log: # like a service holding the file open
+                for num in range(4):
+                    log.write(F"{num}" * 999 + "\n")
+                    log.write(F"{num}" * 99 + "\n")
+                    log.flush()
+                    journal.read_log_files([])
+                    self.assertEq(journal.print_log_files(["zz.service"], writefd), 2)
+                    self.assertEq(len(os.read(readfd, 10000).splitlines()), 2)
+                    self.assertEq(journal.rotate_log_files(["zz.service"]), 1)
+                    journal.prune_log_files()
+                    self.assertEq(os.path.getsize(log_file), 0)
+            self.assertEq(journal.log_segments(log_file), [log_file + ".1", log_file + ".2"])
+            self.assertEq(open(log_file + ".1").read(), "3" * 999 + "\n" + "3" * 99 + "\n")
+            self.assertEq(open(log_file + ".2").read()[:1], "2")
+            self.assertFalse(os.path.exists(log_file + ".3"))
+            with open(log_file, "a") as log: # appended after the forwarder did read the log
+                log.write("4" * 1500 + "\nfour\n")
+                log.flush()
+                journal.read_log_files([])
+                self.assertEq(journal.print_log_files(["zz.service"], writefd), 2)
+                log.write("five\nsix")
+                log.flush()
+                self.assertEq(journal.rotate_log_files(["zz.service"]), 1)
+                self.assertEq(journal.print_log_files(["zz.service"], writefd), 1)
+                self.assertEq(os.read(readfd, 10000).splitlines()[-2:], [b"zz.service: four", b"zz.service: five"])
+                log.write("teen\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                self.assertEq(os.read(readfd, 10000), b"zz.service: sixteen\n")
+            self.assertTrue(open(log_file + ".1").read().endswith("4\nfour\nfive\nsix"))
+            self.assertTrue(os.path.isfile(log_file + ".3")) # beyond SystemMaxFiles
+            if os.path.exists(log_file + ".3.index"):
+                os.remove(log_file + ".3.index")
+            os.makedirs(log_file + ".3.index/busy") # and it can not be removed
+            self.assertEq(journal.prune_log_files(), 0)
+            self.assertFalse(journal.remove_log_segment(log_file + ".9"))
+            journal.stop_log_files(["zz.service"])
+            os.close(readfd)
+            os.close(writefd)
+        finally:
+            app.SystemMaxFileSize, app.SystemMaxFiles = saved
+    def test_0352(self) -> None:
+        """ the native tail finds the last lines across rotated logs and follows the log """
+        tmp = os.path.abspath(self.testdir())
+        log_file = F"{tmp}/zz.log"
+        with open(log_file + ".2", "w") as f:
+            f.write("a1\na2\na3\n")
+        with open(log_file + ".1", "w") as f:
+            f.write("b1\nb2\n")
+        with open(log_file, "w") as f:
+            f.write("c1\nc2")
+        self.assertEq(app.tail_offset(log_file, 1), (1, 3))
+        self.assertEq(app.tail_offset(log_file, 5), (2, 0))
+        self.assertEq(app.tail_offset(log_file + ".1", 1), (1, 3))
+        self.assertEq(app.tail_offset(F"{tmp}/nonexistant.log", 1), (0, 0))
+        text = "".join(F"line{num}\n" + "x" * (num % 7) + "\n" for num in range(40))
+        with open(F"{tmp}/blocks.log", "w") as f:
+            f.write(text)
+        bufsize = app.LOG_BUFSIZE
+        try:
+            app.LOG_BUFSIZE = 2 # reads blocks of 16 bytes
+            for lines in [1, 2, 7, 33, 79, 80, 81]:
+                found, offset = app.tail_offset(F"{tmp}/blocks.log", lines)
+                self.assertEq(text[offset:].splitlines(), text.splitlines()[-lines:])
+                self.assertEq(found, min(lines, 80))
+        finally:
+            app.LOG_BUFSIZE = bufsize
+        journal = app.SystemctlJournal(app.SystemctlUnitFiles(tmp))
+        self.assertEq(journal.log_segments(log_file), [log_file + ".1", log_file + ".2"])
+        readfd, writefd = os.pipe()
+        os.set_blocking(readfd, False)
+        segments = journal.log_segments(log_file)
+        self.assertEq(journal.show_log_file(log_file, segments, 5, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000), b"a3\nb1\nb2\nc1\nc2")
+        self.assertEq(journal.show_log_file(log_file, segments, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000), b"a1\na2\na3\nb1\nb2\nc1\nc2")
+        self.assertEq(journal.show_log_file(F"{tmp}/nonexistant.log", [], 5, stdout=writefd), 1)
+        with open(log_file, "a") as f:
+            f.write("\nc3\n")
+        self.assertEq(journal.follow_log_file(log_file, 5, timeout=0.1, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000), b"\nc3\n")
+        with open(log_file, "w") as f:
+            f.write("d1\n") # truncated
+        self.assertEq(journal.follow_log_file(log_file, 9, timeout=0.1, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000), b"d1\n")
+        os.close(readfd)
+        os.close(writefd)
+    def test_0353(self) -> None:
+        """ the logs of multiple units are followed together with the unit name on each line """
+        tmp = os.path.abspath(self.testdir())
+        with open(F"{tmp}/a.log", "w") as f:
+            f.write("a1\na2\n")
+        with open(F"{tmp}/b.log", "w") as f:
+            f.write("b1\nb2")
+        journal = app.SystemctlJournal(app.SystemctlUnitFiles(tmp))
+        readfd, writefd = os.pipe()
+        os.set_blocking(readfd, False)
+        logs = [("a.service", F"{tmp}/a.log"), ("b.service", F"{tmp}/b.log"), ("c.service", F"{tmp}/c.log")]
+        self.assertEq(journal.follow_units(logs, 1, timeout=0.1, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000), b"a.service: a2\nb.service: b2\n")
+        follows = [app.SystemctlLogFollow(unit, log_path, 0) for unit, log_path in logs]
+        with open(F"{tmp}/c.log", "w") as f:
+            f.write("c1\n")
+        with open(F"{tmp}/b.log", "a") as f:
+            f.write("+\nb3\n")
+        self.assertEq(journal.follow_log_files(follows, timeout=0.1, stdout=writefd), 0)
+        self.assertEq(os.read(readfd, 1000).splitlines(), [
+            b"a.service: a1", b"a.service: a2", b"b.service: b1", b"b.service: b2+", b"b.service: b3", b"c.service: c1"])
+        os.close(readfd)
+        os.close(writefd)
+        for unit in ["a.service", "b.service"]:
+            text_file(F"{tmp}/etc/systemd/system/{unit}", """
+            [Service]
+            ExecStart=/bin/true""")
+        systemctl = app.Systemctl(tmp)
+        systemctl.journal.native = False
+        systemctl.journal.since = "@150"
+        followed: List[Tuple[int, Optional[int], str, str]] = []
+        def follow_units(logs: List[Tuple[str, str]], lines: Optional[int] = None, timeout: Optional[float] = None, stdout: int = 1,
+                         since: str = "", until: str = "") -> int:
+            followed.append((len(logs), lines, since, until))
+            return 0
+        systemctl.journal.follow_units = follow_units # type: ignore[method-assign]
+        self.assertEq(systemctl.log_units(["a.service", "b.service"], 5, True), 0)
+        self.assertEq(followed, [(2, 5, "@150", "")])
+    def test_0354(self) -> None:
+        """ the log index of the rotated segments selects the lines for --since/--until """
+        tmp = os.path.abspath(self.testdir())
+        now = app.log_time("2024-01-31 12:00")
+        assert now is not None
+        self.assertEq(app.log_time("@1000.5"), 1000.5)
+        self.assertEq(app.log_time("-5min", now), now - 300)
+        self.assertEq(app.log_time("10min ago", now), now - 600)
+        self.assertEq(app.log_time("yesterday", now), app.log_time("2024-01-30", now))
+        self.assertEq(app.log_time("11:30", now), now - 1800)
+        self.assertEq(app.log_time("soon", now), None)
+        log_path = F"{tmp}/a.log"
+        with open(log_path + ".1", "w") as f:
+            f.write("a1\na2\n")
+        with open(log_path + ".1.index", "w") as f:
+            f.write("100.0 3\n200.0 6\n")
+        with open(log_path, "w") as f:
+            f.write("b1\nb2\n")
+        with open(log_path + ".index", "w") as f:
+            f.write("300.0 3\n400.0 6\n")
+        journal = app.SystemctlJournal(app.SystemctlUnitFiles(tmp))
+        files = [log_path + ".1", log_path]
+        self.assertEq(journal.log_range(files, None, None), [(log_path + ".1", 0, -1), (log_path, 0, -1)])
+        self.assertEq(journal.log_range(files, 150., None), [(log_path + ".1", 3, -1), (log_path, 0, -1)])
+        self.assertEq(journal.log_range(files, 250., 300.), [(log_path + ".1", 6, -1), (log_path, 0, 3)])
+        readfd, writefd = os.pipe()
+        self.assertEq(journal.show_log_file(log_path, [log_path + ".1"], stdout=writefd, since="@150", until="@300"), 0)
+        os.close(writefd)
+        self.assertEq(os.read(readfd, 1000), b"a2\nb1\n")
+        os.close(readfd)
+        readfd, writefd = os.pipe()
+        logs = [("a.service", log_path)]
+        self.assertEq(journal.follow_units(logs, timeout=0.1, stdout=writefd, since="@150", until="@300"), 0)
+        self.assertEq(journal.follow_units(logs, timeout=0.1, stdout=writefd, since="soon"), 1)
+        os.close(writefd)
+        self.assertEq(os.read(readfd, 1000), b"a.service: a2\na.service: b1\n")
+        os.close(readfd)
+        journal.rotate_log_file(log_path)
+        self.assertTrue(os.path.exists(log_path + ".1.index"))
+        self.assertTrue(os.path.exists(log_path + ".2.index"))
+        self.assertFalse(os.path.exists(log_path + ".index"))
+    def test_0355(self) -> None:
+        """ the kill path takes a fresh /proc snapshot and skips a pid that was reused since """
+        tmp = self.testdir()
+        systemctl = app.Systemctl(tmp)
+        cached = systemctl.proc_table()
+        self.assertTrue(cached is systemctl.proc_table())
+        self.assertFalse(cached is systemctl.proc_table(fresh=True))
+        pid = os.fork()
+        if not pid:
+            try:
+                time.sleep(10)
+            finally:
+                os._exit(0) # pylint: disable=protected-access
+        try:
+            procs = systemctl.proc_table(fresh=True)
+            self.assertIn(pid, systemctl.pidlist_of(os.getpid(), procs))
+            self.assertEq(app.pid_starttime(pid), procs.procs[pid].starttime)
+            reused = app.SystemctlProcessTable()
+            reused.procs[pid] = procs.procs[pid]._replace(starttime=procs.procs[pid].starttime - 1)
+            self.assertTrue(systemctl._kill_pid(pid, signal.SIGTERM, reused)) # pylint: disable=protected-access
+            self.assertEq(os.waitpid(pid, os.WNOHANG), (0, 0))
+            systemctl._kill_pid(pid, signal.SIGTERM, procs) # pylint: disable=protected-access
+            self.assertEq(os.waitpid(pid, 0)[1] & 0x7f, signal.SIGTERM)
+        finally:
+            if app.pid_exists(pid):
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        self.assertEq(app.pid_starttime(pid), None)
+    def test_0356(self) -> None:
+        """ parallel start of real services in forked workers reports each result back """
+        tmp = os.path.abspath(self.testdir())
+        for name in ["a", "b", "c"]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", """
+            [Service]
+            Type=simple
+            ExecStart=/bin/sleep 30.356""")
+        text_file(F"{tmp}/etc/systemd/system/d.service", """
+        [Service]
+        Type=oneshot
+        ExecStart=/bin/false""")
+        def sleeping() -> List[int]:
+            pids = []
+            for pid in os.listdir("/proc"):
+                try:
+                    if pid.isdigit() and open(F"/proc/{pid}/cmdline", "rb").read() == b"/bin/sleep\x0030.356\x00":
+                        pids.append(int(pid))
+                except OSError:
+                    pass
+            return pids
+        units = ["a.service", "b.service", "c.service"]
+        maxjobs, spawn = app.MaxParallelJobs, app.EXEC_SPAWN
+        systemctl = app.Systemctl(tmp)
+        parent = os.getpid()
+        try:
+            app.MaxParallelJobs = 3
+            for app.EXEC_SPAWN in [False, True]:
+                started = time.monotonic()
+                self.assertTrue(systemctl.start_units(units))
+                self.assertLess(time.monotonic() - started, 10)
+                self.assertEq(systemctl.is_active_modules(*units), ["active", "active", "active"])
+                self.assertEq(systemctl.error, 0)
+                self.assertFalse(systemctl.start_units(units + ["d.service"]))
+                self.assertTrue(systemctl.stop_units(units))
+                self.assertEq(systemctl.is_active_modules(*units), ["inactive", "inactive", "inactive"])
+                systemctl.error = 0
+        finally:
+            if os.getpid() != parent: # pragma: no cover
+                os._exit(1) # pylint: disable=protected-access
+            app.MaxParallelJobs, app.EXEC_SPAWN = maxjobs, spawn
+            systemctl.stop_units(units)
+            systemctl.reap_children()
+        self.assertEq(sleeping(), [])
+    def test_0357(self) -> None:
+        """ the init-loop forwarder writes the log index and prints the lines with timestamps """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zz.service", """
+        [Service]
+        ExecStart=/bin/sleep 1""")
+        now = 1706700000.
+        self.assertEq(app.log_time("-1h", now), now - 3600)
+        self.assertEq(app.log_time("2 hours ago", now), now - 7200)
+        self.assertEq(app.log_time("-1d", now), now - 86400)
+        self.assertEq(app.log_time("1h 30min ago", now), now - 5400)
+        self.assertEq(app.log_time("-xyz", now), None)
+        self.assertEq(app.log_time("-1.5h", now), None)
+        systemctl = app.Systemctl(tmp)
+        journal = systemctl.journal
+        conf = systemctl.unitfiles.get_conf("zz.service")
+        log_file = journal.get_log_from(conf)
+        os.makedirs(os.path.dirname(log_file))
+        app.shutil_truncate(log_file)
+        saved = (app.SystemMaxFileSize, app.LOG_INDEX_SEC, app.LOG_TIMESTAMPS)
+        def index() -> List[int]:
+            return [int(line.split()[1]) for line in open(log_file + ".index")]
+        try:
+            app.SystemMaxFileSize, app.LOG_INDEX_SEC, app.LOG_TIMESTAMPS = "1K", 10.0, True
+            journal.start_log_files(["zz.service"])
+            readfd, writefd = os.pipe()
+            with open(log_file, "a") as log:
+                log.write("one\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                line = os.read(readfd, 10000).decode("utf-8")
+                self.assertTrue(re.match(r"\d{4}-\d\d-\d\d \d\d:\d\d:\d\d\.\d{6} \[\d+\.\d{6}\] zz.service: one\n$", line), line)
+                self.assertEq(index(), [4])
+                log.write("two\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                self.assertEq(index(), [4]) # not within LOG_INDEX_SEC
+                stamp, offset = journal._log_index["zz.service"] # pylint: disable=protected-access
+                journal._log_index["zz.service"] = (stamp - 10, offset) # pylint: disable=protected-access
+                log.write("three\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                self.assertEq(index(), [4, 14])
+                log.write("x" * 1100 + "\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                self.assertEq(journal.rotate_log_files(["zz.service"]), 1)
+                os.read(readfd, 10000)
+                self.assertEq([int(line.split()[1]) for line in open(log_file + ".1.index")], [4, 14, 1115])
+                self.assertFalse(os.path.exists(log_file + ".index"))
+                log.write("four\n")
+                log.flush()
+                journal.read_log_files([])
+                journal.print_log_files(["zz.service"], writefd)
+                self.assertEq(index(), [5])
+            journal.stop_log_files(["zz.service"])
+            os.close(readfd)
+            os.close(writefd)
+        finally:
+            app.SystemMaxFileSize, app.LOG_INDEX_SEC, app.LOG_TIMESTAMPS = saved
+    def test_0358(self) -> None:
+        """ the waitlock gives up at the deadline and leaves nothing waiting on the lock """
+        tmp = os.path.abspath(self.testdir())
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.default_conf("zz.service")
+        lock = app.waitlock(conf)
+        lock.lockfolder = tmp
+        ready, release = os.pipe()
+        pid = os.fork()
+        if not pid:
+            try:
+                fd = os.open(lock.lockfile(), os.O_RDWR | os.O_CREAT, 0o600)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(release, b"x")
+                time.sleep(1.5)
+            finally:
+                os._exit(0) # pylint: disable=protected-access
+        os.read(ready, 1)
+        maxwait = app.MaxLockWait
+        threads = threading.active_count()
+        handler = signal.getsignal(signal.SIGALRM)
+        try:
+            app.MaxLockWait = 1
+            started = time.monotonic()
+            with lock as locked:
+                self.assertFalse(locked)
+            self.assertGreater(time.monotonic() - started, 0.9)
+            self.assertEq(threading.active_count(), threads)
+            self.assertEq(signal.getsignal(signal.SIGALRM), handler)
+            self.assertEq(signal.getitimer(signal.ITIMER_REAL), (0.0, 0.0))
+            app.MaxLockWait = 5
+            with lock as locked:
+                self.assertTrue(locked)
+                self.assertLess(time.monotonic() - started, 2.5)
+            with lock as locked:
+                self.assertTrue(locked)
+        finally:
+            app.MaxLockWait = maxwait
+            os.waitpid(pid, 0)
+    def test_0359(self) -> None:
+        """ the restart schedule orders the units by RestartSec and keeps to the StartLimitBurst """
+        tmp = os.path.abspath(self.testdir())
+        for name, delay in [("a", "300ms"), ("b", "100ms"), ("c", "200ms"), ("d", "0")]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", F"""
+            [Service]
+            ExecStart=/bin/sleep 10
+            Restart=always
+            RestartSec={delay}
+            StartLimitBurst=2
+            StartLimitIntervalSec=10""")
+        systemctl = app.Systemctl(tmp)
+        systemctl.reap_children() # leftovers of earlier tests
+        restarted: List[str] = []
+        def restart_unit(unit: str) -> bool:
+            restarted.append(unit)
+            return True
+        systemctl.restart_unit = restart_unit # type: ignore[method-assign]
+        def failed(unit: str, **status: Union[str, int, None]) -> None:
+            conf = systemctl.unitfiles.get_conf(unit)
+            systemctl.write_status_from(conf, AS="failed", **status)
+        units = ["a.service", "b.service", "c.service"]
+        for unit in units:
+            failed(unit)
+        started = time.monotonic()
+        self.assertEq(systemctl.restart_failed_units(units), [])
+        while systemctl._restart_scheduled: # pylint: disable=protected-access
+            timeout = systemctl.init_loop_timeout(None)
+            self.assertTrue(timeout is not None and timeout <= 0.3)
+            time.sleep(timeout or 0)
+            systemctl.restart_scheduled_units()
+        self.assertEq(restarted, ["b.service", "c.service", "a.service"])
+        self.assertLess(time.monotonic() - started, 2)
+        # a main PID that exits while others wait for their RestartSec
+        del restarted[:]
+        failed("a.service")
+        self.assertEq(systemctl.restart_failed_units(units, ["a.service"]), [])
+        pid = os.fork()
+        if not pid:
+            os._exit(1) # pylint: disable=protected-access
+        conf = systemctl.unitfiles.get_conf("b.service")
+        systemctl.write_status_from(conf, AS="active", MainPID=pid)
+        systemctl.watch_unit_pid("b.service")
+        os.waitid(os.P_PID, pid, os.WEXITED | os.WNOWAIT)
+        exited = systemctl.exited_units(systemctl.reap_children())
+        self.assertEq(exited, ["b.service"])
+        failed("b.service")
+        self.assertEq(systemctl.restart_failed_units(units, exited), [])
+        self.assertEq(sorted(systemctl._restart_scheduled), ["a.service", "b.service"]) # pylint: disable=protected-access
+        systemctl.write_status_from(systemctl.unitfiles.get_conf("a.service"), AS="active") # recovered meanwhile
+        time.sleep(0.35)
+        self.assertEq(systemctl.restart_failed_units(units, []), ["b.service", "a.service"])
+        self.assertEq(restarted, ["b.service"])
+        # the StartLimitBurst=2 within StartLimitIntervalSec
+        del restarted[:]
+        for _ in range(4):
+            failed("d.service")
+            systemctl.restart_failed_units(["d.service"])
+        self.assertEq(restarted, ["d.service", "d.service"])
+        self.assertEq(systemctl.is_active_modules("d.service"), ["error"])
+        self.assertEq(systemctl._restart_scheduled, {}) # pylint: disable=protected-access
+    def test_0360(self) -> None:
+        """ a log without an inotify watch is polled alone, and the queue for stdout is bounded by bytes """
+        if not app.LOG_INOTIFY or app.inotify_init() < 0:
+            self.skipTest("no inotify")
+        tmp = os.path.abspath(self.testdir())
+        for name in ["a", "b"]:
+            text_file(F"{tmp}/etc/systemd/system/{name}.service", """
+            [Service]
+            ExecStart=/bin/sleep 1""")
+        systemctl = app.Systemctl(tmp)
+        journal = systemctl.journal
+        logs = {}
+        for name in ["a", "b"]:
+            conf = systemctl.unitfiles.get_conf(F"{name}.service")
+            logs[name] = journal.get_log_from(conf)
+            os.makedirs(os.path.dirname(logs[name]), exist_ok=True)
+            text_file(logs[name], "")
+        add_watch = app.inotify_add_watch
+        saved = app.LOG_QUEUE_MAX
+        readfd, writefd = os.pipe()
+        os.set_blocking(readfd, False)
+        os.set_blocking(writefd, False)
+        try:
+            app.inotify_add_watch = lambda fd, path, mask=app.IN_MODIFY: -1 if path == logs["b"] else add_watch(fd, path, mask)
+            journal.start_log_files(["a.service", "b.service"])
+            self.assertTrue(journal.log_notify_fd() >= 0) # still used for a.service
+            self.assertTrue(journal.needs_polling())
+            for name in ["a", "b"]:
+                with open(logs[name], "a") as f:
+                    f.write(F"{name}1\n")
+            journal.read_log_files([])
+            self.assertEq(journal.print_log_files(["a.service", "b.service"], writefd), 2)
+            self.assertEq(os.read(readfd, 1000), b"a.service: a1\nb.service: b1\n")
+            app.LOG_QUEUE_MAX = 1000
+            while True:
+                try:
+                    os.write(writefd, b"x" * 4096) # stdout does not take more
+                except BlockingIOError:
+                    break
+            with open(logs["a"], "a") as f:
+                f.write(("y" * 99 + "\n") * 100)
+            journal.read_log_files([])
+            self.assertEq(journal.print_log_files(["a.service"], writefd), 0)
+            self.assertTrue(app.LOG_QUEUE_MAX <= journal._log_queued < app.LOG_QUEUE_MAX + app.LOG_BUFSIZE * 2) # pylint: disable=protected-access
+            received = b""
+            while not received.endswith(b"y\n"):
+                try:
+                    received += os.read(readfd, 100000)
+                except BlockingIOError:
+                    journal.print_log_files(["a.service"], writefd)
+            self.assertEq(received.count(b"a.service: " + b"y" * 99 + b"\n"), 100)
+            self.assertEq(journal._log_queued, 0) # pylint: disable=protected-access
+            journal.stop_log_files(["a.service", "b.service"])
+        finally:
+            app.inotify_add_watch = add_watch
+            app.LOG_QUEUE_MAX = saved
+            os.close(readfd)
+            os.close(writefd)
+    def test_0361(self) -> None:
+        """ the init-loop restarts a unit that did fail already before the loop was entered """
+        tmp = os.path.abspath(self.testdir())
+        text_file(F"{tmp}/etc/systemd/system/zzfail.service", """
+        [Service]
+        ExecStart=/bin/sh -c 'exit 3'
+        Restart=on-failure
+        RestartSec=100ms""")
+        systemctl = app.Systemctl(tmp)
+        systemctl.reap_children() # leftovers of earlier tests
+        systemctl._child_reaper = True # pylint: disable=protected-access
+        systemctl.loop_sleep = 30 # no polling pass within the test
+        restarted: List[str] = []
+        restart_unit = systemctl.restart_unit
+        def record(unit: str) -> bool:
+            restarted.append(unit)
+            return restart_unit(unit)
+        systemctl.restart_unit = record # type: ignore[method-assign]
+        def interrupt(signum: int, frame: Optional[FrameType]) -> None:
+            raise KeyboardInterrupt("SIGTERM")
+        handlers = [(signum, signal.getsignal(signum)) for signum in [signal.SIGALRM, signal.SIGTERM, signal.SIGINT, signal.SIGQUIT]]
+        try:
+            systemctl.start_units(["zzfail.service"])
+            time.sleep(0.1)
+            systemctl.reap_children() # the SIGCHLD of the failed unit is gone
+            self.assertEq(systemctl.get_active_unit("zzfail.service"), "failed")
+            signal.signal(signal.SIGALRM, interrupt)
+            signal.setitimer(signal.ITIMER_REAL, 0.8)
+            self.assertEq(systemctl.init_loop_until_stop(["zzfail.service"]), "SIGTERM")
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            for signum, handler in handlers:
+                signal.signal(signum, handler)
+        logg.info("restarted %s", restarted)
+        self.assertTrue(restarted)
+        systemctl.stop_units(["zzfail.service"])
 
 if __name__ == "__main__":
     # unittest.main()
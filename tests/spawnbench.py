@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+# pylint: disable=missing-module-docstring,missing-function-docstring,line-too-long,invalid-name
+""" benchmark helper commands with posix_spawn against a fork of a big interpreter """
+
+__copyright__ = "(C) Guido Draheim, licensed under the EUPL"""
+__version__ = "2.1.1311"
+
+import sys
+import time
+import shutil
+import tempfile
+import logging
+import os.path
+
+logg = logging.getLogger(os.path.basename(__file__))
+
+ROUNDS = 20
+BALLAST = 1000000
+
+def bench(rounds: int, ballast: int) -> None:
+    sys.path = [os.curdir] + sys.path
+    from files.docker import systemctl3 as app # pylint: disable=import-outside-toplevel,import-error,no-name-in-module
+    if not hasattr(os, "posix_spawn"):
+        logg.error("no posix_spawn")
+        return
+    tmp = tempfile.mkdtemp(prefix="spawnbench.")
+    try:
+        system = os.path.join(tmp, "etc/systemd/system")
+        os.makedirs(system)
+        with open(os.path.join(system, "a.service"), "w") as f:
+            f.write("[Service]\nExecStartPre=/bin/true\n")
+        systemctl = app.Systemctl(tmp)
+        conf = systemctl.unitfiles.load_conf("a.service")
+        assert conf is not None
+        systemctl._root = "" # pylint: disable=protected-access
+        objects = [[n] for n in range(ballast)] # a grown PID-1 has many objects
+        spawned = {}
+        for spawn in [True, False]:
+            app.EXEC_POSIX_SPAWN = spawn
+            started = time.monotonic()
+            for _ in range(rounds):
+                app.subprocess_waitpid(systemctl.spawn_execve_from(conf, ["/bin/true"], {}))
+            spawned[spawn] = (time.monotonic() - started) / rounds
+        print("per exec: posix_spawn %.2fms, fork %.2fms (with %s objects)" % (
+              spawned[True] * 1000, spawned[False] * 1000, len(objects)))
+    finally:
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    from optparse import OptionParser  # pylint: disable=deprecated-module
+    cmdline = OptionParser("%prog [options]", epilog=__doc__.strip().split("\n", 1)[0])
+    cmdline.add_option("-v", "--verbose", action="count", default=0,
+                  help="increase logging level [%default]")
+    cmdline.add_option("--rounds", metavar="N", type="int", default=ROUNDS,
+                  help="number of execs per variant [%default]")
+    cmdline.add_option("--ballast", metavar="N", type="int", default=BALLAST,
+                  help="number of python objects in the forked process [%default]")
+    opt, _args = cmdline.parse_args()
+    logging.basicConfig(level = logging.WARNING - opt.verbose * 5)
+    bench(opt.rounds, opt.ballast)
@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+from optparse import OptionParser
+cmdline = OptionParser("%prog")
+cmdline.add_option("-F", "--follow", action="store_true")
+cmdline.add_option("-n", "--lines", metavar="lines")
+opt, args = cmdline.parse_args()
+assert args
+print(open(args[0]).read())
+